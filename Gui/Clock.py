@@ -0,0 +1,92 @@
+"""时钟服务模块，检测系统时间跳变和休眠唤醒"""
+
+from PySide6.QtCore import QDateTime, QElapsedTimer, QObject, QTimer, Signal
+
+from Utils import logger
+
+JumpThreshold = 2000  # 系统时间相对单调时钟的偏移变化超过该值(毫秒)时视为时间跳变
+StallThreshold = 5000  # 两次检查的间隔比预期多出该值(毫秒)时视为从休眠或挂起中恢复
+CheckInterval = 1000  # 预期的检查间隔，单位为毫秒
+
+
+class ClockService( QObject ):
+    """
+    时钟服务
+    单调时钟(QElapsedTimer)不受系统时间修改的影响，记录 系统时间 - 单调时钟 的偏移，
+    偏移变化说明系统时间被修改(NTP校时、手动修改、休眠唤醒后同步)；
+    两次检查之间单调时钟走过的时间远大于检查周期，说明程序被挂起(休眠)
+    """
+
+    jumped = Signal( int )  # 系统时间跳变，参数为跳变量(毫秒)，正数表示向后跳
+    resumed = Signal( int )  # 从休眠或挂起中恢复，参数为挂起时长(毫秒)
+
+    def __init__( self, parent = None, threshold: int = JumpThreshold ):
+        """
+        :param parent: 父对象
+        :param threshold: 时间跳变阈值，单位为毫秒
+        """
+        super().__init__( parent )
+        self.threshold: int = threshold
+        self.jumps: int = 0  # 检测到的跳变和唤醒次数
+        self.__injected: int = 0  # 测试模式注入的跳变量之和
+        self.__monotonic = QElapsedTimer()
+        self.__monotonic.start()
+        self.__lastCheck: int = 0  # 上次检查时单调时钟的读数
+        self.__offset: int = self.__wallOffset()  # 上次检查时的 系统时间 - 单调时钟
+
+    def __wallOffset( self ) -> int:
+        """获取当前的 系统时间 - 单调时钟"""
+        return QDateTime.currentMSecsSinceEpoch() + self.__injected - self.__monotonic.elapsed()
+
+    def check( self, interval: int = CheckInterval ) -> bool:
+        """
+        检查时钟，由每秒刷新的定时器调用，检测到跳变或唤醒时发出对应的信号
+        :param interval: 距上次检查的预期间隔，单位为毫秒
+        :return: 是否检测到跳变或唤醒
+        """
+        elapsed = self.__monotonic.elapsed()
+        stall = elapsed - self.__lastCheck - interval
+        self.__lastCheck = elapsed
+        offset = self.__wallOffset()
+        drift = offset - self.__offset
+        self.__offset = offset
+        if abs( drift ) >= self.threshold:
+            self.jumps += 1
+            logger.warning( f"系统时间跳变 {drift / 1000:+.1f} 秒，重新计算所有检查时间" )
+            self.jumped.emit( drift )
+            return True
+        if stall >= StallThreshold:
+            self.jumps += 1
+            logger.info( f"程序挂起 {stall / 1000:.1f} 秒后恢复，重新计算所有检查时间" )
+            self.resumed.emit( stall )
+            return True
+        return False
+
+    def injectJump( self, msecs: int ):
+        """
+        测试模式: 注入一次时间跳变并立即检查
+        只影响跳变检测，不修改系统时间，用于验证检测和重新计算的流程
+        :param msecs: 跳变量，单位为毫秒，正数表示向后跳
+        """
+        logger.info( f"注入时间跳变 {msecs / 1000:+.1f} 秒" )
+        self.__injected += msecs
+        self.check( self.__monotonic.elapsed() - self.__lastCheck )
+
+    def scheduleTestJumps( self, spec: str ) -> int:
+        """
+        测试模式: 按配置在启动后的指定时间注入时间跳变
+        :param spec: 用逗号分隔的 延迟秒数:跳变秒数，例如 "10:3600, 30:-3600"
+        :return: 安排的跳变数
+        """
+        count = 0
+        for part in spec.replace( "，", "," ).split( "," ):
+            if len( part.strip() ) == 0:
+                continue
+            try:
+                delay, jump = (int( value ) for value in part.split( ":" ))
+            except ValueError:
+                logger.warning( f"时间跳变测试配置格式错误: {part}" )
+                continue
+            QTimer.singleShot( delay * 1000, self, lambda msecs = jump * 1000: self.injectJump( msecs ) )
+            count += 1
+        return count
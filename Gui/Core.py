@@ -1,14 +1,19 @@
 """核心模块"""
 
-from PySide6.QtCore import QDate, QDateTime, QObject, QRect, QSize, QTimer
+from PySide6.QtCore import QDate, QDateTime, QElapsedTimer, QObject, QRect, QSize, Qt, QTime, QTimer, Slot
 
 from Gui.Calendar import CalendarWidget
+from Gui.Clock import ClockService
 from Gui.Modules import CntDayWnd, CourseShdWnd, DailyShdWnd, TimeWnd
 from Gui.RemindWnd import RemindWnd
+from Gui.Scheduler import DeadlineScheduler
 from Model import CountdayItem, DataSource
 from Utils import Config, logger
 
 Duration = 180  # 提前提醒时间，单位为秒
+LoadingText = "加载中..."  # 数据加载完成前的占位文本
+LoadFailedText = "数据加载失败"  # 数据加载失败时的占位文本，数据库可以读取后自动重新加载
+WndSpace = 4  # 窗口间距
 
 
 class MainModule( QObject ):
@@ -16,9 +21,17 @@ class MainModule( QObject ):
     
     def __init__( self, screenRect: QRect, parent = None ):
         super().__init__( parent )
+        self.elapsedTimer = QElapsedTimer()  # 启动计时，用于统计首帧和数据加载耗时
+        self.elapsedTimer.start()
         
+        # 数据在后台线程加载，窗口先显示占位内容，数据加载完成后再填充
         self.dataSource = DataSource()  # 数据源
-        self.dataSource.loadDataFromDatabase()
+        self.dataSource.dataIsReady.connect( self.onDataReady )
+        self.dataSource.loadFailed.connect( self.onLoadFailed )
+        self.loadError: str | None = None  # 数据加载失败的原因
+        self.dataSource.dailyChanged.connect( self.updateDailyWnd )
+        self.dataSource.courseChanged.connect( self.updateCourseWnd )
+        self.dataSource.countdayChanged.connect( self.onCountdayChanged )
         
         self.timeWnd = TimeWnd()  # 时间窗口
         self.timeWnd.setFixedSize( QSize( 140, 60 ) )
@@ -26,13 +39,15 @@ class MainModule( QObject ):
         if textColor is not None:
             self.timeWnd.setTextColor( textColor )
         
-        self.dailyWnd = DailyShdWnd( self.dataSource.getDailyShdItem() )  # 作息窗口
+        self.dailyWnd = DailyShdWnd( None )  # 作息窗口
+        self.dailyWnd.setText( LoadingText )
         self.dailyWnd.setFixedSize( QSize( 140, 80 ) )
         textColor = Config.getValue( "colors", "dailyTextColor" )
         if textColor is not None:
             self.dailyWnd.setTextColor( textColor )
         
-        self.courseWnd = CourseShdWnd( self.dataSource.getCourseShdItem() )  # 课程窗口
+        self.courseWnd = CourseShdWnd( None )  # 课程窗口
+        self.courseWnd.setText( LoadingText )
         self.courseWnd.setFixedSize( QSize( 140, 80 ) )
         textColor = Config.getValue( "colors", "courseTextColor" )
         if textColor is not None:
@@ -45,8 +60,7 @@ class MainModule( QObject ):
         if textColor is not None:
             self.calendarWnd.setColor( textColor )
         
-        self.countDays: list[CntDayWnd] = list()  # 倒数日窗口
-        self.cntDayInit()
+        self.countDays: list[CntDayWnd] = list()  # 倒数日窗口，数据加载完成后创建
         
         self.remindWnd = RemindWnd()  # 提醒窗口
         self.remindWnd.setFixedSize( QSize( 200, 100 ) )
@@ -54,17 +68,25 @@ class MainModule( QObject ):
         self.layoutAllWnd( screenRect )
         
         self.currentDate: QDate = QDate.currentDate()  # 当前日期
-        self.dailyCheckTime: QDateTime = self.dailyWnd.dailyShd.end  # 作息检查时间
-        self.CourseCheckTime: QDateTime = self.courseWnd.courseShd.end  # 课程检查时间
-        self.remindTime: QDateTime = self.courseWnd.courseShd.start.addSecs(
-            -Duration,
-        )  # 提醒时间
-        
-        self.updateAllWnd()
         
+        # 时间窗口每秒刷新一次，其余窗口只在作息、课程、日期发生变化的时间点刷新
         self.timer = QTimer( self )
-        self.timer.timeout.connect( self.updateAllWnd )
-        self.timer.start( 200 )  # 200ms
+        self.timer.setSingleShot( True )
+        self.timer.setTimerType( Qt.TimerType.PreciseTimer )
+        self.timer.timeout.connect( self.updateTimeWnd )
+        
+        self.scheduler = DeadlineScheduler( self )  # 截止时间调度器
+        # 系统时间跳变或休眠唤醒后，缓存的检查时间全部作废，立即重新计算
+        self.clock = ClockService( self )
+        self.clock.jumped.connect( self.onClockChanged )
+        self.clock.resumed.connect( self.onClockChanged )
+        testJumps = Config.getValue( "debug", "clockjumps" )  # 测试模式: 延迟秒数:跳变秒数, ...
+        if testJumps:
+            self.clock.scheduleTestJumps( testJumps )
+        self.updateTimeWnd()
+        self.scheduleNextDay()
+        
+        self.dataSource.loadDataInBackground()
     
     def showAllWnd( self ):
         """显示所有窗口"""
@@ -74,42 +96,113 @@ class MainModule( QObject ):
         self.calendarWnd.show()
         for cntDayWnd in self.countDays:
             cntDayWnd.show()
+        QTimer.singleShot( 0, self.onFirstFrame )
+    
+    def onFirstFrame( self ):
+        """首帧显示完成"""
+        logger.info( f"首帧耗时: {self.elapsedTimer.elapsed()} ms" )
+    
+    @Slot( str )
+    def onLoadFailed( self, message: str ):
+        """数据加载失败，之后的dataIsReady中显示失败信息"""
+        self.loadError = message
+    
+    @Slot()
+    def onDataReady( self ):
+        """数据加载完成(或失败)，填充各窗口，并开始检查数据库修改"""
+        logger.info( f"数据加载耗时: {self.elapsedTimer.elapsed()} ms" )
+        self.onCountdayChanged()
+        self.updateAllWnd()
+        if self.loadError is not None:
+            self.dailyWnd.setText( LoadFailedText )
+            self.courseWnd.setText( LoadFailedText )
+        self.dataSource.startWatching()  # 之后只重新加载被修改的表，加载失败时数据库可以读取后重新加载
+    
+    @Slot()
+    def onCountdayChanged( self ):
+        """倒数日表变化，重新创建倒数日窗口"""
+        for cntDayWnd in self.countDays:
+            cntDayWnd.close()
+            cntDayWnd.deleteLater()
+        self.countDays.clear()
+        self.cntDayInit()
+        self.layoutCntDayWnd()
+        if self.timeWnd.isVisible():
+            for cntDayWnd in self.countDays:
+                cntDayWnd.show()
     
     def updateAllWnd( self ):
-        """分级更新所有窗口"""
+        """更新所有窗口，并重新安排所有检查时间"""
+        self.updateTimeWnd()
+        self.updateDailyWnd()
+        self.updateCourseWnd()
+        self.scheduleNextDay()
+    
+    @Slot( int )
+    def onClockChanged( self, msecs: int ):
+        """系统时间跳变或休眠唤醒，重新计算所有检查时间，日期变化时更新日历和倒数日"""
+        if QDate.currentDate() != self.currentDate:
+            self.updateDateWnd()
+        self.updateAllWnd()
+    
+    def updateTimeWnd( self ):
+        """更新时间窗口，检查时钟，并在下一整秒再次更新"""
+        if self.clock.check():  # 已经重新计算并更新了所有窗口
+            return
         curDateTime = QDateTime.currentDateTime()
         self.timeWnd.update( curDateTime )
-        
-        if curDateTime >= self.dailyCheckTime:  # 检查是否需要更新作息
-            if self.dailyWnd.isExpired( curDateTime ):
-                self.dailyWnd.setDailyShd( self.dataSource.getDailyShdItem() )
-                self.dailyWnd.update()
-                if self.dailyWnd.dailyShd is not None:  # 更新检查时间
-                    self.dailyCheckTime = self.dailyWnd.dailyShd.end
-                else:
-                    self.dailyCheckTime = curDateTime.addSecs( 60 )
-        
-        if curDateTime >= self.CourseCheckTime:  # 检查是否需要更新课程
-            if self.courseWnd.isExpired( curDateTime ):
-                self.courseWnd.setCourseShd( self.dataSource.getCourseShdItem() )
-                self.courseWnd.update()
-                if self.courseWnd.courseShd is not None:
-                    self.CourseCheckTime = self.courseWnd.courseShd.end  # 更新检查时间
-                    self.remindTime = self.courseWnd.courseShd.start.addSecs( -Duration )
-                else:
-                    self.CourseCheckTime = curDateTime.addSecs( 60 )
-        
-        if self.currentDate != curDateTime.date():  # 检查是否需要更新日历和倒数日
-            self.currentDate = curDateTime.date()
-            self.calendarWnd.updateCalendar()
-            for cntDayWnd in self.countDays:
-                cntDayWnd.update()
-        
-        if (
-                self.remindTime is not None and curDateTime >= self.remindTime
-        ):  # 检查是否需要提醒
-            self.remindTime = None  # 重置提醒时间
-            self.remindWnd.remindStart( self.courseWnd.courseShd.start )
+        self.timer.start( 1000 - curDateTime.time().msec() )
+    
+    def updateDailyWnd( self ):
+        """更新作息窗口，并安排下一次作息检查时间"""
+        curDateTime = QDateTime.currentDateTime()
+        self.dailyWnd.setDailyShd( self.dataSource.getDailyShdItem() )
+        self.dailyWnd.update()
+        if self.dailyWnd.dailyShd is not None:  # 更新检查时间
+            dailyCheckTime = self.dailyWnd.dailyShd.end
+        else:  # 不在任何时间段内，下一个时间段开始时再检查
+            nextShd = self.dataSource.getNextDailyShdItem()
+            dailyCheckTime = nextShd.start if nextShd is not None else curDateTime.addSecs( 60 )
+        self.scheduler.schedule( "daily", dailyCheckTime, self.updateDailyWnd )
+    
+    def updateCourseWnd( self ):
+        """更新课程窗口，并安排下一次课程检查时间和提醒时间"""
+        curDateTime = QDateTime.currentDateTime()
+        self.courseWnd.setCourseShd( self.dataSource.getCourseShdItem() )
+        self.courseWnd.update()
+        courseShd = self.courseWnd.courseShd
+        if courseShd is not None:
+            self.scheduler.schedule( "course", courseShd.end, self.updateCourseWnd )
+            if courseShd.start > curDateTime:  # 课程尚未开始，安排提醒
+                self.scheduler.schedule(  # 课程开始后提醒已过期，唤醒后不再补发
+                    "remind", courseShd.start.addSecs( -Duration ), self.remind, Duration * 1000,
+                )
+            else:
+                self.scheduler.cancel( "remind" )
+        else:
+            self.scheduler.schedule( "course", curDateTime.addSecs( 60 ), self.updateCourseWnd )
+            self.scheduler.cancel( "remind" )
+    
+    def updateDateWnd( self ):
+        """日期变化，更新日历和倒数日窗口"""
+        self.currentDate = QDate.currentDate()
+        self.calendarWnd.updateCalendar()
+        for cntDayWnd in self.countDays:
+            cntDayWnd.update()
+        self.scheduleNextDay()
+    
+    def scheduleNextDay( self ):
+        """安排下一次日期检查时间(次日零点)"""
+        midnight = QDateTime( QDate.currentDate().addDays( 1 ), QTime( 0, 0 ) )
+        self.scheduler.schedule( "date", midnight, self.updateDateWnd )
+    
+    def remind( self ):
+        """课程提醒，放假日和课程已经开始(提醒过期)时不提醒"""
+        if self.dataSource.isHoliday( QDate.currentDate() ):
+            return
+        courseShd = self.courseWnd.courseShd
+        if courseShd is not None and courseShd.start > QDateTime.currentDateTime():
+            self.remindWnd.remindStart( courseShd.start )
     
     def cntDayInit( self ):
         """初始化倒数日窗口"""
@@ -135,28 +228,49 @@ class MainModule( QObject ):
     
     def layoutAllWnd( self, screenRect: QRect ):
         """布局所有窗口"""
+        self.screenRect = screenRect
         firstRun = Config.getValue( "condition", "firstrun" )
-        if firstRun is None or firstRun == "True":
+        self.firstRun: bool = firstRun is None or firstRun == "True"
+        if self.firstRun:
             self.defaultWndPos( screenRect )
             Config.setValue( "condition", "firstrun", "False" )
         else:
             self.moveWndPos()
     
+    def layoutCntDayWnd( self ):
+        """布局倒数日窗口，首次运行或没有保存位置时排在课程窗口下方"""
+        left = self.courseWnd.x()
+        top = self.courseWnd.y() + self.courseWnd.height() + WndSpace
+        for cntDayWnd in self.countDays:
+            key = f"{cntDayWnd.countDay.text}"
+            if not self.firstRun and self.movePos( cntDayWnd, key ):
+                continue
+            if top + cntDayWnd.height() >= self.screenRect.height():
+                left -= 160
+                top = 10
+            cntDayWnd.move( left, top )
+            Config.setValue( "wndposition", key, f"{left},{top}" )
+            top += cntDayWnd.height() + WndSpace
+        self.firstRun = False  # 之后重新创建的窗口使用已保存的位置
+    
+    @staticmethod
+    def movePos( wnd, posKey ) -> bool:
+        """将窗口移动到配置文件中保存的位置，没有保存位置时返回False"""
+        posString = Config.getValue( "wndposition", posKey )
+        if posString is None:
+            return False
+        x, y = list( map( int, posString.split( "," ) ) )
+        wnd.move( x, y )
+        return True
+    
     def moveWndPos( self ):
         """移动窗口位置"""
-        
-        def movePos( wnd, posKey ):
-            posString = Config.getValue( "wndposition", posKey )
-            x, y = list( map( int, posString.split( "," ) ) )
-            wnd.move( x, y )
-        
         wnds = [
             self.timeWnd,
             self.dailyWnd,
             self.calendarWnd,
             self.courseWnd,
         ]
-        wnds.extend( self.countDays )
         
         keys = [
             "timeWndPos",
@@ -164,42 +278,33 @@ class MainModule( QObject ):
             "calendarWidgetPos",
             "courseShdWndPos",
         ]
-        keys.extend( [f"{wnd.countDay.text}" for wnd in self.countDays] )
         
         for wnd, key in zip( wnds, keys ):
-            movePos( wnd, key )
+            self.movePos( wnd, key )
     
     def defaultWndPos( self, screenRect: QRect ):
         """设置默认窗口位置"""
-        space = 4
         left = screenRect.width() - 160
         top = 10
         
         self.timeWnd.move( left, top )
         Config.setValue( "wndposition", "timeWndPos", f"{left},{top}" )
-        top += self.timeWnd.height() + space
+        top += self.timeWnd.height() + WndSpace
         
         self.dailyWnd.move( left, top )
         Config.setValue( "wndposition", "dailyShdWndPos", f"{left},{top}" )
-        top += self.dailyWnd.height() + space
+        top += self.dailyWnd.height() + WndSpace
         
         self.calendarWnd.move( left, top )
         Config.setValue( "wndposition", "calendarWidgetPos", f"{left},{top}" )
-        top += self.calendarWnd.height() + space
+        top += self.calendarWnd.height() + WndSpace
         
         self.courseWnd.move( left, top )
         Config.setValue( "wndposition", "courseShdWndPos", f"{left},{top}" )
-        top += self.courseWnd.height() + space
-        
-        for cntDayWnd in self.countDays:
-            cntDayWnd.move( left, top )
-            Config.setValue( "wndposition", f"{cntDayWnd.countDay.text}", f"{left},{top}" )
-            top += cntDayWnd.height() + space
-            if top >= screenRect.height():
-                left -= 160
-                top = 10
     
     def __del__( self ):
         """析构函数"""
         self.closeAllWnd()
         self.timer.stop()
+        self.scheduler.stop()
+        self.dataSource.stopWatching()
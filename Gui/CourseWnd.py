@@ -3,11 +3,10 @@
 from PySide6 import QtCore, QtWidgets
 from PySide6.QtCore import QAbstractTableModel, QObject, Qt
 from PySide6.QtGui import QCloseEvent, QColor
-from PySide6.QtSql import QSqlTableModel
 from PySide6.QtWidgets import QAbstractItemView, QApplication, QDialog, QTableView
 
 from Gui.Style import SheetManager
-from Model import (closeDb, connectToDb)
+from Model import (closeDb, connectToDb, Connections, refreshRepository, saveCourses, tableRows)
 from Model.Norm import ClassPeriod, Weekday
 from Utils import logger, Screens
 
@@ -28,6 +27,9 @@ ViewStyleSheet = """
                     color: #000000;
                     }
               """
+EveryWeek = ("", "每周")  # 每周都上的课程的上课周，只有这些课程可以在表格中编辑
+LockedColor = QColor( 220, 220, 220 )  # 单双周课程所在单元格的背景色
+
 HeadStyleSheet = """
          QHeaderView::section {
              font-family: Arial;
@@ -49,6 +51,7 @@ class ScheduleItem:
             period: str = "",
             subject: str = "",
             modified: bool = False,
+            weeks: str = "",
     ):
         """
         初始化课程表项
@@ -56,11 +59,13 @@ class ScheduleItem:
         :param period: 节次
         :param subject: 课程
         :param modified: 是否修改
+        :param weeks: 上课周: 空字符串、每周、单周或双周
         """
         self.weekday: str = weekday
         self.period: str = period
         self.subject: str = subject
         self.modified: bool = modified
+        self.weeks: str = weeks
     
     def copyFrom( self, other ):
         """
@@ -71,6 +76,7 @@ class ScheduleItem:
         self.period = other.period
         self.subject = other.subject
         self.modified = other.modified
+        self.weeks = other.weeks
         return self
     
     def __copy__( self ):
@@ -78,7 +84,7 @@ class ScheduleItem:
         复制课程表项
         :return: 复制后的课程表项
         """
-        return ScheduleItem( self.weekday, self.period, self.subject, self.modified )
+        return ScheduleItem( self.weekday, self.period, self.subject, self.modified, self.weeks )
     
     def __eq__( self, other ):
         """
@@ -91,6 +97,7 @@ class ScheduleItem:
                 and self.period == other.period
                 and self.subject == other.subject
                 and self.modified == other.modified
+                and self.weeks == other.weeks
         )
     
     def __str__( self ):
@@ -105,26 +112,21 @@ class ScheduleItem:
         返回课程表项的字符串表示
         :return: 课程表项的字符串表示
         """
-        return f"ScheduleItem({self.weekday}, {self.period}, {self.subject}, {self.modified})"
+        return f"ScheduleItem({self.weekday}, {self.period}, {self.subject}, {self.modified}, {self.weeks})"
 
 
 class DatabaseManager( QObject ):
-    """数据库管理器"""
+    """数据库管理器，读取全部课程，单双周课程在配置窗口中编辑"""
     
     def __init__( self ):
         super().__init__()
         self.db = connectToDb()
-        # 读取表数据
+        # 读取表数据(weekday, period, course, weeks, ...)，显示窗口已经加载过并且数据库没有被修改时直接使用缓存
         if self.db is not None:
-            self.model = QSqlTableModel( self, db = self.db )
-            self.model.setTable( "CourseSchedule" )
-            self.model.select()
-            self.model.setEditStrategy( QSqlTableModel.EditStrategy.OnFieldChange )
-            self.model.setHeaderData( 0, Qt.Orientation.Horizontal, "星期" )
-            self.model.setHeaderData( 1, Qt.Orientation.Horizontal, "节次" )
-            self.model.setHeaderData( 2, Qt.Orientation.Horizontal, "课程" )
+            refreshRepository( self.db )
+            self.rows = list( tableRows( self.db, "CourseSchedule" ) )
         else:
-            self.model = None
+            self.rows = []
     
     def __del__( self ):
         if self.db is not None:
@@ -136,16 +138,20 @@ class DatabaseManager( QObject ):
     
     # 实现 __next__ 方法，返回下一个元素
     def __next__( self ):
-        if self.model is None:
-            raise StopIteration
-        if self._index < self.model.rowCount():
-            weekday = self.model.record( self._index ).value( "weekday" )
-            period = self.model.record( self._index ).value( "period" )
-            subject = self.model.record( self._index ).value( "course" )
+        if self._index < len( self.rows ):
+            weekday, period, subject, weeks = self.rows[self._index][:4]
             self._index += 1
-            return ScheduleItem( weekday, period, subject, False )
+            return ScheduleItem( weekday, period, subject, False, weeks )
         else:
             raise StopIteration  # 抛出 StopIteration 异常，表示迭代结束
+    
+    def save( self, upserts: list[tuple[str, str, str, str]], deletes: list[tuple[str, str, str]] ) -> bool:
+        """
+        在一个事务中保存修改的课程
+        :param upserts: 插入或修改的课程(weekday, period, course, weeks)
+        :param deletes: 删除的课程(weekday, period, weeks)
+        """
+        return saveCourses( self.db, upserts, deletes )
 
 
 class CourseTableModel( QAbstractTableModel ):
@@ -158,16 +164,78 @@ class CourseTableModel( QAbstractTableModel ):
         self.periods = ClassPeriod.CLASS_PERIODS  # 正课时段列表
         self.days = Weekday.CWEEKDAYS  # 星期列表
         self.dbMgr = DatabaseManager()  # 数据库管理器
+        self.loaded: dict[tuple[str, str], ScheduleItem] = dict()  # 数据库中每周都上的课程: (星期, 节次) -> 课程表项
+        self.locked: dict[tuple[str, str], list[ScheduleItem]] = dict()  # 有单双周课程的节次，只显示不能编辑
         self.load_data()
     
     def load_data( self ):
-        """从数据库加载课程数据"""
+        """
+        从数据库加载课程数据
+        单双周课程和同一节课重复的每周课程放入locked，单元格中显示这一节的全部课程，不能编辑
+        """
         for item in self.dbMgr:
-            row = self.periods.index( item.period )
-            col = self.days.index( item.weekday )
-            self.course_data[row][col].copyFrom( item )
+            if item.weekday not in self.days or item.period not in self.periods:
+                logger.warning( f"课程表窗口不显示[{item}]: 星期或节次无效" )
+                continue
+            key = (item.weekday, item.period)
+            if item.weeks.strip() in EveryWeek and key not in self.loaded:
+                self.loaded[key] = item
+            else:
+                self.locked.setdefault( key, list() ).append( item )
+        for key, items in self.locked.items():
+            item = self.loaded.pop( key, None )
+            if item is not None:
+                items.insert( 0, item )
+        
+        for (weekday, period), item in self.loaded.items():
+            self.course_data[self.periods.index( period )][self.days.index( weekday )].copyFrom( item )
+        for (weekday, period), items in self.locked.items():
+            cell = self.course_data[self.periods.index( period )][self.days.index( weekday )]
+            cell.weekday, cell.period = weekday, period
+            cell.subject = " / ".join( f"{item.weeks.strip() or '每周'}: {item.subject}" for item in items )
         logger.info( "课程表数据加载完毕" )
     
+    def isLocked( self, index ) -> bool:
+        """单元格所在的节次是否有单双周课程"""
+        return (self.days[index.column()], self.periods[index.row()]) in self.locked
+    
+    def changes( self ) -> tuple[list[tuple[str, str, str, str]], list[tuple[str, str, str]]]:
+        """
+        比较编辑后的课程和加载时的课程
+        :return: (插入或修改的课程(weekday, period, course, weeks), 删除的课程(weekday, period, weeks))
+        """
+        upserts, deletes = list(), list()
+        for row, period in enumerate( self.periods ):
+            for col, weekday in enumerate( self.days ):
+                if (weekday, period) in self.locked:
+                    continue  # 不在单双周课程所在的节次插入每周课程
+                subject = self.course_data[row][col].subject.strip()
+                loaded = self.loaded.get( (weekday, period) )
+                if loaded is None:
+                    if len( subject ) > 0:
+                        upserts.append( (weekday, period, subject, "") )
+                elif len( subject ) == 0:
+                    deletes.append( (weekday, period, loaded.weeks) )
+                elif subject != loaded.subject:
+                    upserts.append( (weekday, period, subject, loaded.weeks) )
+        return upserts, deletes
+    
+    def save( self ) -> bool:
+        """在一个事务中保存修改，成功后以当前内容作为新的加载状态"""
+        upserts, deletes = self.changes()
+        if not self.dbMgr.save( upserts, deletes ):
+            return False
+        for weekday, period, subject, weeks in upserts:
+            self.loaded[(weekday, period)] = ScheduleItem( weekday, period, subject, False, weeks )
+            logger.info( f"编辑课程表：修改[{weekday} {period} {subject}]" )
+        for weekday, period, _ in deletes:
+            item = self.loaded.pop( (weekday, period) )
+            logger.info( f"编辑课程表：删除[{weekday} {period} {item.subject}]" )
+        for items in self.course_data:
+            for item in items:
+                item.modified = False
+        return True
+    
     def rowCount( self, parent = QtCore.QModelIndex() ):
         """返回行数，即11节可"""
         return 11
@@ -190,6 +258,8 @@ class CourseTableModel( QAbstractTableModel ):
         # Qt.ItemDataRole.BackgroundRole：该角色用于获取单元格的背景颜色
         elif role == Qt.ItemDataRole.BackgroundRole:
             row = index.row()
+            if self.isLocked( index ):
+                return LockedColor
             if row < 4:  # 上午 4 节课
                 return QColor( 255, 235, 205 )  # 浅橙色
             elif row < 8:  # 下午 4 节课
@@ -199,6 +269,8 @@ class CourseTableModel( QAbstractTableModel ):
         # 设置文本居中对齐
         elif role == Qt.ItemDataRole.TextAlignmentRole:
             return Qt.AlignmentFlag.AlignCenter
+        elif role == Qt.ItemDataRole.ToolTipRole and self.isLocked( index ):
+            return "单双周课程请在配置窗口中编辑"
         
         return None
     
@@ -210,7 +282,7 @@ class CourseTableModel( QAbstractTableModel ):
         :param role:
         :return:
         """
-        if role == Qt.ItemDataRole.EditRole:
+        if role == Qt.ItemDataRole.EditRole and not self.isLocked( index ):
             item = self.course_data[index.row()][index.column()]
             item.weekday = self.days[index.column()]
             item.period = self.periods[index.row()]
@@ -222,10 +294,12 @@ class CourseTableModel( QAbstractTableModel ):
     
     def flags( self, index ):
         """
-        设置单元格可编辑
+        设置单元格可编辑，数据库以只读模式打开时和有单双周课程的单元格不可编辑
         :param index:
         :return:
         """
+        if Connections.readOnly or self.isLocked( index ):
+            return super().flags( index )
         return super().flags( index ) | Qt.ItemFlag.ItemIsEditable
     
     def headerData( self, section, orientation, role = Qt.ItemDataRole.DisplayRole ):
@@ -252,7 +326,7 @@ class CourseEditWnd( QDialog ):
     
     def __init__( self, parent = None ):
         super().__init__( parent )
-        self.setWindowTitle( "课程表" )
+        self.setWindowTitle( "课程表 (只读)" if Connections.readOnly else "课程表" )
         self.dialogStlManager = SheetManager( dialogStyleSheet )  # 对话框样式表管理器
         self.viewStlManager = SheetManager( ViewStyleSheet )  # 表格视图样式表管理器
         self.headStlManager = SheetManager( HeadStyleSheet )  # 表头样式表管理器
@@ -292,73 +366,8 @@ class CourseEditWnd( QDialog ):
     
     def closeEvent( self, event: QCloseEvent ):
         """处理窗口关闭事件，保存数据到数据库"""
-        db = self.model.dbMgr
-        
-        def editRecord( contentItem: ScheduleItem ):
-            """修改记录"""
-            filterCondition = (
-                f"weekday = '{contentItem.weekday}' and period = '{contentItem.period}'"
-            )
-            db.model.setFilter( filterCondition )
-            db.model.select()
-            if db.model.rowCount() > 0:
-                filteredRecord = db.model.record( 0 )
-                filteredRecord.setValue( "course", contentItem.subject )
-                db.model.submitAll()
-                db.model.setFilter( "" )
-                db.model.select()
-                logger.info(
-                    f"编辑课程表：修改[{contentItem.weekday} {contentItem.period} {contentItem.subject}]",
-                )
-                return True
-            return False
-        
-        def addRecord( contentItem: ScheduleItem ):
-            """添加记录"""
-            newRecord = db.model.record()
-            newRecord.setValue( "weekday", contentItem.weekday )
-            newRecord.setValue( "period", contentItem.period )
-            newRecord.setValue( "course", contentItem.subject )
-            db.model.insertRecord( -1, newRecord )
-            db.model.submitAll()
-            db.model.setFilter( "" )
-            db.model.select()
-            logger.info(
-                f"编辑课程表：添加[{contentItem.weekday} {contentItem.period} {contentItem.subject}]",
-            )
-            return True
-        
-        def removeRecord( contentItem: ScheduleItem ):
-            """删除记录"""
-            filterCondition = (
-                f"weekday = '{contentItem.weekday}' and period = '{contentItem.period}'"
-            )
-            db.model.setFilter( filterCondition )
-            db.model.select()
-            if db.model.rowCount() > 0:
-                db.model.removeRow( 0 )
-                db.model.submitAll()
-                db.model.setFilter( "" )
-                db.model.select()
-                logger.info(
-                    f"编辑课程表：删除[{contentItem.weekday} {contentItem.period} {contentItem.subject}]",
-                )
-                return True
-            return False
-        
-        for row in range( self.model.rowCount() ):
-            for col in range( self.model.columnCount() ):
-                item = self.model.course_data[row][col]
-                if item.modified and len( item.subject.strip() ) > 0:
-                    # 修改数据或添加数据
-                    if not editRecord( item ):
-                        addRecord( item )
-                    item.modified = False
-                elif item.modified and len( item.subject.strip() ) == 0:
-                    # 删除数据
-                    if removeRecord( item ):
-                        pass
-                    item.modified = False
+        if not self.model.save():
+            logger.error( "保存课程表失败，修改未写入数据库" )
         
         logger.info( "关闭课程表窗口" )
         event.accept()
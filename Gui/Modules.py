@@ -131,7 +131,7 @@ class DailyShdWnd( CLabelWnd ):
         """Check if the schedule is expired"""
         if self.dailyShd is None:
             return True
-        return self.dailyShd.isExpired( curDateTime )
+        return self.dailyShd.isExpired( curDateTime.toSecsSinceEpoch() )
     
     def mouseDoubleClickEvent( self, event: QMouseEvent ):
         """
@@ -196,7 +196,7 @@ class CourseShdWnd( CLabelWnd ):
         """Check if the schedule is expired"""
         if self.courseShd is None:
             return True
-        return self.courseShd.isExpired( curDateTime )
+        return self.courseShd.isExpired( curDateTime.toSecsSinceEpoch() )
     
     def mouseDoubleClickEvent( self, event: QMouseEvent ):
         """
@@ -0,0 +1,124 @@
+"""截止时间调度模块"""
+
+import heapq
+import itertools
+
+from PySide6.QtCore import QDateTime, QObject, Qt, QTimer
+
+MaxInterval = 3600 * 1000  # 单次定时器的最长等待时间，单位为毫秒
+
+
+class DeadlineQueue:
+    """
+    截止时间优先队列
+    按时间先后保存即将到来的时间点，每个时间点有一个唯一的key，
+    重复添加同一个key时，旧的时间点自动作废
+    时间单位为毫秒(自1970-01-01起)
+    """
+
+    def __init__( self ):
+        self.__heap: list = list()
+        self.__counter = itertools.count()  # 保证同一时间点按添加顺序出队
+        self.__entries: dict = dict()  # key -> 当前有效的队列项
+
+    def push( self, key: str, when: int, callback: callable, lateness: int = None ):
+        """
+        添加或更新时间点
+        :param key: 时间点名称
+        :param when: 时间点，单位为毫秒
+        :param callback: 到期后调用的函数
+        :param lateness: 允许的最大延迟，单位为毫秒，超过后视为过期不再调用(例如休眠唤醒后)；None表示不限
+        """
+        self.cancel( key )
+        entry = [when, next( self.__counter ), key, callback, lateness]
+        self.__entries[key] = entry
+        heapq.heappush( self.__heap, entry )
+
+    def cancel( self, key: str ):
+        """取消时间点"""
+        entry = self.__entries.pop( key, None )
+        if entry is not None:
+            entry[3] = None  # 标记为作废，出队时跳过
+
+    def clear( self ):
+        """清空队列"""
+        self.__heap.clear()
+        self.__entries.clear()
+
+    def peek( self ) -> int | None:
+        """获取最近的时间点，队列为空时返回None"""
+        while self.__heap and self.__heap[0][3] is None:
+            heapq.heappop( self.__heap )
+        if self.__heap:
+            return self.__heap[0][0]
+        return None
+
+    def popDue( self, now: int ) -> list[callable]:
+        """取出所有已到期的时间点，返回对应的回调函数列表，超过最大延迟的时间点直接丢弃"""
+        callbacks = list()
+        while self.__heap and self.__heap[0][0] <= now:
+            when, _, key, callback, lateness = heapq.heappop( self.__heap )
+            if callback is None:
+                continue
+            del self.__entries[key]
+            if lateness is not None and now - when > lateness:
+                continue
+            callbacks.append( callback )
+        return callbacks
+
+    def __len__( self ):
+        return len( self.__entries )
+
+
+class DeadlineScheduler( QObject ):
+    """
+    截止时间调度器
+    只为最近的时间点启动一个单次定时器，触发后执行到期回调并重新装载定时器
+    """
+
+    def __init__( self, parent = None ):
+        super().__init__( parent )
+        self.queue = DeadlineQueue()
+        self.wakeups: int = 0  # 定时器唤醒次数
+        self.timer = QTimer( self )
+        self.timer.setSingleShot( True )
+        self.timer.setTimerType( Qt.TimerType.PreciseTimer )
+        self.timer.timeout.connect( self.onTimeout )
+
+    def schedule( self, key: str, when: QDateTime, callback: callable, lateness: int = None ):
+        """
+        安排时间点，同一个key只保留最后一次安排
+        :param key: 时间点名称
+        :param when: 到期时间
+        :param callback: 到期后调用的函数
+        :param lateness: 允许的最大延迟，单位为毫秒，None表示不限
+        """
+        self.queue.push( key, when.toMSecsSinceEpoch(), callback, lateness )
+        self.rearm()
+
+    def cancel( self, key: str ):
+        """取消时间点"""
+        self.queue.cancel( key )
+        self.rearm()
+
+    def stop( self ):
+        """停止调度"""
+        self.timer.stop()
+        self.queue.clear()
+
+    def rearm( self ):
+        """为最近的时间点重新启动定时器"""
+        deadline = self.queue.peek()
+        if deadline is None:
+            self.timer.stop()
+            return
+        now = QDateTime.currentMSecsSinceEpoch()
+        interval = min( max( deadline - now, 0 ), MaxInterval )
+        self.timer.start( interval )
+
+    def onTimeout( self ):
+        """定时器到期，执行所有到期回调"""
+        self.wakeups += 1
+        for callback in self.queue.popDue( QDateTime.currentMSecsSinceEpoch() ):
+            callback()
+        self.rearm()
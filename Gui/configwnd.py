@@ -1,21 +1,48 @@
 """创建QTableView窗口，用于数据库数据的显示和编辑"""
 
+from collections.abc import Iterable, Iterator
+
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QAction, QCloseEvent
 from PySide6.QtSql import QSqlTableModel
 from PySide6.QtWidgets import (
+    QAbstractItemView,
     QDialog,
+    QFileDialog,
     QMenu,
+    QMessageBox,
     QStyledItemDelegate,
     QTableView,
     QTabWidget,
+    QToolTip,
     QVBoxLayout,
 )
 
 from Gui.Style import SheetManager
-from Model import closeDb, connectToDb, createDbTable
+from Model import (
+    closeDb,
+    connectToDb,
+    Connections,
+    IcsTables,
+    ImportColumns,
+    importFile,
+    refreshRepository,
+    saveTableChanges,
+    TableChanges,
+    tableRows,
+    validateCell,
+    validateDatabase,
+    validateSchedules,
+    validateTable,
+)
 from Utils import logger, Screens
 
+MaxShownIssues = 30  # 检查结果中最多显示的问题数
+HiddenColumns = ("id", "start_minute", "end_minute")  # 由数据库维护的列，不显示也不写入
+DeletedRowMark = "!"  # OnManualSubmit模式下标记为删除的行的表头
+InsertedRowMark = "*"  # OnManualSubmit模式下新增的行的表头
+CheckedTables = ("DailySchedule", "CourseSchedule", "ClassSchedule")  # 可以检查时间冲突的表
+
 dialogStyleSheet = """
     QDialog {
         background-color: #d0d0ff;
@@ -45,6 +72,69 @@ HeadStyleSheet = """
     """
 
 
+def fetchAll( model: QSqlTableModel ):
+    """读取模型中还没有读取的行，QSQLITE每次只读取256行，没有读取的行不会被校验和保存"""
+    while model.canFetchMore():
+        model.fetchMore()
+
+
+def selectAll( model: QSqlTableModel ) -> bool:
+    """重新读取表的全部行"""
+    if not model.select():
+        return False
+    fetchAll( model )
+    return True
+
+
+def modelChanges( model: QSqlTableModel ) -> TableChanges:
+    """
+    收集模型中未保存的修改，按行的状态分为修改、新增和删除，没有修改的行不写入
+    :param model: 表格模型，HiddenColumns以外的列都写入
+    """
+    record = model.record()
+    columns = [record.fieldName( i ) for i in range( record.count() ) if record.fieldName( i ) not in HiddenColumns]
+    indexes = [model.fieldIndex( name ) for name in columns]
+    idIndex = model.fieldIndex( "id" )
+    changes = TableChanges( columns )
+    for row in range( model.rowCount() ):
+        mark = model.headerData( row, Qt.Orientation.Vertical )
+        rowId = model.data( model.index( row, idIndex ) )
+        if mark == DeletedRowMark:
+            if rowId is not None and rowId != "":
+                changes.deleted.append( int( rowId ) )
+            continue
+        if mark != InsertedRowMark and not any( model.isDirty( model.index( row, index ) ) for index in indexes ):
+            continue
+        values = list()
+        for index in indexes:
+            value = model.data( model.index( row, index ) )
+            values.append( "" if value is None else str( value ) )
+        if mark == InsertedRowMark:
+            changes.inserted.append( tuple( values ) )
+        else:
+            changes.updated.append( (*values, rowId) )
+    return changes
+
+
+def modelRows( model: QSqlTableModel, columns: list[str] = None ) -> Iterator[tuple | dict]:
+    """
+    逐行返回模型中的数据，包括未保存的修改，不包括标记为删除的行，NULL转换为空字符串
+    :param model: 表格模型
+    :param columns: 按顺序返回的列，为None时返回 列名 -> 值
+    """
+    record = model.record()
+    names = columns if columns is not None else [record.fieldName( i ) for i in range( record.count() )]
+    indexes = [model.fieldIndex( name ) for name in names]
+    for row in range( model.rowCount() ):
+        if model.headerData( row, Qt.Orientation.Vertical ) == DeletedRowMark:
+            continue
+        values = list()
+        for index in indexes:
+            value = model.data( model.index( row, index ) ) if index >= 0 else None
+            values.append( "" if value is None else str( value ) )
+        yield tuple( values ) if columns is not None else dict( zip( names, values ) )
+
+
 class CenteredItemDelegate( QStyledItemDelegate ):
     """自定义委托类，用于居中显示单元格内容"""
     
@@ -52,14 +142,29 @@ class CenteredItemDelegate( QStyledItemDelegate ):
         """初始化样式选项"""
         super().initStyleOption( option, index )
         option.displayAlignment = Qt.AlignmentFlag.AlignCenter
+    
+    def setModelData( self, editor, model, index ):
+        """写入数据前按表的校验规则检查，格式错误时不写入并提示原因"""
+        if isinstance( model, QSqlTableModel ):
+            value = editor.property( editor.metaObject().userProperty().name() )
+            column = model.record().fieldName( index.column() )
+            message = validateCell( model.tableName(), column, value )
+            if message is not None:
+                QToolTip.showText( editor.mapToGlobal( editor.rect().bottomLeft() ), f"{message}: {value}", editor )
+                logger.warning( f"{model.tableName()}.{column} 格式错误: {value}" )
+                return
+        super().setModelData( editor, model, index )
 
 
 class TableView( QTableView ):
     """自定义QTableView类，用于显示和编辑数据"""
     
-    def __init__( self, parent = None, model = None ):
+    def __init__( self, parent = None, model = None, readOnly: bool = False ):
         super().__init__( parent )
         self.setModel( model )
+        self.readOnly = readOnly  # 只读模式下不能编辑、添加、删除和导入
+        if readOnly:
+            self.setEditTriggers( QAbstractItemView.EditTrigger.NoEditTriggers )
         self.viewStyleManager = SheetManager( ViewStyleSheet )
         self.headStlManager = SheetManager( HeadStyleSheet )
         self.setStyleSheet( self.viewStyleManager.getStyleSheet() )
@@ -75,25 +180,83 @@ class TableView( QTableView ):
         # 设置自定义委托, 用于居中显示单元格内容
         delegate = CenteredItemDelegate()
         self.setItemDelegate( delegate )
+        
+        if model is not None:
+            for column in HiddenColumns:
+                index = model.fieldIndex( column )
+                if index >= 0:
+                    self.setColumnHidden( index, True )
     
     def contextMenuEvent( self, event ):
         """处理鼠标右键点击事件，显示上下文菜单"""
         menu = QMenu( self )
         
-        insert_action = QAction( "插入记录", self )
-        insert_action.triggered.connect( self.insert_row_before )
-        menu.addAction( insert_action )
-        
-        add_action = QAction( "添加记录", self )
-        add_action.triggered.connect( self.add_record )
-        menu.addAction( add_action )
+        if not self.readOnly:
+            insert_action = QAction( "插入记录", self )
+            insert_action.triggered.connect( self.insert_row_before )
+            menu.addAction( insert_action )
+            
+            add_action = QAction( "添加记录", self )
+            add_action.triggered.connect( self.add_record )
+            menu.addAction( add_action )
+            
+            delete_action = QAction( "删除记录", self )
+            delete_action.triggered.connect( self.delete_record )
+            menu.addAction( delete_action )
         
-        delete_action = QAction( "删除记录", self )
-        delete_action.triggered.connect( self.delete_record )
-        menu.addAction( delete_action )
+        model = self.model()
+        if model is not None and model.tableName() in ImportColumns and not self.readOnly:
+            import_action = QAction( "批量导入", self )
+            import_action.triggered.connect( self.import_records )
+            menu.addAction( import_action )
+        if model is not None and model.tableName() in CheckedTables:
+            check_action = QAction( "检查时间冲突", self )
+            check_action.triggered.connect( self.check_schedules )
+            menu.addAction( check_action )
         
         menu.exec( event.globalPos() )
     
+    def import_records( self ):
+        """从CSV或.ics文件批量导入记录"""
+        model = self.model()
+        if model.isDirty():  # 导入后重新读取表会丢失未保存的修改
+            QMessageBox.information( self, "批量导入", "表格中有未保存的修改，请关闭配置窗口保存后再导入" )
+            return
+        if model.tableName() in IcsTables:
+            fileFilter = "CSV或iCalendar文件 (*.csv *.ics)"
+        else:
+            fileFilter = "CSV文件 (*.csv)"
+        fileName, _ = QFileDialog.getOpenFileName( self, "批量导入", "", fileFilter )
+        if len( fileName ) == 0:
+            return
+        if model.tableName() == "Holidays":  # 新公布的节假日安排替换同一年的原有记录
+            question = "是否删除文件中各年份原有的节假日?"
+        else:
+            question = "是否清空原有数据?"
+        replace = QMessageBox.question( self, "批量导入", question ) == QMessageBox.StandardButton.Yes
+        report = importFile( model.database(), model.tableName(), fileName, replace )
+        selectAll( model )
+        message = report.summary()
+        reportFile = report.save()
+        if reportFile is not None:
+            message += f"\n错误报告: {reportFile}"
+        QMessageBox.information( self, "批量导入", message )
+    
+    def check_schedules( self ):
+        """检查作息表和课程表中的时间重叠、间隔和不存在的时间段，包括未保存的修改"""
+        dialog = self.window()
+        if isinstance( dialog, ConfigDialog ):
+            issues = dialog.scheduleIssues()
+        else:
+            issues = validateDatabase( self.model().database() )
+        if len( issues ) == 0:
+            QMessageBox.information( self, "检查时间冲突", "没有发现问题" )
+            return
+        lines = [str( issue ) for issue in issues[:MaxShownIssues]]
+        if len( issues ) > MaxShownIssues:
+            lines.append( f"... 共{len( issues )}个问题" )
+        QMessageBox.warning( self, "检查时间冲突", "\n".join( lines ) )
+    
     def add_record( self ):
         """添加新记录到模型"""
         model = self.model()
@@ -113,9 +276,9 @@ class TableView( QTableView ):
         index = self.currentIndex()
         if index.isValid():
             model = self.model()
-            model.removeRow( index.row() )
-            model.submitAll()
-            model.select()
+            model.removeRow( index.row() )  # 关闭窗口时保存
+            if model.headerData( index.row(), Qt.Orientation.Vertical ) == DeletedRowMark:
+                self.hideRow( index.row() )
 
 
 class ConfigDialog( QDialog ):
@@ -124,63 +287,47 @@ class ConfigDialog( QDialog ):
     def __init__( self, parent = None, logger = None ):
         super().__init__( parent )
         
-        self.setWindowTitle( "配置" )
+        self.readOnly: bool = Connections.readOnly  # 数据库以只读模式打开时只能查看
+        self.setWindowTitle( "配置 (只读)" if self.readOnly else "配置" )
         self.styleManager = SheetManager( dialogStyleSheet )
         self.setStyleSheet( self.styleManager.getStyleSheet() )
         
+        self.selectedModels: list[QSqlTableModel] = list()  # 已经读取数据的模型，打开对应的页时才读取
         self.db = connectToDb()
-        if self.db is not None:
-            
-            if not createDbTable(
-                    self.db,
-                    "DailySchedule",
-                    ["start_time TEXT", "end_time TEXT", "period TEXT"],
-            ):
-                logger.error( "创建DailySchedule表失败" )
-            
-            if not createDbTable(
-                    self.db,
-                    "CourseSchedule",
-                    ["weekday TEXT", "period TEXT", "course TEXT"],
-            ):
-                logger.error( "创建CourseSchedule表失败" )
-            
-            if not createDbTable(
-                    self.db,
-                    "params",
-                    ["key TEXT", "value TEXT"],
-            ):
-                logger.error( "创建params表失败" )
-            
-            if not createDbTable(
-                    self.db,
-                    "Countdown",
-                    ["dateAndtime TEXT", "description TEXT"],
-            ):
-                logger.error( "创建Countdown表失败" )
-            
+        refreshRepository( self.db )  # 还没有打开的页和冲突检查使用缓存的数据行
+        if self.db is not None:  # 表结构由程序启动时的upgradeDatabase()创建和升级
             self.dailyScheduleModel = QSqlTableModel( self, self.db )
             self.dailyScheduleModel.setTable( "DailySchedule" )
-            self.dailyScheduleModel.select()
+            self.dailyScheduleModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
             
             self.courseScheduleModel = QSqlTableModel( self, self.db )
             self.courseScheduleModel.setTable( "CourseSchedule" )
-            self.courseScheduleModel.select()
+            self.courseScheduleModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
+            
+            self.classScheduleModel = QSqlTableModel( self, self.db )
+            self.classScheduleModel.setTable( "ClassSchedule" )
+            self.classScheduleModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
             
             self.paramsModel = QSqlTableModel( self, self.db )
             self.paramsModel.setTable( "params" )
-            self.paramsModel.select()
+            self.paramsModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
             
             self.countdownModel = QSqlTableModel( self, self.db )
             self.countdownModel.setTable( "Countdown" )
-            self.countdownModel.select()
+            self.countdownModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
+            
+            self.holidaysModel = QSqlTableModel( self, self.db )
+            self.holidaysModel.setTable( "Holidays" )
+            self.holidaysModel.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
         
         else:
             self.db = None
             self.dailyScheduleModel = None
             self.courseScheduleModel = None
+            self.classScheduleModel = None
             self.paramsModel = None
             self.countdownModel = None
+            self.holidaysModel = None
         
         self.createUI()
         self.setWndGeometry()
@@ -207,56 +354,132 @@ class ConfigDialog( QDialog ):
         self.tab_widget = QTabWidget( self )
         
         self.tab_widget.addTab(
-            TableView( self, model = self.dailyScheduleModel ),
+            TableView( self, model = self.dailyScheduleModel, readOnly = self.readOnly ),
             "作息时间",
         )
         self.tab_widget.addTab(
-            TableView( self, model = self.courseScheduleModel ),
+            TableView( self, model = self.courseScheduleModel, readOnly = self.readOnly ),
             "课程表",
         )
         self.tab_widget.addTab(
-            TableView( self, model = self.countdownModel ),
+            TableView( self, model = self.classScheduleModel, readOnly = self.readOnly ),
+            "多班级课程表",
+        )
+        self.tab_widget.addTab(
+            TableView( self, model = self.countdownModel, readOnly = self.readOnly ),
             "倒计时",
         )
         self.tab_widget.addTab(
-            TableView( self, model = self.paramsModel ),
+            TableView( self, model = self.holidaysModel, readOnly = self.readOnly ),
+            "节假日",
+        )
+        self.tab_widget.addTab(
+            TableView( self, model = self.paramsModel, readOnly = self.readOnly ),
             "参数",
         )
         
+        self.tab_widget.currentChanged.connect( self.selectTab )
+        self.selectTab( self.tab_widget.currentIndex() )
+        
         layout = QVBoxLayout( self )
         layout.addWidget( self.tab_widget )
         layout.setContentsMargins( 0, 0, 0, 0 )
         self.setLayout( layout )
     
+    def selectTab( self, index: int ):
+        """第一次打开一页时读取对应表的全部数据"""
+        view = self.tab_widget.widget( index )
+        model = view.model() if view is not None else None
+        if model is not None and model not in self.selectedModels:
+            selectAll( model )
+            self.selectedModels.append( model )
+    
+    def scheduleRows( self, model: QSqlTableModel ) -> Iterable[tuple]:
+        """表格中的数据行(包括未保存的修改)，还没有打开的页使用缓存的数据"""
+        if model in self.selectedModels:
+            return modelRows( model, ImportColumns[model.tableName()] )
+        return tableRows( self.db, model.tableName() )
+    
+    def models( self ) -> list[QSqlTableModel]:
+        """所有表格模型"""
+        models = [
+            self.dailyScheduleModel,
+            self.courseScheduleModel,
+            self.classScheduleModel,
+            self.paramsModel,
+            self.countdownModel,
+            self.holidaysModel,
+        ]
+        return [model for model in models if model is not None]
+    
+    def scheduleIssues( self ) -> list:
+        """检查编辑后(包括未保存的修改)的作息表、课程表和多班级课程表"""
+        if self.dailyScheduleModel is None or self.courseScheduleModel is None:
+            return []
+        refreshRepository( self.db )
+        return validateSchedules(
+            self.scheduleRows( self.dailyScheduleModel ),
+            self.scheduleRows( self.courseScheduleModel ),
+            self.scheduleRows( self.classScheduleModel ),
+        )
+    
+    def pendingProblems( self, dirty: list[QSqlTableModel] ) -> list[str]:
+        """
+        保存前检查修改过的表: 单元格格式和行校验，以及作息表和课程表之间的问题
+        :param dirty: 修改过的表格模型
+        :return: 必须修正的问题
+        """
+        problems = list()
+        for model in dirty:
+            try:
+                report = validateTable( model.tableName(), modelRows( model ) )
+            except KeyError:  # 不校验的表
+                continue
+            problems.extend( f"{model.tableName()} {error}" for error in report.errors )
+        scheduleModels = (self.dailyScheduleModel, self.courseScheduleModel, self.classScheduleModel)
+        if any( model in dirty for model in scheduleModels ):
+            problems.extend( str( issue ) for issue in self.scheduleIssues() if issue.blocking )
+        return problems
+    
+    def save( self ) -> str | None:
+        """
+        在一个事务中保存所有修改过的表，先检查全部修改，有问题时不写入任何表
+        只按id写入修改、新增和删除的行(不调用submitAll)，失败时模型中的修改全部保留，可以继续编辑
+        :return: 保存失败的原因，成功或没有修改时返回None
+        """
+        dirty = [model for model in self.models() if model.isDirty()]
+        if len( dirty ) == 0:
+            return None
+        for model in dirty:  # 校验和保存之前读取全部行
+            fetchAll( model )
+        problems = self.pendingProblems( dirty )
+        if len( problems ) > 0:
+            lines = problems[:MaxShownIssues]
+            if len( problems ) > MaxShownIssues:
+                lines.append( f"... 共{len( problems )}个问题" )
+            return "\n".join( lines )
+        message = saveTableChanges( self.db, {model.tableName(): modelChanges( model ) for model in dirty} )
+        if message is not None:
+            return message
+        for model in dirty:  # 修改已写入数据库，重新读取(包括新分配的主键和其他程序的修改)
+            selectAll( model )
+        logger.info( f"保存配置: {', '.join( model.tableName() for model in dirty )}" )
+        return None
+    
     def closeEvent( self, event: QCloseEvent ):
-        """处理窗口关闭事件，保存数据到数据库"""
-        if hasattr( self, "dailyScheduleModel" ):
-            if (
-                    self.dailyScheduleModel is not None
-                    and not self.dailyScheduleModel.submitAll()
-            ):
-                logger.error(
-                    f"保存作息时间数据失败: {self.dailyScheduleModel.lastError().text()}",
-                )
-        
-        if hasattr( self, "courseScheduleModel" ):
-            if (
-                    self.courseScheduleModel is not None
-                    and not self.courseScheduleModel.submitAll()
-            ):
-                logger.error(
-                    f"保存课程表数据失败: {self.courseScheduleModel.lastError().text()}",
-                )
-        
-        if hasattr( self, "paramsModel" ):
-            if self.paramsModel is not None and not self.paramsModel.submitAll():
-                logger.error( f"保存参数数据失败: {self.paramsModel.lastError().text()}" )
-        
-        if hasattr( self, "countdownModel" ):
-            if self.countdownModel is not None and not self.countdownModel.submitAll():
-                logger.error(
-                    f"保存倒数日数据失败: {self.countdownModel.lastError().text()}",
+        """处理窗口关闭事件，在一个事务中保存修改过的表，没有修改时不写入数据库"""
+        if self.db is not None:
+            message = self.save()
+            if message is not None:
+                answer = QMessageBox.question(
+                    self, "保存配置", f"修改未保存:\n{message}\n\n是否放弃修改并关闭?",
                 )
+                if answer != QMessageBox.StandardButton.Yes:
+                    event.ignore()
+                    return
+                for model in self.models():
+                    model.revertAll()
+                logger.warning( "放弃配置窗口中的修改" )
         
         closeDb( self.db )
         logger.info( "关闭配置窗口" )
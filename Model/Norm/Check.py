@@ -1,29 +1,95 @@
 """数据校验模块"""
 import re
 
+from .Constants import Weekday
+
+# 预编译的正则表达式，避免每次校验时查找re模块的缓存
+WeekdayPattern = re.compile( r"^(星期一|星期二|星期三|星期四|星期五|星期六|星期日)$" )
+DatePattern = re.compile( r"^\d{4}-\d{1,2}-\d{1,2}$" )
+TimePattern = re.compile( r"^\d{1,2}:\d{1,2}$" )
+PeriodPattern = re.compile( r"^(上午|下午|晚上)第[一二三四五六七八九十]+节$|^(课间休息|下班|午休|晚饭时间|休息时间|体育锻炼)$" )
+
+MonthDays = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
 
 def checkWeekdayString( weekdayString: str ) -> bool:
     """检查星期字符串格式是否正确"""
-    pattern = r"^(星期一|星期二|星期三|星期四|星期五|星期六|星期日)$"
-    return bool( re.match( pattern, weekdayString ) )
+    return WeekdayPattern.match( weekdayString ) is not None
 
 
 def checkDateString( dateString: str ) -> bool:
     """检查日期字符串格式是否正确"""
-    pattern = r"^\d{4}-\d{1,2}-\d{1,2}$"
-    return bool( re.match( pattern, dateString ) )
+    return DatePattern.match( dateString ) is not None
 
 
 def checkTimeString( timeString: str ) -> bool:
     """检查时间字符串格式是否正确"""
-    pattern = r"^\d{1,2}:\d{1,2}$"
-    return bool( re.match( pattern, timeString ) )
+    return TimePattern.match( timeString ) is not None
 
 
 def checkPeriodString( periodString: str ) -> bool:
     """检查时间段字符串格式是否正确"""
-    pattern = r"^(上午|下午|晚上)第[一二三四五六七八九十]+节$|^(课间休息|下班|午休|晚饭时间|休息时间|体育锻炼)$"
-    return bool( re.match( pattern, periodString ) )
+    return PeriodPattern.match( periodString ) is not None
+
+
+def parseTime( timeString: str ) -> int | None:
+    """
+    不使用正则表达式，直接将 h:mm 格式的时间解析为当天零点起的分钟数
+    允许空格和全角冒号，格式错误或超出范围时返回None
+    """
+    hour, sep, minute = timeString.partition( ":" )
+    if not sep:
+        hour, sep, minute = timeString.partition( "：" )
+    if not (hour.isdigit() and minute.isdigit()):
+        hour, minute = hour.replace( " ", "" ), minute.replace( " ", "" )
+        if not (hour.isdigit() and minute.isdigit()):
+            return None
+    if len( hour ) > 2 or len( minute ) > 2 or not (hour.isascii() and minute.isascii()):
+        return None
+    hour, minute = int( hour ), int( minute )
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def parseDateParts( dateString: str ) -> tuple[int, int, int] | None:
+    """
+    不使用正则表达式，将 yyyy-m-d 格式的日期解析为(年, 月, 日)
+    允许空格，格式错误或日期不存在时返回None
+    """
+    if " " in dateString:
+        dateString = dateString.replace( " ", "" )
+    if not dateString.isascii():
+        return None
+    parts = dateString.split( "-" )
+    if len( parts ) != 3:
+        return None
+    year, month, day = parts
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
+    if len( year ) > 4 or len( month ) > 2 or len( day ) > 2:
+        return None
+    year, month, day = int( year ), int( month ), int( day )
+    if year == 0 or not 1 <= month <= 12:
+        return None
+    leap = month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    if not 1 <= day <= MonthDays[month - 1] + leap:
+        return None
+    return year, month, day
+
+
+def julianDayNumber( year: int, month: int, day: int ) -> int:
+    """用整数运算计算公历日期的儒略日(与QDate.toJulianDay()相同)"""
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    return day + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+
+
+def parseDate( dateString: str ) -> int | None:
+    """将 yyyy-m-d 格式的日期解析为儒略日，格式错误或日期不存在时返回None"""
+    parts = parseDateParts( dateString )
+    return julianDayNumber( *parts ) if parts is not None else None
 
 
 def formatTimeString( timeString ):
@@ -64,3 +130,23 @@ def formatDateString( dateString: str ):
         day = day.zfill( 2 )
         return f"{year}-{month}-{day}"
     return dateString
+
+
+def parseDayType( dayTypeString: str ) -> list[int] | None:
+    """
+    解析作息表的适用日期
+    :param dayTypeString: 空字符串表示默认作息, 也可以是星期(星期五)、日类型(工作日, 周末)或用逗号分隔的组合
+    :return: 适用的星期序号列表(0为星期一), 默认作息返回None, 格式错误返回空列表
+    """
+    dayTypeString = (dayTypeString or "").replace( " ", "" ).replace( "，", "," )
+    if len( dayTypeString ) == 0:
+        return None
+    weekdays = list()
+    for part in dayTypeString.split( "," ):
+        if part in Weekday.CDAYTYPES:
+            weekdays.extend( Weekday.CDAYTYPES[part] )
+        elif part in Weekday.CWEEKDAYS:
+            weekdays.append( Weekday.CWEEKDAYS.index( part ) )
+        else:
+            return list()
+    return sorted( set( weekdays ) )
@@ -21,6 +21,33 @@ class Weekday:
     CSATURDAY = "星期六"
     CSUNDAY = "星期日"
     CWEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+    
+    # 作息表使用的日类型，对应的星期序号(0为星期一)
+    CWORKDAYS = "工作日"
+    CWEEKEND = "周末"
+    CDAYTYPES = {
+        "工作日": [0, 1, 2, 3, 4],
+        "周末": [5, 6],
+    }
+    
+    # 课程表使用的上课周，对应的(间隔周数, ISO周数的余数)
+    CEVERYWEEK = "每周"
+    CODDWEEK = "单周"
+    CEVENWEEK = "双周"
+    CWEEKRULES = {
+        "": (1, 0),
+        "每周": (1, 0),
+        "单周": (2, 1),
+        "双周": (2, 0),
+    }
+
+
+class Holiday:
+    """节假日类型常量"""
+    
+    CDAYOFF = "放假"
+    CWORKDAY = "补班"  # 调休上班，按weekday列指定的星期上课
+    CKINDS = ["放假", "补班"]
 
 
 class Month:
@@ -0,0 +1,171 @@
+"""作息表和课程表的时间冲突检查"""
+
+from collections.abc import Callable, Iterable
+from operator import itemgetter
+
+OVERLAP = "overlap"  # 时间重叠
+GAP = "gap"  # 两个时间段之间有空隙
+EMPTY = "empty"  # 时长为零或结束时间早于开始时间
+MISSING = "missing"  # 课程的时间段在作息表中不存在
+BLOCKING = frozenset( [EMPTY, MISSING] )  # 保存前必须修正的问题，重叠和间隔只作提示
+
+IssueNames = {
+    OVERLAP: "时间重叠",
+    GAP: "时间间隔",
+    EMPTY: "时长无效",
+    MISSING: "时间段不存在",
+}
+
+
+def formatMinute( minute: int ) -> str:
+    """将当天零点起的分钟数转换为 hh:mm"""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class ScheduleIssue:
+    """检查发现的一个问题"""
+
+    __slots__ = ("kind", "group", "start", "end", "first", "second", "count")
+
+    def __init__( self, kind: str, group: str, start: int, end: int, first: str, second: str = "" ):
+        """
+        :param kind: 问题类型: OVERLAP, GAP, EMPTY, MISSING
+        :param group: 所在分组(星期、班级等)
+        :param start: 问题时间段的开始(当天零点起的分钟数)
+        :param end: 问题时间段的结束
+        :param first: 相关的第一项
+        :param second: 相关的第二项，多项互相重叠时为最后一项
+        """
+        self.kind: str = kind
+        self.group: str = group
+        self.start: int = start
+        self.end: int = end
+        self.first: str = first
+        self.second: str = second
+        self.count: int = 2 if len( second ) > 0 else 1  # 相关的项数，连续重叠的多项合并为一个问题
+
+    @property
+    def blocking( self ) -> bool:
+        """是否是保存前必须修正的问题"""
+        return self.kind in BLOCKING
+
+    def key( self ) -> tuple:
+        """除分组外的内容，用于合并不同分组中相同的问题"""
+        return self.kind, self.start, self.end, self.first, self.second, self.count
+
+    def extend( self, end: int, name: str ):
+        """将与本问题连续重叠的一项合并到本问题中"""
+        self.end = max( self.end, end )
+        self.second = name
+        self.count += 1
+
+    def __str__( self ):
+        if self.kind == MISSING:
+            return f"{IssueNames[self.kind]}: {self.group} {self.first} {self.second}"
+        names = f"{self.first} / {self.second}" if len( self.second ) > 0 else self.first
+        if self.count > 2:
+            names += f" 等{self.count}项"
+        return f"{IssueNames[self.kind]}: {self.group} {formatMinute( self.start )}-{formatMinute( self.end )} {names}"
+
+
+def findIntervalIssues(
+        intervals: Iterable[tuple],
+        reportGaps: bool = True,
+        presorted: bool = False,
+) -> list[ScheduleIssue]:
+    """
+    扫描线检查时间段的重叠、间隔和无效时长，排序 O(n log n)，扫描 O(n)
+    多个分组(例如多个班级的课程表)可以放在一起一次检查；连续重叠的多项合并为一个问题
+    :param intervals: [(分组, 开始分钟, 结束分钟, 名称), ...]
+    :param reportGaps: 是否报告同一分组内相邻时间段之间的间隔
+    :param presorted: intervals是否已按(分组, 开始分钟)排序
+    """
+    ordered = intervals if presorted else sorted( intervals, key = itemgetter( 0, 1, 2 ) )
+    issues = list()
+    currentGroup = None
+    maxEnd, maxName = 0, ""  # 当前分组内已扫描的时间段中最晚的结束时间
+    overlap: ScheduleIssue | None = None  # 当前连续重叠的时间段对应的问题
+    for group, start, end, name in ordered:
+        if end <= start:
+            issues.append( ScheduleIssue( EMPTY, group, start, end, name ) )
+            continue
+        if group != currentGroup:
+            currentGroup, maxEnd, maxName, overlap = group, end, name, None
+            continue
+        if start < maxEnd:
+            if overlap is not None:
+                overlap.extend( min( end, maxEnd ), name )
+            else:
+                overlap = ScheduleIssue( OVERLAP, group, start, min( end, maxEnd ), maxName, name )
+                issues.append( overlap )
+        else:
+            overlap = None
+            if start > maxEnd and reportGaps:
+                issues.append( ScheduleIssue( GAP, group, maxEnd, start, maxName, name ) )
+        if end > maxEnd:
+            maxEnd, maxName = end, name
+    return issues
+
+
+def findOverlaps(
+        intervals: Iterable[tuple],
+        conflicts: Callable[[object, object], bool],
+        presorted: bool = False,
+) -> list[ScheduleIssue]:
+    """
+    检查同一分组内时间段的重叠，只报告conflicts认为会在同一天出现的项，
+    例如同一节课的单周和双周课程时间相同，但不会在同一天上课
+    还没有结束的项按规则去重，每种规则只保留结束最晚的一项，每一项只与不同的规则比较，
+    规则的种类很少，接近线性；连续重叠的多项合并为一个问题，问题数不超过项数
+    :param intervals: [(分组, 开始分钟, 结束分钟, 名称, 规则), ...]，无效时长的项不检查(由findIntervalIssues报告)；
+                      规则需要可以作为字典的键，内容相同的规则应当相等
+    :param conflicts: conflicts(规则1, 规则2)，两项是否可能在同一天出现
+    :param presorted: intervals是否已按(分组, 开始分钟)排序
+    """
+    ordered = intervals if presorted else sorted( intervals, key = itemgetter( 0, 1, 2 ) )
+    issues = list()
+    currentGroup = None
+    active: dict[object, tuple[int, str]] = dict()  # 当前分组中还没有结束的项: 规则 -> (结束分钟, 名称)
+    overlap: ScheduleIssue | None = None  # 当前连续重叠的时间段对应的问题
+    overlapEnd = 0  # 当前问题中各项最晚的结束时间
+    for group, start, end, name, rule in ordered:
+        if end <= start:
+            continue
+        if group != currentGroup:
+            currentGroup, active, overlap = group, dict(), None
+        if overlap is not None and start >= overlapEnd:
+            overlap = None
+        if any( otherEnd <= start for otherEnd, _ in active.values() ):
+            active = {key: entry for key, entry in active.items() if entry[0] > start}
+        for otherRule, (otherEnd, otherName) in active.items():
+            if conflicts( otherRule, rule ):
+                if overlap is not None:
+                    overlap.extend( min( end, otherEnd ), name )
+                else:
+                    overlap = ScheduleIssue( OVERLAP, group, start, min( end, otherEnd ), otherName, name )
+                    issues.append( overlap )
+                overlapEnd = max( overlapEnd, end, otherEnd )
+                break
+        if rule not in active or active[rule][0] < end:
+            active[rule] = (end, name)
+    return issues
+
+
+def mergeIssues( issues: Iterable[ScheduleIssue], groupNames: list[str] ) -> list[ScheduleIssue]:
+    """
+    合并不同分组中相同的问题，例如每天都使用的默认作息中的问题只报告一次
+    :param issues: 分组为groupNames中的名称
+    :param groupNames: 所有分组名称，全部分组都有的问题合并后的分组为"每天"
+    """
+    merged: dict[tuple, list[str]] = dict()
+    samples: dict[tuple, ScheduleIssue] = dict()
+    for issue in issues:
+        key = issue.key()
+        merged.setdefault( key, list() ).append( issue.group )
+        samples.setdefault( key, issue )
+    result = list()
+    for key, groups in merged.items():
+        issue = samples[key]
+        group = "每天" if len( groups ) == len( groupNames ) else ",".join( groups )
+        result.append( ScheduleIssue( issue.kind, group, issue.start, issue.end, issue.first, issue.second ) )
+    return result
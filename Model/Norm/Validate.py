@@ -0,0 +1,338 @@
+"""按表批量校验数据行，加载数据库、批量导入和编辑表格时使用同一套规则"""
+
+from collections.abc import Callable, Iterable, Iterator
+from functools import lru_cache
+
+from .Check import checkPeriodString, checkWeekdayString, parseDateParts, parseDayType, parseTime
+from .Constants import Holiday, Weekday
+
+TimeStrings = tuple( f"{minute // 60:02d}:{minute % 60:02d}" for minute in range( 24 * 60 ) )  # 分钟数 -> hh:mm
+DayTypes = frozenset( ["", *Weekday.CDAYTYPES, *Weekday.CWEEKDAYS] )  # 不需要解析的单个适用日期
+CacheSize = 4096  # 时间和日期的取值很少，缓存解析结果
+
+
+class CellError:
+    """一个单元格(或一行)的错误"""
+
+    __slots__ = ("line", "column", "value", "message")
+
+    def __init__( self, line: int, column: str, value: str, message: str ):
+        """
+        :param line: 行号
+        :param column: 列名
+        :param value: 原始值
+        :param message: 错误信息
+        """
+        self.line: int = line
+        self.column: str = column
+        self.value: str = value
+        self.message: str = message
+
+    def __str__( self ):
+        return f"第{self.line}行 {self.column}: {self.message} {self.value}"
+
+
+# 单元格校验函数: 返回规范化后的值，格式错误时抛出ValueError
+
+@lru_cache( maxsize = CacheSize )
+def timeCell( value: str ) -> str:
+    """时间 hh:mm"""
+    minutes = parseTime( value )
+    if minutes is None:
+        raise ValueError( "时间格式错误" )
+    return TimeStrings[minutes]
+
+
+@lru_cache( maxsize = CacheSize )
+def dateCell( value: str ) -> str:
+    """日期 yyyy-MM-dd"""
+    parts = parseDateParts( value )
+    if parts is None:
+        raise ValueError( "日期格式错误" )
+    return "%04d-%02d-%02d" % parts
+
+
+def optionalDateCell( value: str ) -> str:
+    """可以为空的日期"""
+    return dateCell( value ) if value and not value.isspace() else ""
+
+
+def dateListCell( value: str ) -> str:
+    """用逗号分隔的日期，可以为空"""
+    if not value or value.isspace():
+        return ""
+    return ",".join( dateCell( part ) for part in value.replace( "，", "," ).split( "," ) if len( part.strip() ) > 0 )
+
+
+def periodCell( value: str ) -> str:
+    """时间段"""
+    value = value.strip()
+    if not checkPeriodString( value ):
+        raise ValueError( "时间段格式错误" )
+    return value
+
+
+def weekdayCell( value: str ) -> str:
+    """星期"""
+    value = value.strip()
+    if not checkWeekdayString( value ):
+        raise ValueError( "星期格式错误" )
+    return value
+
+
+def optionalWeekdayCell( value: str ) -> str:
+    """可以为空的星期"""
+    return weekdayCell( value ) if value and not value.isspace() else ""
+
+
+def dayTypeCell( value: str ) -> str:
+    """作息表的适用日期，可以为空"""
+    value = value.strip()
+    if value not in DayTypes and parseDayType( value ) == []:
+        raise ValueError( "适用日期格式错误" )
+    return value
+
+
+def weeksCell( value: str ) -> str:
+    """上课周"""
+    value = value.strip()
+    if value not in Weekday.CWEEKRULES:
+        raise ValueError( "上课周格式错误" )
+    return value
+
+
+def holidayKindCell( value: str ) -> str:
+    """节假日类型"""
+    value = value.strip()
+    if value not in Holiday.CKINDS:
+        raise ValueError( "节假日类型错误" )
+    return value
+
+
+def textCell( value: str ) -> str:
+    """不能为空的文本"""
+    if not value or value.isspace():
+        raise ValueError( "内容为空" )
+    return value
+
+
+def anyCell( value: str ) -> str:
+    """不检查的列"""
+    return value
+
+
+# 行校验函数: 参数为规范化后的一行，有错误时返回(列名, 错误信息)
+
+def checkTimeOrder( values: tuple ) -> tuple[str, str] | None:
+    """开始时间必须早于结束时间(hh:mm可以直接比较字符串)"""
+    if values[0] >= values[1]:
+        return "end_time", "开始时间不早于结束时间"
+    return None
+
+
+def checkDateOrder( values: tuple ) -> tuple[str, str] | None:
+    """开始日期不能晚于结束日期，课程表和多班级课程表中start_date和end_date都是倒数第三、二列"""
+    if values[-3] and values[-2] and values[-3] > values[-2]:
+        return "end_date", "开始日期晚于结束日期"
+    return None
+
+
+def checkWorkdayWeekday( values: tuple ) -> tuple[str, str] | None:
+    """补班必须指定按星期几上课，放假不需要"""
+    if values[1] == Holiday.CWORKDAY and not values[2]:
+        return "weekday", "补班未指定星期"
+    return None
+
+
+NoErrors: list[CellError] = []  # 没有错误时共用的空列表，不要修改
+
+
+class TableSchema:
+    """一个表的列及其校验函数"""
+
+    __slots__ = ("names", "checks", "rowChecks")
+
+    def __init__(
+            self,
+            columns: Iterable[tuple[str, Callable[[str], str]]],
+            rowChecks: Iterable[Callable[[tuple], tuple[str, str] | None]] = (),
+    ):
+        """
+        :param columns: [(列名, 单元格校验函数), ...]，顺序与数据行相同
+        :param rowChecks: 行校验函数
+        """
+        columns = tuple( columns )
+        self.names: tuple[str, ...] = tuple( name for name, _ in columns )
+        self.checks: tuple[Callable[[str], str], ...] = tuple( check for _, check in columns )
+        self.rowChecks: tuple = tuple( rowChecks )
+
+
+TableSchemas = {
+    "DailySchedule": TableSchema(
+        [("start_time", timeCell), ("end_time", timeCell), ("period", periodCell), ("weekday", dayTypeCell)],
+        [checkTimeOrder],
+    ),
+    "CourseSchedule": TableSchema(
+        [
+            ("weekday", weekdayCell),
+            ("period", periodCell),
+            ("course", textCell),
+            ("weeks", weeksCell),
+            ("start_date", optionalDateCell),
+            ("end_date", optionalDateCell),
+            ("except_dates", dateListCell),
+        ],
+        [checkDateOrder],
+    ),
+    "ClassSchedule": TableSchema(
+        [
+            ("class_name", textCell),
+            ("weekday", weekdayCell),
+            ("period", periodCell),
+            ("course", textCell),
+            ("weeks", weeksCell),
+            ("start_date", optionalDateCell),
+            ("end_date", optionalDateCell),
+            ("except_dates", dateListCell),
+        ],
+        [checkDateOrder],
+    ),
+    "Countdown": TableSchema( [("dateAndtime", dateCell), ("description", textCell)] ),
+    "Holidays": TableSchema(
+        [("date", dateCell), ("kind", holidayKindCell), ("weekday", optionalWeekdayCell)],
+        [checkWorkdayWeekday],
+    ),
+}
+
+
+def checkRow(
+        schema: TableSchema,
+        row: tuple | dict,
+        line: int,
+        rowChecks: bool = True,
+) -> tuple[tuple | None, list[CellError]]:
+    """
+    校验一行
+    :param schema: 表结构
+    :param row: 按列顺序排列的值，或 列名 -> 值；缺少的列和NULL视为空字符串
+    :param line: 行号，用于错误信息
+    :param rowChecks: 是否执行行校验(例如开始时间早于结束时间)
+    :return: (规范化后的一行, 错误列表)，有错误时一行为None
+    """
+    if isinstance( row, dict ):
+        row = tuple( row.get( name ) for name in schema.names )
+    values = None
+    if len( row ) == len( schema.checks ):
+        try:  # 快速路径: 全部为字符串且没有错误
+            values = tuple( [check( value ) for check, value in zip( schema.checks, row )] )
+        except (ValueError, TypeError, AttributeError):
+            values = None
+    if values is None:
+        values = list()
+        errors = list()
+        for index, check in enumerate( schema.checks ):
+            value = row[index] if index < len( row ) else None
+            value = "" if value is None else str( value )
+            try:
+                values.append( check( value ) )
+            except ValueError as e:
+                errors.append( CellError( line, schema.names[index], value, str( e ) ) )
+        if len( errors ) > 0:
+            return None, errors
+        values = tuple( values )
+    if rowChecks:
+        for rowCheck in schema.rowChecks:
+            error = rowCheck( values )
+            if error is not None:
+                column, message = error
+                return None, [CellError( line, column, values[schema.names.index( column )], message )]
+    return values, NoErrors
+
+
+def validateRow( tableName: str, row: tuple | dict, line: int = 0 ) -> tuple[tuple | None, list[CellError]]:
+    """
+    校验并规范化一行
+    :raise KeyError: 不支持的表
+    :return: 同checkRow
+    """
+    return checkRow( TableSchemas[tableName], row, line )
+
+
+def validateRows(
+        tableName: str,
+        rows: Iterable[tuple | dict],
+        firstLine: int = 1,
+        rowChecks: bool = True,
+) -> Iterator[tuple[int, tuple | None, list[CellError]]]:
+    """
+    逐行校验，不保存整个表，可以直接用于数据库查询结果或文件读取器
+    :param tableName: 表名
+    :param rows: 数据行
+    :param firstLine: 第一行的行号
+    :param rowChecks: 是否执行行校验
+    :raise KeyError: 不支持的表
+    :return: (行号, 规范化后的一行或None, 错误列表)
+    """
+    schema = TableSchemas[tableName]
+    for line, row in enumerate( rows, firstLine ):
+        values, errors = checkRow( schema, row, line, rowChecks )
+        yield line, values, errors
+
+
+class TableReport:
+    """整个表的校验结果"""
+
+    def __init__( self, tableName: str ):
+        self.tableName: str = tableName
+        self.rows: list[tuple] = list()  # 规范化后的有效行
+        self.errors: list[CellError] = list()
+        self.checked: int = 0  # 校验的行数
+
+    @property
+    def ok( self ) -> bool:
+        """是否全部有效"""
+        return len( self.errors ) == 0
+
+    def errorsByLine( self ) -> dict[int, list[CellError]]:
+        """按行号分组的错误"""
+        result: dict[int, list[CellError]] = dict()
+        for error in self.errors:
+            result.setdefault( error.line, list() ).append( error )
+        return result
+
+    def summary( self ) -> str:
+        """获取结果摘要"""
+        return f"{self.tableName}: 校验{self.checked}行, 有效{len( self.rows )}行, 错误{len( self.errors )}处"
+
+
+def validateTable( tableName: str, rows: Iterable[tuple | dict], firstLine: int = 1 ) -> TableReport:
+    """
+    校验整个表
+    :param tableName: 表名
+    :param rows: 数据行
+    :param firstLine: 第一行的行号
+    :raise KeyError: 不支持的表
+    """
+    report = TableReport( tableName )
+    for _, values, errors in validateRows( tableName, rows, firstLine ):
+        report.checked += 1
+        if values is not None:
+            report.rows.append( values )
+        else:
+            report.errors.extend( errors )
+    return report
+
+
+def validateCell( tableName: str, column: str, value ) -> str | None:
+    """
+    校验一个单元格，用于编辑表格
+    :return: 错误信息，没有错误或不检查的列返回None
+    """
+    schema = TableSchemas.get( tableName )
+    if schema is None or column not in schema.names:
+        return None
+    try:
+        schema.checks[schema.names.index( column )]( "" if value is None else str( value ) )
+    except ValueError as e:
+        return str( e )
+    return None
@@ -1,17 +1,22 @@
 from .Check import (
     checkDateString, checkPeriodString, checkTimeString, checkWeekdayString, formatDateString, formatTimeString,
+    parseDate, parseDayType, parseTime,
 )
 from .Constants import (
     ClassPeriod,
+    Holiday,
     Month,
     Period,
     Subject,
     Weekday,
 
 )
+from .Overlap import findIntervalIssues, findOverlaps, mergeIssues, ScheduleIssue
+from .Validate import CellError, TableReport, validateCell, validateRow, validateRows, validateTable
 
 __all__ = [
     "ClassPeriod",
+    "Holiday",
     "Month",
     "Period",
     "Subject",
@@ -22,4 +27,17 @@ __all__ = [
     "checkWeekdayString",
     "formatTimeString",
     "formatDateString",
+    "parseDayType",
+    "parseTime",
+    "parseDate",
+    "ScheduleIssue",
+    "findIntervalIssues",
+    "findOverlaps",
+    "mergeIssues",
+    "CellError",
+    "TableReport",
+    "validateCell",
+    "validateRow",
+    "validateRows",
+    "validateTable",
 ]
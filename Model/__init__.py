@@ -5,12 +5,19 @@ from Model.Norm import (
     checkPeriodString,
     checkTimeString,
     checkWeekdayString,
+    CellError,
     ClassPeriod,
     formatDateString,
     formatTimeString,
+    Holiday,
     Month,
+    parseDayType,
     Period,
+    ScheduleIssue,
     Subject,
+    TableReport,
+    validateCell,
+    validateTable,
     Weekday,
 )
 from .dataModel import (
@@ -19,10 +26,25 @@ from .dataModel import (
     CountdayItem,
     CountdaySchedule,
     CourseShdItem,
+    createDbIndex,
     createDbTable,
     DailyShdItem,
     DataSource,
+    importHolidays,
+    refreshRepository,
+    saveCourses,
+    saveTableChanges,
+    TableChanges,
+    tableRows,
+    validateDatabase,
+    validateSchedules,
 )
+from .connection import ConnectionManager, Connections
+from .holidays import HolidayCalendar
+from .importer import IcsTables, ImportColumns, importFile, ImportReport
+from .repository import Repository, TableRepository
+from .migrations import migrateDatabase, SchemaVersion, upgradeDatabase
+from .store import ScheduleStore
 
 __all__ = [
     "Weekday",
@@ -30,18 +52,47 @@ __all__ = [
     "Period",
     "Subject",
     "ClassPeriod",
+    "Holiday",
     "checkDateString",
     "checkTimeString",
     "checkPeriodString",
     "checkWeekdayString",
     "formatTimeString",
     "formatDateString",
+    "parseDayType",
+    "ScheduleIssue",
+    "CellError",
+    "TableReport",
+    "validateCell",
+    "validateTable",
     "DataSource",
+    "ScheduleStore",
+    "HolidayCalendar",
     "CountdayItem",
     "CourseShdItem",
     "DailyShdItem",
     "CountdaySchedule",
+    "Connections",
+    "ConnectionManager",
     "connectToDb",
     "closeDb",
     "createDbTable",
+    "createDbIndex",
+    "SchemaVersion",
+    "migrateDatabase",
+    "upgradeDatabase",
+    "importHolidays",
+    "refreshRepository",
+    "saveCourses",
+    "saveTableChanges",
+    "TableChanges",
+    "tableRows",
+    "Repository",
+    "TableRepository",
+    "IcsTables",
+    "ImportColumns",
+    "ImportReport",
+    "importFile",
+    "validateDatabase",
+    "validateSchedules",
 ]
@@ -0,0 +1,253 @@
+"""数据库连接管理: 每个线程使用自己的长期连接，按引用计数共享，并缓存预处理语句"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QUrl
+from PySide6.QtSql import QSqlDatabase, QSqlQuery
+
+from Utils import Config, logger, Paths
+
+DefaultConnection = "timer_db_connection"  # GUI线程使用的数据库连接
+BusyTimeout = 3000  # 数据库被锁定时的等待时间，单位为毫秒
+StatementCacheSize = 32  # 每个连接缓存的预处理语句数
+
+# 数据库访问模式，在config.ini的[database]节中用mode设置
+ReadWrite = "readwrite"  # 默认，读写
+ReadOnly = "readonly"  # 只读(mode=ro)，仍然使用锁，能读到其他进程在WAL中的修改
+Immutable = "immutable"  # 不可变(immutable=1)，不加锁、不读写日志文件，适合共享盘或网盘同步目录中只显示的实例
+AccessModes = {
+    ReadWrite: "",
+    ReadOnly: "mode=ro",
+    Immutable: "immutable=1",
+}
+
+# 可写实例的日志模式，在config.ini的[database]节中用journal设置
+# WAL模式下读取不会被写入阻塞，写入也不会被读取阻塞，但提交的修改在检查点之前只在-wal文件中，
+# 不可变模式的实例不读取-wal文件，看不到这些修改；有这样的实例时使用DELETE模式，每次提交都写入数据库文件
+JournalModes = ("wal", "delete", "truncate")
+DefaultJournalMode = "wal"
+
+# 打开连接后执行的设置，WAL模式下synchronous为NORMAL时不会损坏数据库
+Pragmas = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -4096",  # 页缓存 4 MiB
+)
+# 只读连接的设置，不能修改日志模式；使用内存映射读取数据库文件
+ReadOnlyPragmas = (
+    "PRAGMA query_only = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -4096",
+    "PRAGMA mmap_size = 67108864",  # 64 MiB
+)
+
+
+def configuredMode() -> str:
+    """读取config.ini中设置的数据库访问模式，未设置或无效时为ReadWrite"""
+    mode = (Config.getValue( "database", "mode" ) or ReadWrite).strip().lower()
+    if mode not in AccessModes:
+        logger.warning( f"数据库访问模式无效: {mode}, 使用{ReadWrite}" )
+        return ReadWrite
+    return mode
+
+
+def configuredJournalMode() -> str:
+    """读取config.ini中设置的日志模式，未设置或无效时为DefaultJournalMode"""
+    journalMode = (Config.getValue( "database", "journal" ) or DefaultJournalMode).strip().lower()
+    if journalMode not in JournalModes:
+        logger.warning( f"数据库日志模式无效: {journalMode}, 使用{DefaultJournalMode}" )
+        return DefaultJournalMode
+    return journalMode
+
+
+class ConnectionState:
+    """一个连接的状态"""
+
+    __slots__ = ("fileName", "refs", "serial", "statements")
+
+    def __init__( self, fileName: str, serial: int ):
+        self.fileName: str = fileName
+        self.refs: int = 0  # 引用计数
+        self.serial: int = serial  # 打开序号，每次(重新)打开连接时不同
+        self.statements: OrderedDict[str, QSqlQuery] = OrderedDict()  # SQL -> 预处理语句，按最近使用排序
+
+
+class ConnectionManager:
+    """
+    数据库连接管理器
+    Qt的数据库连接只能在创建它的线程中使用，同一角色的连接按线程区分，连接名为 角色@线程ID
+    acquire/release只增减引用计数，引用计数为零时连接仍然保持打开，
+    直到closeThread()(线程结束或程序退出时)，一个窗口关闭自己的连接不会影响其他使用者
+    只读和不可变模式下通过URI打开数据库，所有连接都不能写入
+    """
+
+    def __init__( self, mode: str = ReadWrite, journalMode: str = DefaultJournalMode ):
+        """
+        :param mode: 访问模式: ReadWrite, ReadOnly, Immutable
+        :param journalMode: 可写连接的日志模式: wal, delete, truncate
+        """
+        self.mode: str = mode
+        self.journalMode: str = journalMode
+        self.__lock = threading.Lock()
+        self.__states: dict[str, ConnectionState] = dict()  # 连接名 -> 状态
+        self.__serials = itertools.count( 1 )  # 连接的打开序号
+
+    @property
+    def readOnly( self ) -> bool:
+        """是否以只读或不可变模式打开数据库"""
+        return self.mode != ReadWrite
+
+    @staticmethod
+    def connectionName( role: str ) -> str:
+        """获取当前线程中指定角色的连接名"""
+        return f"{role}@{threading.get_ident()}"
+
+    def acquire( self, databaseFile: str = None, role: str = DefaultConnection ) -> QSqlDatabase | None:
+        """
+        获取当前线程的连接，第一次获取时打开连接并设置日志模式等参数
+        :param databaseFile: 数据库文件，默认为Paths.DatabaseFile
+        :param role: 连接角色，例如GUI、后台加载、检查修改
+        :return: 连接，无法打开时返回None；使用完后调用release()
+        """
+        fileName = databaseFile if databaseFile is not None else Paths.DatabaseFile
+        name = self.connectionName( role )
+        with self.__lock:
+            state = self.__states.get( name )
+            if state is not None and state.fileName != fileName:
+                if state.refs > 0:
+                    logger.error( f"连接{role}正在使用数据库{state.fileName}, 无法切换到{fileName}" )
+                    return None
+                self.__close( name )  # 没有使用者，切换数据库文件
+                state = None
+            if state is None:
+                db = self.__open( name, fileName )
+                if db is None:
+                    return None
+                state = ConnectionState( fileName, next( self.__serials ) )
+                self.__states[name] = state
+            else:
+                db = QSqlDatabase.database( name, open = False )
+                if not db.isOpen():
+                    if not db.open():
+                        logger.error( f"无法打开数据库: {db.lastError().text()}" )
+                        return None
+                    state.serial = next( self.__serials )
+            state.refs += 1
+        return db
+
+    def release( self, db: QSqlDatabase ):
+        """释放acquire()获取的连接，只减少引用计数，不关闭连接"""
+        if db is None:
+            return
+        with self.__lock:
+            state = self.__states.get( db.connectionName() )
+            if state is not None and state.refs > 0:
+                state.refs -= 1
+
+    def refCount( self, role: str = DefaultConnection ) -> int:
+        """获取当前线程中指定角色连接的引用计数，连接不存在时返回-1"""
+        with self.__lock:
+            state = self.__states.get( self.connectionName( role ) )
+            return state.refs if state is not None else -1
+
+    def serial( self, db: QSqlDatabase ) -> int:
+        """
+        获取连接的打开序号，连接名相同但重新打开过的连接序号不同，
+        PRAGMA data_version等属于连接的状态不能在不同序号之间比较
+        :return: 序号，不是由管理器创建的连接返回0
+        """
+        with self.__lock:
+            state = self.__states.get( db.connectionName() )
+            return state.serial if state is not None else 0
+
+    def prepare( self, db: QSqlDatabase, sql: str ) -> QSqlQuery | None:
+        """
+        获取缓存的预处理语句，不存在时预处理并缓存
+        返回的语句可能已经执行过，绑定参数后直接exec()，使用完后调用finish()；
+        同一连接上相同的SQL共用一个语句，上一次的结果读取完之前不能再次获取
+        :param db: acquire()获取的连接
+        :param sql: SQL语句，使用?占位符
+        :return: 预处理语句，失败时返回None
+        """
+        with self.__lock:
+            state = self.__states.get( db.connectionName() )
+            if state is None:  # 不是由管理器创建的连接，不缓存
+                query = QSqlQuery( db )
+                return query if query.prepare( sql ) else None
+            query = state.statements.get( sql )
+            if query is not None:
+                state.statements.move_to_end( sql )
+                query.finish()
+                return query
+            query = QSqlQuery( db )
+            query.setForwardOnly( True )  # 只进查询不缓存已读取的行，必须在预处理前设置
+            if not query.prepare( sql ):
+                logger.error( f"预处理失败: {sql} {query.lastError().text()}" )
+                return None
+            state.statements[sql] = query
+            if len( state.statements ) > StatementCacheSize:
+                state.statements.popitem( last = False )
+            return query
+
+    def close( self, role: str ):
+        """关闭当前线程中指定角色的连接，不论引用计数"""
+        with self.__lock:
+            self.__close( self.connectionName( role ) )
+
+    def closeIdle( self ):
+        """关闭当前线程中引用计数为零的连接，不可变模式下数据库文件被替换后需要重新打开"""
+        suffix = f"@{threading.get_ident()}"
+        with self.__lock:
+            for name in [name for name, state in self.__states.items() if name.endswith( suffix ) and state.refs == 0]:
+                self.__close( name )
+
+    def closeThread( self ):
+        """关闭当前线程的所有连接，在工作线程结束或程序退出时调用"""
+        suffix = f"@{threading.get_ident()}"
+        with self.__lock:
+            for name in [name for name in self.__states if name.endswith( suffix )]:
+                self.__close( name )
+
+    def __open( self, name: str, fileName: str ) -> QSqlDatabase | None:
+        """打开连接并设置参数"""
+        if QSqlDatabase.contains( name ):
+            db = QSqlDatabase.database( name, open = False )
+        else:
+            db = QSqlDatabase.addDatabase( "QSQLITE", name )
+        if self.readOnly:
+            url = bytes( QUrl.fromLocalFile( fileName ).toEncoded() ).decode( "ascii" )
+            db.setDatabaseName( f"{url}?{AccessModes[self.mode]}" )
+            db.setConnectOptions( f"QSQLITE_OPEN_URI;QSQLITE_OPEN_READONLY;QSQLITE_BUSY_TIMEOUT={BusyTimeout}" )
+        else:
+            db.setDatabaseName( fileName )
+            db.setConnectOptions( f"QSQLITE_BUSY_TIMEOUT={BusyTimeout}" )
+        if not db.open():
+            logger.error( f"无法打开数据库: {db.lastError().text()}" )
+            return None
+        query = QSqlQuery( db )
+        pragmas = ReadOnlyPragmas if self.readOnly else (f"PRAGMA journal_mode = {self.journalMode}",) + Pragmas
+        for pragma in pragmas:
+            if not query.exec( pragma ):
+                logger.warning( f"设置数据库参数失败: {pragma} {query.lastError().text()}" )
+        query.finish()
+        logger.info( f"数据库连接成功({self.mode})" )
+        return db
+
+    def __close( self, name: str ):
+        """关闭并移除连接，需要持有锁"""
+        state = self.__states.pop( name, None )
+        if state is not None:
+            for query in state.statements.values():
+                query.finish()
+            state.statements.clear()  # 预处理语句必须在移除连接前释放
+        if QSqlDatabase.contains( name ):
+            db = QSqlDatabase.database( name, open = False )
+            db.close()
+            del db
+            QSqlDatabase.removeDatabase( name )
+            logger.info( "数据库连接关闭" )
+
+
+Connections = ConnectionManager( configuredMode(), configuredJournalMode() )  # 全局连接管理器
@@ -1,19 +1,138 @@
 """data model"""
 
-from PySide6.QtCore import QDate, QDateTime, QObject, Signal
-from PySide6.QtSql import QSqlDatabase, QSqlQuery, QSqlTableModel
+import bisect
+import hashlib
+import heapq
+import itertools
+import os
+from collections.abc import Callable, Iterable, Iterator
+from operator import attrgetter, itemgetter
+
+from PySide6.QtCore import (
+    QDate,
+    QDateTime,
+    QFileSystemWatcher,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    QTime,
+    QTimer,
+    Signal,
+)
+from PySide6.QtSql import QSqlDatabase, QSqlQuery
 
 from Model.Norm import (
-    checkDateString,
     checkPeriodString,
-    checkTimeString,
-    checkWeekdayString,
-    formatDateString,
-    formatTimeString,
+    parseDate,
+    parseDayType,
+    parseTime,
+    validateRows,
     Weekday,
 )
+from Model.Norm.Overlap import findIntervalIssues, findOverlaps, GAP, mergeIssues, MISSING, OVERLAP, ScheduleIssue
+from Model.connection import Connections, DefaultConnection, Immutable
+from Model.holidays import HolidayCalendar
+from Model.ics import exportClasses, IcsWriter, writeItems
+from Model.migrations import LessonCondition, LessonWeeks
+from Model.recurrence import CourseRule, rulesMayCoincide
+from Model.repository import Repository
+from Model.snapshot import readSnapshot, snapshotFile, writeSnapshot
+from Model.store import ScheduleStore
+from Model.timeline import DayMinutes, WeekTimeline
 from Utils import logger, Paths
 
+DefaultClassName = "本班"  # 本机课程表在ScheduleStore中的班级名称
+LoaderConnection = "timer_db_loader"  # 后台加载线程使用的数据库连接
+WatchConnection = "timer_db_watch"  # 检查数据库修改使用的数据库连接
+WatchInterval = 60000  # 定时检查数据库修改的间隔，单位为毫秒，网络盘等文件系统上可能收不到文件修改通知
+WatchDelay = 200  # 收到文件修改通知后等待的时间，单位为毫秒，一次提交会产生多次通知
+SearchDays = 14  # 查找课程时逐天检查的天数，覆盖单双周
+YearDays = 366  # 查找作息和课程的最大天数
+ExportFile = "Timer.ics"  # 本机作息、课程和倒数日导出的文件名
+MaxLoggedIssues = 20  # 加载时记录到日志的检查问题的最大数量
+
+# 各表的查询语句，列的顺序与对应的加载函数一致
+TableQueries = {
+    "DailySchedule": "SELECT start_time, end_time, period, weekday FROM DailySchedule ORDER BY weekday, start_minute",
+    "CourseSchedule": (
+        "SELECT weekday, period, course, weeks, start_date, end_date, except_dates FROM CourseSchedule"
+    ),
+    "Countdown": "SELECT dateAndtime, description FROM Countdown",
+    "Holidays": "SELECT date, kind, weekday FROM Holidays",
+    "ClassSchedule": (
+        "SELECT class_name, weekday, period, course, weeks, start_date, end_date, except_dates FROM ClassSchedule"
+    ),
+}
+
+
+def minuteOfDay( time: QTime ) -> int:
+    """获取指定时间在当天的分钟数"""
+    return time.hour() * 60 + time.minute()
+
+
+def dayStartSecs( date: QDate ) -> int:
+    """获取指定日期零点的时间戳(秒)"""
+    return QDateTime( date, QTime( 0, 0 ) ).toSecsSinceEpoch()
+
+
+def julianDayStartSecs( day: int ) -> int:
+    """获取指定日期(儒略日)零点的时间戳(秒)"""
+    return dayStartSecs( QDate.fromJulianDay( day ) )
+
+
+def weekDayStarts() -> list[int]:
+    """获取本周每天零点的时间戳(秒)，加载时用整数运算得到各项的时间"""
+    today = QDate.currentDate()
+    weekStart = today.addDays( 1 - today.dayOfWeek() )
+    return [dayStartSecs( weekStart.addDays( i ) ) for i in range( 7 )]
+
+
+def timelineOccurrences(
+        timeline: WeekTimeline,
+        calendar: HolidayCalendar,
+        start: QDateTime,
+        end: QDateTime,
+        occurs: Callable[[int, int], bool] = None,
+) -> Iterator:
+    """
+    按时间顺序逐个生成时间线中的项在[start, end)内的每一次出现，跳过放假日
+    :param timeline: 一周的时间线
+    :param calendar: 节假日日历
+    :param start: 开始时间
+    :param end: 结束时间
+    :param occurs: occurs(索引, 儒略日)，返回False时跳过该项
+    """
+    startSecs, endSecs = start.toSecsSinceEpoch(), end.toSecsSinceEpoch()
+    firstDay, lastDay = start.date().toJulianDay(), end.date().toJulianDay()
+    for day, weekday in calendar.scheduleDays( firstDay, lastDay - firstDay + 1 ):
+        dayStart = julianDayStartSecs( day )  # 每天只转换一次，各项的时间用整数运算得到
+        for index in timeline.dayRange( weekday ):
+            if occurs is not None and not occurs( index, day ):
+                continue
+            item = timeline.items[index].atDay( dayStart, timeline.starts[index] % DayMinutes )
+            if item.endSecs > startSecs and item.startSecs < endSecs:
+                yield item
+
+
+def timelineIntervals( timeline: WeekTimeline ) -> Iterator[tuple[str, int, int, str]]:
+    """将一周时间线转换为按(星期, 开始时间)排序的[(星期, 开始分钟, 结束分钟, 名称), ...]，时间为当天零点起的分钟数"""
+    for start, end, item in zip( timeline.starts, timeline.ends, timeline.items ):
+        weekday = start // DayMinutes
+        offset = weekday * DayMinutes
+        name = f"{item.period} {item.subject}" if isinstance( item, CourseShdItem ) else item.period
+        yield Weekday.CWEEKDAYS[weekday], start - offset, end - offset, name
+
+
+def logIssues( tableName: str, issues: list[ScheduleIssue] ):
+    """记录检查发现的问题，时间间隔只作为提示，超过MaxLoggedIssues个的只记录数量"""
+    for issue in issues[:MaxLoggedIssues]:
+        if issue.kind == GAP:
+            logger.info( f"{tableName}: {issue}" )
+        else:
+            logger.warning( f"{tableName}: {issue}" )
+    if len( issues ) > MaxLoggedIssues:
+        logger.warning( f"{tableName}: 另有{len( issues ) - MaxLoggedIssues}个问题未记录" )
+
 
 class DailyShdItem:
     """
@@ -21,53 +140,71 @@ class DailyShdItem:
     作息表项，包含开始时间,结束时间,时间段：
         时间段格式为: 上午第1节, 下午第2节, 晚上第3节, 课间休息, 下班, 午休, 晚饭时间, 休息时间, 体育锻炼
         时间格式为: hh:mm
+    开始和结束时间以时间戳(秒)保存，只在显示时转换为QDateTime
     """
     
+    __slots__ = ("startSecs", "endSecs", "period", "__text")
+    
     def __init__(
             self,
-            start: QDateTime = None,
-            end: QDateTime = None,
+            startSecs: int = None,
+            endSecs: int = None,
             period: str = "",
     ):
-        self.start: QDateTime = start
-        self.end: QDateTime = end
+        self.startSecs: int = startSecs
+        self.endSecs: int = endSecs
         self.period: str = period
+        self.__text: str | None = None  # 显示文本缓存
+    
+    @property
+    def start( self ) -> QDateTime:
+        """开始时间"""
+        return QDateTime.fromSecsSinceEpoch( self.startSecs )
+    
+    @property
+    def end( self ) -> QDateTime:
+        """结束时间"""
+        return QDateTime.fromSecsSinceEpoch( self.endSecs )
     
     def isValid( self ):
         """数据规范性"""
-        if self.start is None or self.end is None:
-            return False
-        if not self.start.isValid() or not self.end.isValid():
+        if self.startSecs is None or self.endSecs is None:
             return False
         return checkPeriodString( self.period )
     
-    def isThis( self, dateTime: QDateTime ):
-        """检测指定时间是否在本时间段内"""
-        return self.start <= dateTime < self.end
+    def isThis( self, secs: int ):
+        """检测指定时间(时间戳)是否在本时间段内"""
+        return self.startSecs <= secs < self.endSecs
     
-    def isBefore( self, dateTime: QDateTime ):
-        """检测本时间段是否在指定时间之前"""
-        return self.end <= dateTime
+    def isBefore( self, secs: int ):
+        """检测本时间段是否在指定时间(时间戳)之前"""
+        return self.endSecs <= secs
     
-    def isExpired( self, dateTime: QDateTime ):
+    def isExpired( self, secs: int ):
         """检测本时间段是否已过期"""
-        return self.end <= dateTime
+        return self.endSecs <= secs
     
     def getTime( self ):
         """获取时间"""
         return self.start, self.end
     
-    def setNextday( self ):
-        """将当前Item修改为下一天"""
-        self.start = self.start.addDays( 1 )
-        self.end = self.end.addDays( 1 )
+    def atDay( self, dayStart: int, minute: int ):
+        """
+        获取本时间段在指定日期对应的新Item，只用整数运算，不创建QDateTime
+        :param dayStart: 指定日期零点的时间戳(秒)
+        :param minute: 本时间段的开始时间在当天的分钟数
+        """
+        startSecs = dayStart + minute * 60
+        return DailyShdItem( startSecs, startSecs + self.endSecs - self.startSecs, self.period )
     
     def screenText( self ):
         """获取文本"""
-        return (
-            f"{self.start.toString( 'hh:mm' )} - "
-            f"{self.end.toString( 'hh:mm' )}\n{self.period}"
-        )
+        if self.__text is None:
+            self.__text = (
+                f"{self.start.toString( 'hh:mm' )} - "
+                f"{self.end.toString( 'hh:mm' )}\n{self.period}"
+            )
+        return self.__text
     
     def __str__( self ):
         """获取文本"""
@@ -79,11 +216,19 @@ class DailyShdItem:
 
 class DailySchedule:
     """
-    作息时间表,过时的项会被修改为后一天对应项
+    作息时间表,支持按星期或日类型设置不同的作息(如周五短课、周末自习),
+    加载后编译为只读的一周时间线,查找时不修改表项
     """
     
     def __init__( self, schedule: list[DailyShdItem] = None ):
+        # 本周每天的作息项，每项的日期为其适用的那一天
         self.schedule: list[DailyShdItem] = schedule if schedule is not None else list()
+        self.timeline: WeekTimeline = WeekTimeline()
+        self.periodIndex: list[dict[str, DailyShdItem]] = [dict() for _ in range( 7 )]  # 每天的 period -> 时间项
+        # 每天的 period -> (开始分钟, 结束分钟)，当天零点起
+        self.periodMinutes: list[dict[str, tuple[int, int]]] = [dict() for _ in range( 7 )]
+        self.calendar: HolidayCalendar = HolidayCalendar()  # 放假日没有作息，补班日按指定星期的作息
+        self.compile()
     
     def addItem( self, scheduleItem: DailyShdItem ):
         """添加"""
@@ -92,72 +237,148 @@ class DailySchedule:
         else:
             logger.warning( f"作息表添加失败: {scheduleItem}" )
     
+    def compile( self, intervals: list[tuple[int, int, DailyShdItem]] = None ):
+        """
+        将作息表编译为一周时间线
+        :param intervals: [(开始分钟, 结束分钟, 项), ...]，时间为周一零点起的分钟数，项与schedule相同；
+                          为None时由schedule中各项的时间计算
+        """
+        if intervals is None:
+            intervals = list()
+            for item in self.schedule:
+                offset = (item.start.date().dayOfWeek() - 1) * DayMinutes
+                intervals.append(
+                    (offset + minuteOfDay( item.start.time() ), offset + minuteOfDay( item.end.time() ), item),
+                )
+        self.periodIndex = [dict() for _ in range( 7 )]
+        self.periodMinutes = [dict() for _ in range( 7 )]
+        for start, end, item in intervals:
+            weekday = start // DayMinutes
+            offset = weekday * DayMinutes
+            self.periodIndex[weekday].setdefault( item.period, item )
+            self.periodMinutes[weekday].setdefault( item.period, (start - offset, end - offset) )
+        self.timeline = WeekTimeline( intervals )
+    
+    def snapshot( self ) -> tuple:
+        """获取与日期无关的表项快照，用于比较两次加载的差异"""
+        return tuple(
+            zip( self.timeline.starts, self.timeline.ends, (item.period for item in self.timeline.items) ),
+        )
+    
+    def loadCompiled( self, records: Iterable[tuple[int, int, str]] ):
+        """
+        从编译后的数据(快照)加载作息表，不再校验和解析字符串
+        :param records: [(开始分钟, 结束分钟, 节次), ...]，时间为周一零点起的分钟数
+        """
+        dayStarts = weekDayStarts()
+        intervals = list()
+        for start, end, period in records:
+            weekday = start // DayMinutes
+            offset = dayStarts[weekday] - weekday * DayMinutes * 60
+            intervals.append( (start, end, DailyShdItem( offset + start * 60, offset + end * 60, period )) )
+        self.schedule = [item for _, _, item in intervals]
+        self.compile( intervals )
+    
+    def __itemAt( self, index: int, day: int ) -> DailyShdItem:
+        """获取时间线中第index项在指定日期(儒略日)对应的Item"""
+        return self.timeline.items[index].atDay( julianDayStartSecs( day ), self.timeline.starts[index] % DayMinutes )
+    
     def getCurrentItem( self ) -> DailyShdItem | None:
-        """获取当前时间项，如果当前时间不在任何时间段内，则返回None"""
-        if len( self.schedule ) == 0:
+        """获取当前时间项，如果当前时间不在任何时间段内或今天放假，则返回None"""
+        if len( self.timeline ) == 0:
             logger.warning( "作息表为空" )
             return None
-        self.schedule.sort( key = lambda x: x.start )  # 按start排序
         currentDateTime = QDateTime.currentDateTime()  # 当前时间
-        for item in self.schedule:
-            if item.isThis( currentDateTime ):
-                return item
-            elif item.isExpired( currentDateTime ):
-                item.setNextday()
-        else:
+        today = currentDateTime.date().toJulianDay()
+        weekday = self.calendar.weekdayOf( today )
+        if weekday is None:
             return None
+        index = self.timeline.currentIndex( weekday * DayMinutes + minuteOfDay( currentDateTime.time() ) )
+        if index < 0:
+            return None
+        return self.__itemAt( index, today )
     
-    def findItemByPeriod( self, period: str ) -> DailyShdItem | None:
-        """根据period查找对应的时间项"""
-        for item in self.schedule:
-            if item.period == period:
-                return item
-        else:
+    def getNextItem( self ) -> DailyShdItem | None:
+        """获取当前时间之后的第一个时间项，跳过放假日，一年内没有则返回None"""
+        if len( self.timeline ) == 0:
             return None
+        currentDateTime = QDateTime.currentDateTime()  # 当前时间
+        today = currentDateTime.date().toJulianDay()
+        minute = minuteOfDay( currentDateTime.time() )
+        for day, weekday in self.calendar.scheduleDays( today, YearDays ):
+            offset = weekday * DayMinutes + (minute if day == today else -1)
+            for index in self.timeline.dayRange( weekday ):
+                if self.timeline.starts[index] > offset:
+                    return self.__itemAt( index, day )
+        return None
+    
+    def validate( self ) -> list[ScheduleIssue]:
+        """检查各天作息的重叠、间隔和无效时长，每天相同的问题只报告一次"""
+        return mergeIssues( findIntervalIssues( timelineIntervals( self.timeline ), True, True ), Weekday.CWEEKDAYS )
+    
+    def occurrences( self, start: QDateTime, end: QDateTime ) -> Iterator[DailyShdItem]:
+        """按时间顺序逐个生成[start, end)内的作息项"""
+        return timelineOccurrences( self.timeline, self.calendar, start, end )
     
-    def loadDailySchedule( self, model: QSqlTableModel ):
+    def findItemByPeriod( self, period: str, weekday: int = None ) -> DailyShdItem | None:
+        """
+        根据period查找对应的时间项
+        :param period: 节次
+        :param weekday: 星期序号(0为星期一)，默认为今天
+        """
+        if weekday is None:
+            weekday = QDate.currentDate().dayOfWeek() - 1
+        return self.periodIndex[weekday].get( period )
+    
+    def findPeriodMinutes( self, period: str, weekday: int ) -> tuple[int, int] | None:
+        """
+        根据时间段查找当天的开始和结束时间
+        :param period: 时间段
+        :param weekday: 星期序号(0为星期一)
+        :return: (开始分钟, 结束分钟)，当天零点起；不存在时返回None
+        """
+        return self.periodMinutes[weekday].get( period )
+    
+    def loadDailySchedule( self, rows: Iterable[tuple] ):
         """
         从数据库加载作息时间表
+        weekday列为空的行是默认作息；某天有专门设置的行时，当天只使用这些行
+        :param rows: 数据行(start_time, end_time, period, weekday)
         """
-        if model is None:
-            logger.warning( "数据库模型为空: None" )
+        if rows is None:
+            logger.warning( "数据库查询结果为空: None" )
             return
         self.schedule.clear()  # 清空当前列表
-        currentDate = QDate.currentDate().toString( "yyyy-MM-dd" )
         
-        rowCount = model.rowCount()
-        for row in range( rowCount ):
-            
-            start = formatTimeString( model.record( row ).value( "start_time" ) )
-            end = formatTimeString( model.record( row ).value( "end_time" ) )
-            period = model.record( row ).value( "period" )
-            
-            if (
-                    checkTimeString( start )
-                    and checkTimeString( end )
-                    and checkPeriodString( period )
-            ):
-                startDateTime = QDateTime.fromString(
-                    f"{currentDate} {start}",
-                    "yyyy-MM-dd hh:mm",
-                )
-                endDateTime = QDateTime.fromString(
-                    f"{currentDate} {end}",
-                    "yyyy-MM-dd hh:mm",
-                )
-                
-                self.addItem(
-                    DailyShdItem( startDateTime, endDateTime, period ),
-                )
+        defaultRows = list()  # 默认作息
+        dayRows = [list() for _ in range( 7 )]  # 每天专门设置的作息
+        
+        # 不做行校验: 时长无效的行保留下来，由validate()报告
+        for row, values, errors in validateRows( "DailySchedule", rows, rowChecks = False ):
+            if values is None:
+                logger.warning( f"作息表加载失败，{'; '.join( str( error ) for error in errors )}" )
+                continue
+            start, end, period, dayType = values
+            record = (parseTime( start ), parseTime( end ), period)  # 当天零点起的分钟数
+            weekdays = parseDayType( dayType )
+            if weekdays is None:
+                defaultRows.append( record )
             else:
-                logger.warning(
-                    f"作息表加载失败，第{row}行数据格式错误: {start} - {end} {period}",
-                )
+                for weekday in weekdays:
+                    dayRows[weekday].append( record )
         
-        if len( self.schedule ) > 0:
-            self.schedule.sort( key = lambda x: x.start )  # 按start排序
+        # 直接用分钟数编译，不再拼接字符串和解析QDateTime
+        records = list()
+        for weekday in range( 7 ):
+            offset = weekday * DayMinutes
+            records.extend(
+                (offset + start, offset + end, period) for start, end, period in dayRows[weekday] or defaultRows
+            )
+        records.sort( key = itemgetter( 0 ) )
+        self.loadCompiled( records )
         
-        logger.info( f"作息表加载完成，加载{len( self.schedule )}条记录" )
+        logger.info( f"作息表加载完成，本周共{len( self.schedule )}条记录" )
+        logIssues( "作息表", self.validate() )
 
 
 class CourseShdItem:
@@ -165,46 +386,70 @@ class CourseShdItem:
     课程表条目，包含开始时间,结束时间,星期,时间段,课程名称
     星期格式为: 星期一, 星期二, 星期三, 星期四, 星期五, 星期六, 星期日
     时间段格式为: 上午第1节, 下午第2节, 晚上第3节
+    开始和结束时间以时间戳(秒)保存，只在显示时转换为QDateTime
+    rule为重复规则(单双周、起止日期、停课日期)，为None时每周都上课
     """
     
+    __slots__ = ("startSecs", "endSecs", "subject", "period", "weekday", "rule", "__text")
+    
     def __init__(
             self,
-            start: QDateTime = None,
-            end: QDateTime = None,
+            startSecs: int = None,
+            endSecs: int = None,
             weekday: str = "",
             period: str = "",
             subject: str = "",
+            rule: CourseRule = None,
     ):
-        self.start: QDateTime = start
-        self.end: QDateTime = end
+        self.startSecs: int = startSecs
+        self.endSecs: int = endSecs
         self.subject: str = subject
         self.period: str = period
         self.weekday: str = weekday
+        self.rule: CourseRule | None = rule
+        self.__text: str | None = None  # 显示文本缓存
+    
+    @property
+    def start( self ) -> QDateTime:
+        """开始时间"""
+        return QDateTime.fromSecsSinceEpoch( self.startSecs )
+    
+    @property
+    def end( self ) -> QDateTime:
+        """结束时间"""
+        return QDateTime.fromSecsSinceEpoch( self.endSecs )
     
     def isValid( self ):
         """数据规范性"""
-        if self.start is None or self.end is None:
-            return False
-        if not self.start.isValid() or not self.end.isValid():
-            return False
-        return True
+        return self.startSecs is not None and self.endSecs is not None
     
-    def isThis( self, dateTime: QDateTime ):
-        """检测指定时间是否在本课程时间段内"""
-        return self.start <= dateTime < self.end
+    def isThis( self, secs: int ):
+        """检测指定时间(时间戳)是否在本课程时间段内"""
+        return self.startSecs <= secs < self.endSecs
     
-    def isBefore( self, dateTime: QDateTime ):
-        """检测本课程时间段是否在指定时间之前"""
-        return self.end < dateTime
+    def isBefore( self, secs: int ):
+        """检测本课程时间段是否在指定时间(时间戳)之前"""
+        return self.endSecs < secs
     
-    def isExpired( self, dateTime: QDateTime ):
+    def isExpired( self, secs: int ):
         """检测本课程时间段是否已过期"""
-        return self.end <= dateTime
+        return self.endSecs <= secs
     
-    def setNextWeekday( self ):
-        """将当前Item修改为下一周"""
-        self.start = self.start.addDays( 7 )
-        self.end = self.end.addDays( 7 )
+    def atDay( self, dayStart: int, minute: int ):
+        """
+        获取本课程在指定日期对应的新Item，只用整数运算，不创建QDateTime
+        :param dayStart: 指定日期零点的时间戳(秒)
+        :param minute: 本课程的开始时间在当天的分钟数
+        """
+        startSecs = dayStart + minute * 60
+        return CourseShdItem(
+            startSecs,
+            startSecs + self.endSecs - self.startSecs,
+            self.weekday,
+            self.period,
+            self.subject,
+            self.rule,
+        )
     
     def __str__( self ):
         """获取文本"""
@@ -216,19 +461,30 @@ class CourseShdItem:
     
     def screenText( self ):
         """获取文本"""
-        return (
-            f"{self.weekday} {self.period}\n{self.start.toString( 'hh:mm' )} - "
-            f"{self.end.toString( 'hh:mm' )}\n{self.subject}"
-        )
+        if self.__text is None:
+            self.__text = (
+                f"{self.weekday} {self.period}\n{self.start.toString( 'hh:mm' )} - "
+                f"{self.end.toString( 'hh:mm' )}\n{self.subject}"
+            )
+        return self.__text
 
 
 class CourseSchedule:
-    """课程表"""
+    """
+    课程表,加载后编译为只读的一周时间线,查找时不修改表项
+    查找时按节假日日历跳过放假日，按重复规则跳过不上课的周，不展开整个学期
+    """
     
     def __init__( self, schedule: list[CourseShdItem] = None ):
         self.schedule: list[CourseShdItem] = (
             schedule if schedule is not None else list()
         )
+        self.timeline: WeekTimeline = WeekTimeline()
+        self.__cacheKey: tuple = ()  # (儒略日, 索引)，用于复用上次查找结果
+        self.__cacheItem: CourseShdItem | None = None
+        self.calendar: HolidayCalendar = HolidayCalendar()  # 放假日不上课，补班日按指定星期上课
+        self.missingPeriods: list[ScheduleIssue] = list()  # 加载时作息表中不存在的时间段
+        self.compile()
     
     def addItem( self, scheduleItem: CourseShdItem ):
         """添加课表项"""
@@ -237,90 +493,353 @@ class CourseSchedule:
         else:
             logger.warning( f"课程表项添加失败: {scheduleItem}" )
     
+    def compile( self, intervals: list[tuple[int, int, CourseShdItem]] = None ):
+        """
+        将课程表编译为一周时间线
+        :param intervals: [(开始分钟, 结束分钟, 项), ...]，时间为周一零点起的分钟数，项与schedule相同；
+                          为None时由schedule中各项的时间计算
+        """
+        if intervals is None:
+            intervals = list()
+            for item in self.schedule:
+                offset = (item.start.date().dayOfWeek() - 1) * DayMinutes
+                intervals.append(
+                    (
+                        offset + minuteOfDay( item.start.time() ),
+                        offset + minuteOfDay( item.end.time() ),
+                        item,
+                    ),
+                )
+        self.timeline = WeekTimeline( intervals )
+        self.__cacheKey = ()
+        self.__cacheItem = None
+    
+    def snapshot( self ) -> tuple:
+        """获取与日期无关的表项快照，用于比较两次加载的差异"""
+        return tuple(
+            zip(
+                self.timeline.starts,
+                self.timeline.ends,
+                (
+                    (item.period, item.subject, item.rule.key() if item.rule is not None else None)
+                    for item in self.timeline.items
+                ),
+            ),
+        )
+    
+    def compiledRecords( self ) -> list[tuple[int, int, int, str, str, tuple | None]]:
+        """获取编译后的数据: [(星期, 开始分钟, 结束分钟, 节次, 科目, 重复规则), ...]，星期0为周一"""
+        return [
+            (
+                start // DayMinutes,
+                start % DayMinutes,
+                end - start // DayMinutes * DayMinutes,
+                item.period,
+                item.subject,
+                item.rule.key() if item.rule is not None else None,
+            )
+            for start, end, item in zip( self.timeline.starts, self.timeline.ends, self.timeline.items )
+        ]
+    
+    def loadCompiled( self, records: Iterable[tuple[int, int, int, str, str, tuple | None]] ):
+        """
+        从编译后的数据(快照)加载课程表，不再校验和解析字符串
+        :param records: [(星期, 开始分钟, 结束分钟, 节次, 科目, 重复规则), ...]，星期0为周一，
+                        重复规则为CourseRule.key()的返回值
+        """
+        dayStarts = weekDayStarts()
+        intervals = [
+            (
+                weekday * DayMinutes + start,
+                weekday * DayMinutes + end,
+                CourseShdItem(
+                    dayStarts[weekday] + start * 60,
+                    dayStarts[weekday] + end * 60,
+                    Weekday.CWEEKDAYS[weekday],
+                    period,
+                    subject,
+                    CourseRule( weekday, *rule ) if rule is not None else None,
+                ),
+            )
+            for weekday, start, end, period, subject, rule in records
+        ]
+        self.schedule = [item for _, _, item in intervals]
+        self.compile( intervals )
+    
+    def __itemAt( self, index: int, day: int ) -> CourseShdItem:
+        """获取时间线中第index项在指定日期(儒略日)对应的Item"""
+        key = (day, index)
+        if key != self.__cacheKey:
+            self.__cacheKey = key
+            self.__cacheItem = self.timeline.items[index].atDay(
+                julianDayStartSecs( day ),
+                self.timeline.starts[index] % DayMinutes,
+            )
+        return self.__cacheItem
+    
+    def __occurs( self, index: int, day: int ) -> bool:
+        """检查时间线中第index项在指定日期是否上课"""
+        rule = self.timeline.items[index].rule
+        return rule is None or rule.activeOn( day )
+    
+    def __search( self, started: bool, step: int ) -> CourseShdItem | None:
+        """
+        从当前时间开始按天查找第一节上课的课程，跳过放假日和不上课的周
+        :param started: 向后查找时，今天已开始但未结束的课程是否算作结果
+        :param step: 1为向后查找，-1为向前查找已结束的课程
+        """
+        currentDateTime = QDateTime.currentDateTime()
+        today = currentDateTime.date().toJulianDay()
+        minute = minuteOfDay( currentDateTime.time() )
+        firstDay = today
+        while abs( firstDay - today ) < YearDays:
+            for day, weekday in self.calendar.scheduleDays( firstDay, SearchDays, step ):
+                indices = self.timeline.dayRange( weekday )
+                offset = weekday * DayMinutes + minute
+                for index in indices if step > 0 else reversed( indices ):
+                    if day == today:
+                        end = self.timeline.ends[index]
+                        if step < 0 and end > offset:
+                            continue
+                        if step > 0 and (end if started else self.timeline.starts[index]) <= offset:
+                            continue
+                    if self.__occurs( index, day ):
+                        return self.__itemAt( index, day )
+            if step < 0:
+                return None
+            
+            # 查找范围内都没有课(假期、学期未开始或停课)，由各规则直接计算下一次可能上课的日期
+            firstDay += SearchDays
+            rules = [item.rule for item in self.timeline.items]
+            if None not in rules:
+                days = [rule.nextOnOrAfter( firstDay ) for rule in rules]
+                days = [day for day in days if day is not None]
+                days += [day for day in self.calendar.workDays if day >= firstDay]  # 补班日可能按其他星期上课
+                if len( days ) == 0:
+                    return None
+                firstDay = min( days )
+        return None
+    
     def getCurrentItem( self ) -> CourseShdItem | None:
         """获取当前时间对应的课表项，如果没有，则返回当前时间对应的后一个课表项"""
-        if len( self.schedule ) == 0:
+        if len( self.timeline ) == 0:
             logger.warning( "课程表为空" )
             return None
-        self.schedule.sort( key = lambda x: x.start )
-        currentDateTime = QDateTime.currentDateTime()
-        for item in self.schedule:
-            if item.isExpired( currentDateTime ):
-                item.setNextWeekday()
-            else:
-                return item
-        else:
-            # 当前课表项都过期,已经全部被设置为后一周对应课表项,返回第一个
-            return self.schedule[0]
+        return self.__search( True, 1 )
+    
+    def getNextItem( self ) -> CourseShdItem | None:
+        """获取当前时间之后开始的下一个课表项"""
+        if len( self.timeline ) == 0:
+            return None
+        return self.__search( False, 1 )
+    
+    def getPreviousItem( self ) -> CourseShdItem | None:
+        """获取当前时间之前已结束的上一个课表项，两周内没有时返回None"""
+        if len( self.timeline ) == 0:
+            return None
+        return self.__search( False, -1 )
+    
+    def validate( self ) -> list[ScheduleIssue]:
+        """
+        检查同一天的课程是否重叠，以及加载时作息表中不存在的时间段
+        重复规则不会在同一天上课的课程(同一节的单周和双周课程，起止日期不相交的课程)不算重叠
+        """
+        issues = [
+            issue for issue in findIntervalIssues( timelineIntervals( self.timeline ), False, True )
+            if issue.kind != OVERLAP
+        ]
+        issues.extend(
+            findOverlaps(
+                (
+                    interval + (item.rule,)
+                    for interval, item in zip( timelineIntervals( self.timeline ), self.timeline.items )
+                ),
+                rulesMayCoincide,
+                True,
+            ),
+        )
+        return issues + self.missingPeriods
+    
+    def occurrences( self, start: QDateTime, end: QDateTime ) -> Iterator[CourseShdItem]:
+        """按时间顺序逐个生成[start, end)内上课的课程"""
+        return timelineOccurrences( self.timeline, self.calendar, start, end, self.__occurs )
     
-    def loadCourseSchedule( self, model: QSqlTableModel, dailySchedule: DailySchedule ):
-        """从数据库加载课程表"""
-        if dailySchedule is None or model is None:
-            logger.warning( "作息表或数据库模型为空: None" )
+    @staticmethod
+    def parseRule(
+            weekdayIndex: int,
+            weeks: str,
+            startDate: str,
+            endDate: str,
+            exceptDates: str,
+    ) -> CourseRule | None:
+        """
+        解析课程重复规则
+        :param weekdayIndex: 星期序号，0为星期一
+        :param weeks: 上课周: 空字符串, 每周, 单周, 双周
+        :param startDate: 开始日期 yyyy-MM-dd，可以为空
+        :param endDate: 结束日期 yyyy-MM-dd，可以为空
+        :param exceptDates: 停课日期，用逗号分隔，可以为空
+        :return: 重复规则，全部为空(每周上课)时返回None
+        :raise ValueError: 格式错误
+        """
+        
+        def julianDay( dateString: str ) -> int | None:
+            dateString = (dateString or "").strip()
+            if len( dateString ) == 0:
+                return None
+            day = parseDate( dateString )
+            if day is None:
+                raise ValueError( f"日期格式错误: {dateString}" )
+            return day
+        
+        weeks = (weeks or "").strip()
+        if weeks not in Weekday.CWEEKRULES:
+            raise ValueError( f"上课周格式错误: {weeks}" )
+        interval, phase = Weekday.CWEEKRULES[weeks]
+        startDay = julianDay( startDate )
+        endDay = julianDay( endDate )
+        exceptions = frozenset(
+            julianDay( part )
+            for part in (exceptDates or "").replace( "，", "," ).split( "," )
+            if len( part.strip() ) > 0
+        )
+        if interval == 1 and startDay is None and endDay is None and len( exceptions ) == 0:
+            return None
+        anchor = None
+        if startDay is not None and interval > 1:
+            # 有开始日期时，单周为开始日期所在周起的第1, 3, 5...周
+            anchor = startDay if phase == 1 else startDay + 7
+        return CourseRule( weekdayIndex, interval, anchor, phase, startDay, endDay, exceptions )
+    
+    def loadCourseSchedule( self, rows: Iterable[tuple], dailySchedule: DailySchedule ):
+        """
+        从数据库加载课程表
+        :param rows: 数据行(weekday, period, course, weeks, start_date, end_date, except_dates)
+        :param dailySchedule: 作息表，用于查找各节次的时间
+        """
+        if dailySchedule is None or rows is None:
+            logger.warning( "作息表或数据库查询结果为空: None" )
             return
         self.schedule.clear()  # 清空当前列表
+        self.missingPeriods.clear()
         weekday_list = Weekday.CWEEKDAYS  # 星期列表
+        dayStarts = weekDayStarts()
+        intervals = list()
         
-        # 当前日期
-        currentDate = QDate.currentDate()
-        currentWeekdayIndex = currentDate.dayOfWeek() - 1
-        
-        rowCount = model.rowCount()
-        for row in range( rowCount ):
-            
-            # 计算日期
-            weekday = model.record( row ).value( "weekday" )
-            if not checkWeekdayString( weekday ):
-                logger.warning( f"第{row}行星期格式错误: {weekday}" )
+        for row, values, errors in validateRows( "CourseSchedule", rows ):
+            if values is None:
+                logger.warning( f"课程表加载失败，{'; '.join( str( error ) for error in errors )}" )
                 continue
+            weekday, period, subject, weeks, startDate, endDate, exceptDates = values
             weekdayIndex = weekday_list.index( weekday )
-            date = currentDate.addDays( weekdayIndex - currentWeekdayIndex )
             
-            # 计算开始时间和结束时间
-            period = model.record( row ).value( "period" )
-            if not checkPeriodString( period ):
-                logger.warning( f"第{row}行时间段格式错误: {period}" )
+            # 重复规则
+            try:
+                rule = self.parseRule( weekdayIndex, weeks, startDate, endDate, exceptDates )
+            except ValueError as e:
+                logger.warning( f"第{row}行重复规则错误: {e}" )
                 continue
-            dailyScheduleItem = dailySchedule.findItemByPeriod(
-                period,
-            )  # 查找对应的作息表项
-            if dailyScheduleItem is None:
+            
+            # 查找当天作息中对应时间段的开始和结束时间(分钟)，用整数运算得到时间戳
+            minutes = dailySchedule.findPeriodMinutes( period, weekdayIndex )
+            if minutes is None:
                 logger.warning( f"第{row}行时间段不存在: {period}" )
+                self.missingPeriods.append( ScheduleIssue( MISSING, weekday, 0, 0, period, subject ) )
                 continue
-            start, end = dailyScheduleItem.getTime()
-            startDateTime = QDateTime.fromString(
-                f"{date.toString( 'yyyy-MM-dd' )} {start.toString( 'hh:mm' )}",
-                "yyyy-MM-dd hh:mm",
-            )
-            endDateTime = QDateTime.fromString(
-                f"{date.toString( 'yyyy-MM-dd' )} {end.toString( 'hh:mm' )}",
-                "yyyy-MM-dd hh:mm",
-            )
-            
-            subject = model.record( row ).value( "course" )
-            
-            # 添加课程表条目
-            self.addItem(
-                CourseShdItem(
-                    startDateTime,
-                    endDateTime,
-                    weekday,
-                    period,
-                    subject,
+            start, end = minutes
+            offset = weekdayIndex * DayMinutes
+            intervals.append(
+                (
+                    offset + start,
+                    offset + end,
+                    CourseShdItem(
+                        dayStarts[weekdayIndex] + start * 60,
+                        dayStarts[weekdayIndex] + end * 60,
+                        weekday,
+                        period,
+                        subject,
+                        rule,
+                    ),
                 ),
             )
         
-        if len( self.schedule ) > 0:
-            self.schedule.sort( key = lambda x: x.start )
+        intervals.sort( key = itemgetter( 0 ) )
+        self.schedule = [item for _, _, item in intervals]
+        self.compile( intervals )
         logger.info( f"课程表加载完成, 加载{len( self.schedule )}条记录" )
+        logIssues( "课程表", self.validate() )
+
+
+class ClassCourses:
+    """
+    多班级课程表(ClassSchedule表)中其他班级或教师的课程，节次的时间来自本机作息表
+    只保存解析后的记录，由DataSource与本机课程表一起放入ScheduleStore中查询
+    """
+    
+    def __init__( self ):
+        # (班级, 星期, 开始分钟, 结束分钟, 节次, 科目, 重复规则)，星期0为周一，分钟为当天零点起的分钟数
+        self.records: list[tuple[str, int, int, int, str, str, CourseRule | None]] = list()
+        self.missingPeriods: list[ScheduleIssue] = list()  # 加载时作息表中不存在的时间段
+    
+    def snapshot( self ) -> tuple:
+        """获取表项快照，用于比较两次加载的差异"""
+        return tuple(
+            record[:6] + (record[6].key() if record[6] is not None else None,) for record in self.records
+        )
+    
+    def loadClassSchedule( self, rows: Iterable[tuple], dailySchedule: DailySchedule ):
+        """
+        从数据库加载多班级课程表
+        :param rows: 数据行(class_name, weekday, period, course, weeks, start_date, end_date, except_dates)
+        :param dailySchedule: 作息表，用于查找各节次的时间
+        """
+        self.records.clear()
+        self.missingPeriods.clear()
+        if dailySchedule is None or rows is None:
+            logger.warning( "作息表或数据库查询结果为空: None" )
+            return
+        for row, values, errors in validateRows( "ClassSchedule", rows ):
+            if values is None:
+                logger.warning( f"多班级课程表加载失败，{'; '.join( str( error ) for error in errors )}" )
+                continue
+            className, weekday, period, subject, weeks, startDate, endDate, exceptDates = values
+            weekdayIndex = Weekday.CWEEKDAYS.index( weekday )
+            try:
+                rule = CourseSchedule.parseRule( weekdayIndex, weeks, startDate, endDate, exceptDates )
+            except ValueError as e:
+                logger.warning( f"多班级课程表第{row}行重复规则错误: {e}" )
+                continue
+            minutes = dailySchedule.findPeriodMinutes( period, weekdayIndex )
+            if minutes is None:
+                logger.warning( f"多班级课程表第{row}行时间段不存在: {period}" )
+                self.missingPeriods.append(
+                    ScheduleIssue( MISSING, f"{className} {weekday}", 0, 0, period, subject ),
+                )
+                continue
+            self.records.append( (className, weekdayIndex, *minutes, period, subject, rule) )
+        logger.info( f"多班级课程表加载完成, 加载{len( self.records )}条记录" )
 
 
 class CountdayItem:
-    """倒数日条目"""
+    """倒数日条目,日期以儒略日(整数)保存"""
+    
+    __slots__ = ("day", "text", "__textDay", "__text")
     
-    def __init__( self, date: QDate = None, text: str = "" ):
-        self.date: QDate = date
+    def __init__( self, day: int = None, text: str = "" ):
+        self.day: int = day
         self.text: str = text
+        self.__textDay: int | None = None  # 显示文本缓存对应的日期
+        self.__text: str = ""  # 显示文本缓存
+    
+    @property
+    def date( self ) -> QDate:
+        """日期"""
+        return QDate.fromJulianDay( self.day )
+    
+    @property
+    def startSecs( self ) -> int:
+        """当天零点的时间戳(秒)，用于与作息项和课程项按时间排序"""
+        return dayStartSecs( self.date )
     
     def __str__( self ):
         """获取文本"""
@@ -328,9 +847,7 @@ class CountdayItem:
     
     def isValid( self ):
         """数据规范性"""
-        if self.date is None:
-            return False
-        if not self.date.isValid():
+        if self.day is None:
             return False
         if len( self.text ) == 0:
             return False
@@ -340,11 +857,15 @@ class CountdayItem:
         """获取文本"""
         if currentDate is None:
             currentDate = QDate.currentDate()
-        return f"距{self.text}{currentDate.daysTo( self.date )}天"
+        today = currentDate.toJulianDay()
+        if today != self.__textDay:
+            self.__textDay = today
+            self.__text = f"距{self.text}{self.day - today}天"
+        return self.__text
     
     def isExpired( self, currentDate: QDate ):
         """检测本条目是否已过期"""
-        return self.date < currentDate
+        return self.day < currentDate.toJulianDay()
 
 
 class CountdaySchedule:
@@ -361,26 +882,49 @@ class CountdaySchedule:
         else:
             logger.warning( f"倒数日添加失败: {scheduleItem}" )
     
-    def loadCountdaySchedule( self, model: QSqlTableModel ):
-        """从数据库加载倒数日表"""
-        if model is None:
-            logger.warning( "数据库模型为空: None" )
+    def snapshot( self ) -> tuple:
+        """获取表项快照，用于比较两次加载的差异"""
+        return tuple( (item.day, item.text) for item in self.schedule )
+    
+    def loadCompiled( self, records: Iterable[tuple[int, str]] ):
+        """
+        从编译后的数据(快照)加载倒数日表，已过期的项被忽略
+        :param records: [(儒略日, 文本), ...]
+        """
+        today = QDate.currentDate().toJulianDay()
+        self.schedule = [CountdayItem( day, text ) for day, text in records if day >= today]
+    
+    def occurrences( self, start: QDateTime, end: QDateTime ) -> Iterator[CountdayItem]:
+        """按日期顺序逐个生成[start, end)内的倒数日项，倒数日的时间为当天零点"""
+        startSecs, endSecs = start.toSecsSinceEpoch(), end.toSecsSinceEpoch()
+        index = bisect.bisect_left( self.schedule, start.date().toJulianDay(), key = attrgetter( "day" ) )
+        for item in itertools.islice( self.schedule, index, None ):
+            if item.startSecs >= endSecs:
+                return
+            if item.startSecs >= startSecs:
+                yield item
+    
+    def loadCountdaySchedule( self, rows: Iterable[tuple] ):
+        """
+        从数据库加载倒数日表
+        :param rows: 数据行(dateAndtime, description)
+        """
+        if rows is None:
+            logger.warning( "数据库查询结果为空: None" )
             return
         self.schedule.clear()  # 清空当前列表
-        currentDate = QDate.currentDate()
-        rowCount = model.rowCount()
-        for row in range( rowCount ):
-            date = formatDateString( model.record( row ).value( "dateAndtime" ) )
-            text = model.record( row ).value( "description" )
-            if checkDateString( date ) and len( text ) > 0:
-                countdayDate = QDate.fromString( date, "yyyy-MM-dd" )
-                if countdayDate >= currentDate:
-                    self.addItem( CountdayItem( countdayDate, text ) )
-                else:
-                    logger.warning( f"倒数日已经过期: {date} {text}" )
+        today = QDate.currentDate().toJulianDay()
+        for row, values, errors in validateRows( "Countdown", rows ):
+            if values is None:
+                logger.warning( f"倒数日加载失败, {'; '.join( str( error ) for error in errors )}" )
+                continue
+            date, text = values
+            day = parseDate( date )
+            if day >= today:
+                self.addItem( CountdayItem( day, text ) )
             else:
-                logger.warning( f"倒数日加载失败, 第{row}行数据格式错误: {date} {text}" )
-        self.schedule.sort( key = lambda x: x.date )
+                logger.warning( f"倒数日已经过期: {date} {text}" )
+        self.schedule.sort( key = lambda x: x.day )
         logger.info( f"倒数日加载完成, 加载{len( self.schedule )}条记录" )
     
     # 实现 __iter__ 方法，返回迭代器对象
@@ -401,55 +945,521 @@ class CountdaySchedule:
             raise StopIteration  # 抛出 StopIteration 异常，表示迭代结束
 
 
+class DataLoader( QRunnable ):
+    """后台数据加载任务"""
+    
+    def __init__( self, dataSource, databaseFile: str = None ):
+        super().__init__()
+        self.dataSource = dataSource
+        self.databaseFile = databaseFile
+    
+    def run( self ):
+        """在工作线程中使用独立的数据库连接加载数据，成功或失败都会发送dataIsReady信号"""
+        try:
+            self.dataSource.loadDataFromDatabase( self.databaseFile, LoaderConnection )
+        finally:
+            Connections.closeThread()  # 线程池中的线程会被复用，加载完成后关闭本线程的连接
+
+
+class TableReloader( QRunnable ):
+    """后台重新加载任务，结果通过reloadFinished信号交给GUI线程"""
+    
+    def __init__( self, dataSource, tableDigests: dict[str, bytes], dailySchedule ):
+        """
+        :param dataSource: 数据源
+        :param tableDigests: 上次加载时各表的摘要
+        :param dailySchedule: 当前的作息表，作息表没有变化时重新加载课程表使用
+        """
+        super().__init__()
+        self.dataSource = dataSource
+        self.tableDigests = tableDigests
+        self.dailySchedule = dailySchedule
+    
+    def run( self ):
+        """在工作线程中比较各表摘要并重新加载变化的表，失败时发送None"""
+        result = None
+        try:
+            db = connectToDb( self.dataSource.databaseFile, LoaderConnection )
+            if db is not None:
+                try:
+                    result = DataSource.loadChangedTables( db, self.tableDigests, self.dailySchedule )
+                finally:
+                    closeDb( db )
+        except Exception as e:
+            logger.error( f"后台重新加载数据时出错: {e}" )
+        finally:
+            Connections.closeThread()
+        self.dataSource.reloadFinished.emit( result )
+
+
 class DataSource( QObject ):
     """数据源"""
     
-    dataIsReady = Signal()  # 数据加载完成信号
+    dataIsReady = Signal()  # 数据加载完成信号，加载失败时也会发送(各表为空)
+    loadFailed = Signal( str )  # 数据加载失败信号，参数为失败原因，在dataIsReady之前发送
+    dailyChanged = Signal()  # 作息表被修改并重新加载
+    courseChanged = Signal()  # 课程表被修改并重新加载
+    countdayChanged = Signal()  # 倒数日表被修改并重新加载
+    reloadFinished = Signal( object )  # 后台重新加载完成，参数为(各表摘要, 表名 -> 新的表对象)，失败时为None
     
     def __init__( self ):
         super().__init__()
         self.dailySchedule = DailySchedule()
         self.courseSchedule = CourseSchedule()
         self.countdaySchedule = CountdaySchedule()
+        self.holidays = HolidayCalendar()  # 节假日日历
+        self.classCourses = ClassCourses()  # 多班级课程表中其他班级的课程
+        self.scheduleStore = ScheduleStore()  # 本机课程表和其他班级的课程
+        
+        self.databaseFile: str | None = None
+        self.loaded: bool = False  # 是否成功加载过数据
+        self.tableDigests: dict[str, bytes] = dict()  # 各表内容的摘要，用于判断表是否被修改
+        self.dataVersion: int | None = None  # 监视连接上次读取的PRAGMA data_version
+        self.fileSignature: tuple | None = None  # 不可变模式下数据库文件上次的(修改时间, 大小)
+        self.reloading: bool = False  # 是否正在后台重新加载
+        self.reloadPending: bool = False  # 重新加载期间数据库又被修改，完成后再加载一次
+        self.reloadFinished.connect( self.applyReload )
+        
+        self.fileWatcher = QFileSystemWatcher( self )  # 监视数据库文件、-wal文件和所在目录
+        self.fileWatcher.fileChanged.connect( self.onFileChanged )
+        self.fileWatcher.directoryChanged.connect( self.onFileChanged )
+        self.changeTimer = QTimer( self )  # 收到文件修改通知后延迟检查，合并多次通知
+        self.changeTimer.setSingleShot( True )
+        self.changeTimer.setInterval( WatchDelay )
+        self.changeTimer.timeout.connect( self.checkForChanges )
+        self.watchTimer = QTimer( self )  # 后备的定时检查
+        self.watchTimer.timeout.connect( self.checkForChanges )
     
-    def loadDataFromDatabase( self ):
-        """从数据库加载数据"""
-        db = connectToDb()
+    @staticmethod
+    def loadTable( db: QSqlDatabase, tableName: str, dailySchedule: DailySchedule = None ) -> tuple[object, bytes]:
+        """
+        加载一个表，返回新的表对象和该表内容的摘要，可以在工作线程中调用
+        :param db: 数据库连接对象
+        :param tableName: 表名
+        :param dailySchedule: 作息表，加载课程表和多班级课程表时使用
+        """
+        digest = hashlib.sha1()
+        rows = digestRows( tableRows( db, tableName ), digest )
+        if tableName == "DailySchedule":
+            schedule = DailySchedule()
+            schedule.loadDailySchedule( rows )
+        elif tableName == "CourseSchedule":
+            schedule = CourseSchedule()
+            schedule.loadCourseSchedule( rows, dailySchedule )
+        elif tableName == "Holidays":
+            schedule = HolidayCalendar()
+            schedule.loadHolidays( rows )
+        elif tableName == "ClassSchedule":
+            schedule = ClassCourses()
+            schedule.loadClassSchedule( rows, dailySchedule )
+        else:
+            schedule = CountdaySchedule()
+            schedule.loadCountdaySchedule( rows )
+        return schedule, digest.digest()
+    
+    def loadDataFromDatabase( self, databaseFile: str = None, connectionName: str = DefaultConnection ):
+        """
+        从数据库加载数据，完成后发送dataIsReady信号；失败时先发送loadFailed信号，各表保持为空，
+        界面不会一直等待，之后由startWatching()发现数据库可以读取时重新加载
+        :param databaseFile: 数据库文件，默认为Paths.DatabaseFile
+        :param connectionName: 数据库连接名称，不同线程需要使用不同的连接
+        """
+        self.databaseFile = databaseFile
+        try:
+            message = self.__load( connectionName )
+        except Exception as e:
+            message = f"加载数据时出错: {e}"
+        if message is not None:
+            logger.error( message )
+            self.loadFailed.emit( message )
+        else:
+            self.loaded = True
+            logger.info( "数据加载完成" )
+        self.dataIsReady.emit()  # 发送数据加载完成信号
+    
+    def __load( self, connectionName: str ) -> str | None:
+        """
+        每个表只执行一次只进查询，计算摘要和加载使用Repository中缓存的数据行
+        各表先加载到新的对象中，全部完成后再替换，读取方不会看到加载到一半的数据
+        :return: 失败的原因，成功时返回None
+        """
+        db = connectToDb( self.databaseFile, connectionName )
         if db is None:
-            logger.error( "无法连接数据库" )
-            return
-        tableList = ["DailySchedule", "CourseSchedule", "params", "Countdown"]
-        model = QSqlTableModel( self, db = db )  # 读取表数据
-        
-        # 作息表
-        model.setTable( tableList[0] )
-        model.select()
-        self.dailySchedule.loadDailySchedule( model )
+            return "无法连接数据库"
         
-        # 课程表
-        model.setTable( tableList[1] )
-        model.select()
-        self.courseSchedule.loadCourseSchedule( model, self.dailySchedule )
+        # 源数据未变化时直接使用快照，跳过校验和解析
+        digests = {tableName: self.tableDigest( db, tableName ) for tableName in TableQueries}
+        records = readSnapshot( self.snapshotFile(), combineDigests( digests ) )
+        if records is not None:
+            dailySchedule, courseSchedule, countdaySchedule = DailySchedule(), CourseSchedule(), CountdaySchedule()
+            holidays = HolidayCalendar()
+            dailySchedule.loadCompiled( records[0] )
+            courseSchedule.loadCompiled( records[1] )
+            countdaySchedule.loadCompiled( records[2] )
+            holidays.loadCompiled( records[3] )
+            classCourses, _ = self.loadTable( db, "ClassSchedule", dailySchedule )  # 不在快照中
+            logger.info( "从快照文件加载数据" )
+        else:
+            _, tables = self.loadChangedTables( db, dict(), None )
+            dailySchedule = tables["DailySchedule"]  # 作息表
+            courseSchedule = tables["CourseSchedule"]  # 课程表
+            countdaySchedule = tables["Countdown"]  # 倒数日
+            holidays = tables["Holidays"]  # 节假日
+            classCourses = tables["ClassSchedule"]  # 多班级课程表
+        self.tableDigests = digests
+        closeDb( db )
         
-        # 倒数日
-        model.setTable( tableList[3] )
-        model.select()
-        self.countdaySchedule.loadCountdaySchedule( model )
+        self.setSchedules( dailySchedule, courseSchedule, countdaySchedule, holidays, classCourses )
+        self.buildScheduleStore()
+        if records is None:
+            self.saveSnapshot()
+        return None
+    
+    def snapshotFile( self ) -> str:
+        """获取快照文件"""
+        return snapshotFile( self.databaseFile if self.databaseFile is not None else Paths.DatabaseFile )
+    
+    def saveSnapshot( self ):
+        """将当前编译后的数据写入快照文件，只读模式下不写入(快照文件与数据库在同一目录)"""
+        if Connections.readOnly:
+            return
+        writeSnapshot(
+            self.snapshotFile(),
+            combineDigests( self.tableDigests ),
+            self.dailySchedule.snapshot(),
+            self.courseSchedule.compiledRecords(),
+            self.countdaySchedule.snapshot(),
+            self.holidays.snapshot(),
+        )
+    
+    def setSchedules(
+            self,
+            dailySchedule: DailySchedule,
+            courseSchedule: CourseSchedule,
+            countdaySchedule: CountdaySchedule,
+            holidays: HolidayCalendar,
+            classCourses: ClassCourses = None,
+    ):
+        """替换各表，作息表和课程表使用同一个节假日日历，classCourses为None时保留原有的多班级课程表"""
+        dailySchedule.calendar = holidays
+        courseSchedule.calendar = holidays
+        self.dailySchedule = dailySchedule
+        self.courseSchedule = courseSchedule
+        self.countdaySchedule = countdaySchedule
+        self.holidays = holidays
+        if classCourses is not None:
+            self.classCourses = classCourses
+    
+    @staticmethod
+    def tableDigest( db: QSqlDatabase, tableName: str ) -> bytes:
+        """计算表内容的摘要，只读取数据不做解析"""
+        digest = hashlib.sha1()
+        for _ in digestRows( tableRows( db, tableName ), digest ):
+            pass
+        return digest.digest()
+    
+    def loadDataInBackground( self, databaseFile: str = None ):
+        """在线程池中加载数据，完成后发送dataIsReady信号"""
+        QThreadPool.globalInstance().start( DataLoader( self, databaseFile ) )
+    
+    def watchedPaths( self ) -> list[str]:
+        """需要监视的路径: 数据库文件、-wal文件，以及所在目录(发现-wal文件的创建和数据库文件被替换)"""
+        fileName = os.path.abspath( self.databaseFile if self.databaseFile is not None else Paths.DatabaseFile )
+        return [fileName, f"{fileName}-wal", os.path.dirname( fileName )]
+    
+    def watchFiles( self ):
+        """监视存在但还没有监视的路径，文件被删除或替换后监视会失效，-wal文件第一次写入时才创建"""
+        watched = set( self.fileWatcher.files() ) | set( self.fileWatcher.directories() )
+        paths = [path for path in self.watchedPaths() if path not in watched and os.path.exists( path )]
+        if len( paths ) > 0:
+            self.fileWatcher.addPaths( paths )
+    
+    def startWatching( self, interval: int = WatchInterval ):
+        """
+        开始监视数据库，文件修改时检查PRAGMA data_version，需要在GUI线程中调用
+        文件系统收不到修改通知时，由间隔为interval的定时检查发现修改
+        """
+        self.dataVersion = None  # 首次检查时比较各表摘要，以发现加载之后的修改
+        self.watchFiles()
+        self.checkForChanges()
+        self.watchTimer.start( interval )
+    
+    def stopWatching( self ):
+        """停止监视数据库"""
+        self.watchTimer.stop()
+        self.changeTimer.stop()
+        paths = self.fileWatcher.files() + self.fileWatcher.directories()
+        if len( paths ) > 0:
+            self.fileWatcher.removePaths( paths )
+        Connections.close( WatchConnection )
+    
+    def onFileChanged( self, path: str ):
+        """数据库文件或所在目录被修改，稍后检查"""
+        self.watchFiles()
+        self.changeTimer.start()
+    
+    def checkForChanges( self ):
+        """
+        通过PRAGMA data_version检查数据库是否被其他连接修改，只执行一条语句，
+        被修改时在线程池中比较各表摘要，并只重新加载内容发生变化的表
+        不可变模式下SQLite认为文件不会改变，改为检查文件的修改时间和大小，变化时重新打开连接
+        """
+        if Connections.mode == Immutable:
+            signature = self.databaseSignature()
+            if signature == self.fileSignature and self.dataVersion is not None:
+                return
+            self.fileSignature = signature
+            Connections.closeIdle()  # 包括监视连接，以及GUI线程中其他可能缓存了旧数据的连接
+            self.dataVersion = None  # data_version属于连接，重新打开后不能与原来的值比较
+        db = connectToDb( self.databaseFile, WatchConnection )  # 连接保持打开，只在第一次检查时打开
+        if db is None:
+            return
+        try:
+            query = Connections.prepare( db, "PRAGMA data_version" )
+            if query is None or not query.exec() or not query.next():
+                return
+            version = int( query.value( 0 ) )
+            query.finish()
+            if version == self.dataVersion:
+                return
+            self.dataVersion = version
+            Repository.invalidateAll()  # 不知道哪些表被修改，重新读取所有表
+            self.startReload()
+        finally:
+            closeDb( db )
+    
+    def startReload( self ):
+        """在线程池中重新加载，正在加载时等加载完成后再加载一次"""
+        if self.reloading:
+            self.reloadPending = True
+            return
+        self.reloading = True
+        QThreadPool.globalInstance().start( TableReloader( self, dict( self.tableDigests ), self.dailySchedule ) )
+    
+    def databaseSignature( self ) -> tuple | None:
+        """
+        数据库文件和-wal文件的(修改时间, 大小)，数据库文件不存在时为None
+        写入方使用WAL模式时，提交的修改在检查点之前只改变-wal文件；
+        不可变模式不读取-wal文件，检查点写回数据库文件后文件签名再次变化，那时才能读到修改
+        """
+        fileName = self.databaseFile if self.databaseFile is not None else Paths.DatabaseFile
+        signature = list()
+        for name in (fileName, f"{fileName}-wal"):
+            try:
+                stat = os.stat( name )
+            except OSError:
+                if name == fileName:
+                    return None
+                continue
+            signature.extend( (stat.st_mtime_ns, stat.st_size) )
+        return tuple( signature )
+    
+    @staticmethod
+    def loadChangedTables(
+            db: QSqlDatabase,
+            tableDigests: dict[str, bytes],
+            dailySchedule: DailySchedule | None,
+    ) -> tuple[dict[str, bytes], dict[str, object]]:
+        """
+        比较各表摘要，加载内容变化的表，可以在工作线程中调用
+        作息表变化时课程表和多班级课程表也重新加载(课程时间来自作息表)
+        :param db: 数据库连接对象
+        :param tableDigests: 上次加载时各表的摘要，为空时加载所有表
+        :param dailySchedule: 当前的作息表，作息表没有变化时加载课程表使用
+        :return: (各表的摘要, 表名 -> 新的表对象)
+        """
+        digests = {tableName: DataSource.tableDigest( db, tableName ) for tableName in TableQueries}
+        changed = {tableName for tableName, digest in digests.items() if digest != tableDigests.get( tableName )}
+        if "DailySchedule" in changed:
+            changed.update( ("CourseSchedule", "ClassSchedule") )
+        tables = dict()
+        for tableName in TableQueries:  # 作息表在课程表和多班级课程表之前加载
+            if tableName in changed:
+                tables[tableName], _ = DataSource.loadTable(
+                    db, tableName, tables.get( "DailySchedule", dailySchedule ),
+                )
+        return digests, tables
+    
+    def applyReload( self, result: tuple[dict[str, bytes], dict[str, object]] | None ):
+        """在GUI线程中替换后台重新加载的表"""
+        self.reloading = False
+        if result is None:
+            self.dataVersion = None  # 加载失败，下次检查时重试
+        else:
+            digests, tables = result
+            self.tableDigests = digests
+            if len( tables ) > 0:
+                self.swapTables( tables )
+        if self.reloadPending:
+            self.reloadPending = False
+            self.startReload()
+    
+    def swapTables( self, tables: dict[str, object] ):
+        """替换重新加载的表，与原有表项比较后只通知内容确实变化的表"""
+        logger.info( f"数据库已修改, 重新加载: {', '.join( sorted( tables ) )}" )
+        dailySchedule = tables.get( "DailySchedule", self.dailySchedule )
+        courseSchedule = tables.get( "CourseSchedule", self.courseSchedule )
+        countdaySchedule = tables.get( "Countdown", self.countdaySchedule )
+        holidays = tables.get( "Holidays", self.holidays )
+        classCourses = tables.get( "ClassSchedule", self.classCourses )
         
-        logger.info( "数据加载完成" )
-        self.dataIsReady.emit()  # 发送数据加载完成信号
+        rebuildStore = False  # 其他班级的课程变化时也重新建立ScheduleStore
+        signals = list()
+        for old, new, tableSignals in (
+                (self.dailySchedule, dailySchedule, [self.dailyChanged]),
+                (self.courseSchedule, courseSchedule, [self.courseChanged]),
+                (self.countdaySchedule, countdaySchedule, [self.countdayChanged]),
+                (self.holidays, holidays, [self.dailyChanged, self.courseChanged]),  # 放假和补班影响作息和课程
+                (self.classCourses, classCourses, []),  # 不影响本机的显示
+        ):
+            if old is new:
+                continue
+            oldItems, newItems = set( old.snapshot() ), set( new.snapshot() )
+            if oldItems != newItems:
+                logger.info(
+                    f"表项变化: 新增{len( newItems - oldItems )}项, 删除{len( oldItems - newItems )}项",
+                )
+                signals.extend( signal for signal in tableSignals if signal not in signals )
+                rebuildStore = rebuildStore or new is classCourses
         
-        closeDb( db )
+        if not self.loaded:  # 第一次加载失败，窗口显示的是失败信息，全部更新
+            signals = [self.dailyChanged, self.courseChanged, self.countdayChanged]
+            self.loaded = True
+        self.setSchedules( dailySchedule, courseSchedule, countdaySchedule, holidays, classCourses )
+        if rebuildStore or self.courseChanged in signals:
+            self.buildScheduleStore()
+        self.saveSnapshot()
+        for signal in signals:
+            signal.emit()
     
     def getDailyShdItem( self ) -> DailyShdItem | None:
         """获取当前时间对应的作息表项"""
         logger.info( "获取当前作息条目" )
         return self.dailySchedule.getCurrentItem()
     
+    def getNextDailyShdItem( self ) -> DailyShdItem | None:
+        """获取当前时间之后的下一个作息表项"""
+        return self.dailySchedule.getNextItem()
+    
     def getCourseShdItem( self ) -> CourseShdItem | None:
         """获取当前时间对应的课程表项，或者下一表项"""
         logger.info( "获取当前课程条目" )
-        return self.courseSchedule.getCurrentItem()
+        if len( self.courseSchedule.timeline ) == 0:
+            logger.warning( "课程表为空" )
+            return None
+        return self.getClassCourseShdItem( DefaultClassName )
+    
+    def buildScheduleStore( self ):
+        """将本机课程表(班级为DefaultClassName)和多班级课程表中其他班级的课程放入ScheduleStore，使用同一个节假日日历"""
+        store = ScheduleStore()
+        store.calendar = self.holidays
+        store.addClass( DefaultClassName )  # 本机课程表为空时也占用编号0
+        timeline = self.courseSchedule.timeline
+        for start, end, item in zip( timeline.starts, timeline.ends, timeline.items ):
+            weekday = start // DayMinutes
+            offset = weekday * DayMinutes
+            store.addItem(
+                DefaultClassName, weekday, start - offset, end - offset, item.period, item.subject, item.rule,
+            )
+        for record in self.classCourses.records:
+            if record[0] == DefaultClassName:
+                logger.warning( f"多班级课程表中的班级名称与本机课程表相同: {DefaultClassName}" )
+            store.addItem( *record )
+        store.compile()
+        self.scheduleStore = store
+    
+    def getScheduleStore( self ) -> ScheduleStore:
+        """获取多班级课程表"""
+        return self.scheduleStore
+    
+    def courseItemFromStore( self, row: int, day: int ) -> CourseShdItem:
+        """将ScheduleStore中的一行转换为指定日期(儒略日)的课程表项"""
+        _, weekday, start, end, period, subject = self.scheduleStore.row( row )
+        offset = weekday * DayMinutes
+        dayStart = julianDayStartSecs( day )
+        return CourseShdItem(
+            dayStart + (start - offset) * 60,
+            dayStart + (end - offset) * 60,
+            Weekday.CWEEKDAYS[weekday],
+            period,
+            subject,
+            self.scheduleStore.rules[row],
+        )
+    
+    def getClassCourseShdItem( self, className: str = DefaultClassName ) -> CourseShdItem | None:
+        """
+        获取指定班级当前时间对应的课程表项，或者下一表项
+        按节假日日历和重复规则跳过不上课的日期，本机课程表的结果与CourseSchedule.getCurrentItem()相同
+        """
+        dateTime = QDateTime.currentDateTime()
+        found = self.scheduleStore.search(
+            className, dateTime.date().toJulianDay(), minuteOfDay( dateTime.time() ),
+        )
+        if found is None:
+            return None
+        row, day = found
+        return self.courseItemFromStore( row, day )
+    
+    def occurrences( self, start: QDateTime, end: QDateTime ) -> Iterator:
+        """
+        按开始时间顺序逐个生成[start, end)内的作息项、课程项和倒数日项
+        各表分别生成有序的项，再用堆进行多路归并，不生成中间列表，内存占用与时间范围无关
+        :param start: 开始时间
+        :param end: 结束时间
+        """
+        return heapq.merge(
+            self.dailySchedule.occurrences( start, end ),
+            self.courseSchedule.occurrences( start, end ),
+            self.countdaySchedule.occurrences( start, end ),
+            key = attrgetter( "startSecs" ),
+        )
+    
+    def exportCalendar( self, start: QDateTime, end: QDateTime, outputDir: str = None ) -> list[str]:
+        """
+        将[start, end)内的作息、课程和倒数日导出为.ics文件，多班级课程表中的其他班级每班一个文件
+        :param start: 开始时间
+        :param end: 结束时间
+        :param outputDir: 输出目录，默认为Paths.OutputDir
+        :return: 导出的文件列表
+        """
+        outputDir = outputDir if outputDir is not None else Paths.OutputDir
+        fileName = os.path.join( outputDir, ExportFile )
+        try:
+            with IcsWriter( fileName, DefaultClassName ) as writer:
+                writeItems( writer, self.occurrences( start, end ) )
+        except OSError as e:
+            logger.error( f"导出日历失败: {e}" )
+            return list()
+        logger.info( f"导出日历: {fileName}, {writer.count}项" )
+        
+        classes: dict[str, list[tuple[int, int, int, str, str, tuple | None]]] = dict()
+        for row in range( len( self.scheduleStore ) ):
+            className, weekday, startMinute, endMinute, period, subject = self.scheduleStore.row( row )
+            if className != DefaultClassName:
+                offset = weekday * DayMinutes
+                rule = self.scheduleStore.rules[row]
+                classes.setdefault( className, list() ).append(
+                    (
+                        weekday,
+                        startMinute - offset,
+                        endMinute - offset,
+                        period,
+                        subject,
+                        rule.key() if rule is not None else None,  # 进程间传递规则内容
+                    ),
+                )
+        return [fileName] + exportClasses(
+            classes,
+            self.holidays.snapshot(),
+            start.date().toJulianDay(),
+            end.addSecs( -1 ).date().toJulianDay(),  # end不包含在导出范围内
+            outputDir,
+            reserved = (ExportFile,),
+        )
+    
+    def isHoliday( self, date: QDate ) -> bool:
+        """检查指定日期是否放假"""
+        return self.holidays.isHoliday( date.toJulianDay() )
     
     def getCountdaySchedule( self ):
         """获取倒数日表"""
@@ -457,26 +1467,85 @@ class DataSource( QObject ):
         return self.countdaySchedule
 
 
-def connectToDb() -> QSqlDatabase | None:
-    """创建数据库连接"""
-    ConnectionName = "timer_db_connection"
-    if QSqlDatabase.contains( ConnectionName ):
-        db = QSqlDatabase.database( ConnectionName )
-    else:
-        db = QSqlDatabase.addDatabase( "QSQLITE", ConnectionName )
-    db.setDatabaseName( Paths.DatabaseFile )
-    if not db.open():
-        logger.error( "无法打开数据库" )
-        return None
-    logger.info( "数据库连接成功" )
-    return db
+def connectToDb( databaseFile: str = None, connectionName: str = DefaultConnection ) -> QSqlDatabase | None:
+    """
+    获取当前线程的长期数据库连接，使用完后调用closeDb()释放
+    :param databaseFile: 数据库文件，默认为Paths.DatabaseFile
+    :param connectionName: 连接角色，同一角色在每个线程中有各自的连接
+    """
+    return Connections.acquire( databaseFile, connectionName )
+
+
+def selectRows( db: QSqlDatabase, queryString: str ) -> Iterator[tuple]:
+    """
+    执行只进查询，逐行返回查询结果，NULL值转换为空字符串
+    :param db: 数据库连接对象
+    :param queryString: 查询语句
+    """
+    query = Connections.prepare( db, queryString )
+    if query is None or not query.exec():
+        logger.error( f"查询失败: {queryString} {query.lastError().text() if query is not None else ''}" )
+        return
+    columns = range( query.record().count() )
+    while query.next():
+        yield tuple( "" if query.isNull( i ) else query.value( i ) for i in columns )
+    query.finish()
+
+
+def tableRows( db: QSqlDatabase, tableName: str ) -> tuple[tuple, ...]:
+    """
+    返回表中的全部数据行，优先使用Repository中的缓存，列的顺序同TableQueries
+    表不存在(旧数据库中后来添加的表)时没有数据
+    """
+    return Repository.rows( db.databaseName(), tableName, lambda: readTable( db, tableName ) )
+
+
+def refreshRepository( db: QSqlDatabase ):
+    """
+    窗口读取缓存的数据行之前调用，检查连接的PRAGMA data_version，
+    数据库被其他连接或进程修改过时清空Repository，不等待DataSource发现修改
+    """
+    if db is None:
+        return
+    query = Connections.prepare( db, "PRAGMA data_version" )
+    if query is None or not query.exec() or not query.next():
+        Repository.invalidateAll()
+        return
+    version = int( query.value( 0 ) )
+    query.finish()
+    if Repository.observe( (db.connectionName(), Connections.serial( db )), version ):
+        logger.info( "数据库可能已被修改，重新读取数据" )
+
+
+def readTable( db: QSqlDatabase, tableName: str ) -> Iterator[tuple]:
+    """从数据库逐行读取表中的数据，不使用缓存"""
+    if db.record( tableName ).isEmpty():
+        return iter( () )
+    return selectRows( db, TableQueries[tableName] )
+
+
+def combineDigests( digests: dict[str, bytes] ) -> bytes:
+    """按TableQueries的顺序合并各表摘要"""
+    digest = hashlib.sha1()
+    for tableName in TableQueries:
+        digest.update( digests.get( tableName, b"" ) )
+    return digest.digest()
+
+
+def digestRows( rows: Iterable[tuple], digest ) -> Iterator[tuple]:
+    """
+    逐行返回数据，同时用每行的内容更新摘要
+    :param rows: 数据行
+    :param digest: hashlib摘要对象
+    """
+    for row in rows:
+        digest.update( repr( row ).encode( "utf-8" ) )
+        yield row
 
 
 def closeDb( db: QSqlDatabase ):
-    """关闭数据库连接"""
-    if db is not None:
-        db.close()
-        logger.info( "数据库连接关闭" )
+    """释放connectToDb()获取的连接，连接由Connections保持打开，不影响其他使用者"""
+    Connections.release( db )
 
 
 def createDbTable( db: QSqlDatabase, tableName: str, columns: list ) -> bool:
@@ -493,3 +1562,216 @@ def createDbTable( db: QSqlDatabase, tableName: str, columns: list ) -> bool:
     columnsString = ", ".join( columns )
     queryString = f"CREATE TABLE IF NOT EXISTS {tableName} ({columnsString})"
     return query.exec( queryString )
+
+
+def createDbIndex( db: QSqlDatabase, tableName: str, column: str ) -> bool:
+    """
+    为数据表的列创建索引
+    :param db: 数据库连接对象
+    :param tableName: 表名
+    :param column: 列名
+    """
+    if db is None:
+        return False
+    query = QSqlQuery( db )
+    return query.exec( f"CREATE INDEX IF NOT EXISTS idx_{tableName}_{column} ON {tableName} ({column})" )
+
+
+def importHolidays( db: QSqlDatabase, rows: Iterable[tuple[str, str, str, str]], years: Iterable[int] = () ) -> int:
+    """
+    在一个事务中批量导入节假日，例如一整年的法定节假日安排
+    开始事务之前按Holidays表的规则校验并规范化所有行，格式错误的行不导入
+    :param db: 数据库连接对象
+    :param rows: 数据行(date, kind, weekday, description)
+    :param years: 导入前删除这些年份已有的记录，为空时保留已有记录
+    :return: 导入的行数，失败时返回-1
+    """
+    if db is None:
+        return -1
+    rows = list( rows )
+    checked = list()
+    for line, values, errors in validateRows( "Holidays", (row[:3] for row in rows) ):
+        if values is None:
+            logger.warning( f"节假日导入失败，{'; '.join( str( error ) for error in errors )}" )
+            continue
+        checked.append( values + (rows[line - 1][3] or "",) )  # 说明不校验
+    rows = checked
+    if not db.transaction():
+        logger.error( f"开始事务失败: {db.lastError().text()}" )
+        return -1
+    query = QSqlQuery( db )
+    ok = True
+    for year in years:
+        ok = ok and query.prepare( "DELETE FROM Holidays WHERE date LIKE ?" )
+        query.addBindValue( f"{year:04d}-%" )
+        ok = ok and query.exec()
+    if ok and len( rows ) > 0:
+        ok = query.prepare(  # 同一天只有一条记录，已有的记录被替换
+            "INSERT OR REPLACE INTO Holidays (date, kind, weekday, description) VALUES (?, ?, ?, ?)",
+        )
+        for column in zip( *rows ):
+            query.addBindValue( list( column ) )
+        ok = ok and query.execBatch()
+    if ok and db.commit():
+        Repository.invalidate( "Holidays" )
+        logger.info( f"导入节假日{len( rows )}条" )
+        return len( rows )
+    logger.error( f"导入节假日失败: {query.lastError().text()}" )
+    db.rollback()
+    return -1
+
+
+# 按 (星期, 时间段, 上课周) 插入或修改课程，冲突目标必须与唯一索引idx_CourseSchedule_lesson(数据库版本2)的表达式完全相同
+UpsertCourseQuery = (
+    "INSERT INTO CourseSchedule (weekday, period, course, weeks) VALUES (?, ?, ?, ?) "
+    f"ON CONFLICT (weekday, period, {LessonWeeks}) WHERE {LessonCondition} "
+    "DO UPDATE SET course = excluded.course"
+)
+DeleteCourseQuery = f"DELETE FROM CourseSchedule WHERE weekday = ? AND period = ? AND {LessonWeeks} = ?"
+
+
+def lessonWeeks( weeks: str ) -> str:
+    """与LessonWeeks相同的规范化: 空和"每周"都为空字符串"""
+    return "" if weeks is None or weeks.strip() in ("", "每周") else weeks
+
+
+def saveCourses(
+        db: QSqlDatabase,
+        upserts: list[tuple[str, str, str, str]],
+        deletes: list[tuple[str, str, str]],
+) -> bool:
+    """
+    在一个事务中批量保存课程表的修改，全部成功或全部不修改
+    :param db: 数据库连接对象
+    :param upserts: 插入或修改的课程(weekday, period, course, weeks)，已有课程只修改course，保留重复规则
+    :param deletes: 删除的课程(weekday, period, weeks)
+    :return: 是否保存成功
+    """
+    if db is None:
+        return False
+    if len( upserts ) == 0 and len( deletes ) == 0:
+        return True
+    deletes = [(weekday, period, lessonWeeks( weeks )) for weekday, period, weeks in deletes]
+    if not db.transaction():
+        logger.error( f"开始事务失败: {db.lastError().text()}" )
+        return False
+    query = QSqlQuery( db )
+    ok = True
+    for queryString, rows in ((DeleteCourseQuery, deletes), (UpsertCourseQuery, upserts)):
+        if ok and len( rows ) > 0:
+            ok = query.prepare( queryString )
+            for column in zip( *rows ):
+                query.addBindValue( list( column ) )
+            ok = ok and query.execBatch()
+    if ok and db.commit():
+        Repository.invalidate( "CourseSchedule" )
+        logger.info( f"保存课程表: 修改{len( upserts )}项, 删除{len( deletes )}项" )
+        return True
+    logger.error( f"保存课程表失败: {query.lastError().text()}" )
+    db.rollback()
+    return False
+
+
+class TableChanges:
+    """配置窗口中一个表的修改，保存时只按主键id写入修改过的行"""
+    
+    __slots__ = ("columns", "updated", "inserted", "deleted")
+    
+    def __init__( self, columns: list[str] ):
+        """
+        :param columns: 写入的列，不包括id
+        """
+        self.columns: list[str] = columns
+        self.updated: list[tuple] = list()  # 修改的行: (各列的值..., id)
+        self.inserted: list[tuple] = list()  # 新增的行: (各列的值...)，由数据库分配主键
+        self.deleted: list[int] = list()  # 删除的行的id
+    
+    def __len__( self ):
+        return len( self.updated ) + len( self.inserted ) + len( self.deleted )
+
+
+def saveTableChanges( db: QSqlDatabase, tables: dict[str, TableChanges] ) -> str | None:
+    """
+    在一个事务中按主键写入各表修改、新增和删除的行，全部成功或全部不修改
+    没有修改的行不写入，配置窗口打开后其他程序修改的行不会被覆盖
+    :param db: 数据库连接对象
+    :param tables: 表名 -> 修改
+    :return: 失败的原因，成功时返回None
+    """
+    if db is None:
+        return "数据库未连接"
+    if not db.transaction():
+        message = f"开始事务失败: {db.lastError().text()}"
+        logger.error( message )
+        return message
+    query = QSqlQuery( db )
+    for tableName, changes in tables.items():
+        columns = changes.columns
+        statements = (
+            (f"DELETE FROM {tableName} WHERE id = ?", [(rowId,) for rowId in changes.deleted]),
+            (
+                f"UPDATE {tableName} SET {', '.join( f'{column} = ?' for column in columns )} WHERE id = ?",
+                changes.updated,
+            ),
+            (
+                f"INSERT INTO {tableName} ({', '.join( columns )}) VALUES ({', '.join( '?' * len( columns ) )})",
+                changes.inserted,
+            ),
+        )
+        ok = True
+        for statement, rows in statements:
+            if len( rows ) == 0:
+                continue
+            ok = query.prepare( statement )
+            if ok:
+                for column in zip( *rows ):
+                    query.addBindValue( list( column ) )
+                ok = query.execBatch()
+            if not ok:
+                break
+        if not ok:
+            message = f"保存{tableName}失败: {query.lastError().text()}"
+            logger.error( message )
+            query.finish()
+            db.rollback()
+            return message
+    query.finish()
+    if not db.commit():
+        message = f"提交事务失败: {db.lastError().text()}"
+        logger.error( message )
+        db.rollback()
+        return message
+    Repository.invalidate( *tables )
+    return None
+
+
+def validateSchedules(
+        dailyRows: Iterable[tuple],
+        courseRows: Iterable[tuple],
+        classRows: Iterable[tuple] = (),
+) -> list[ScheduleIssue]:
+    """
+    检查作息表、课程表和多班级课程表，包括表之间的问题(课程的时间段在作息表中不存在)
+    :param dailyRows: 作息表的数据行，列的顺序同TableQueries
+    :param courseRows: 课程表的数据行
+    :param classRows: 多班级课程表的数据行
+    """
+    dailySchedule = DailySchedule()
+    dailySchedule.loadDailySchedule( dailyRows )
+    courseSchedule = CourseSchedule()
+    courseSchedule.loadCourseSchedule( courseRows, dailySchedule )
+    classCourses = ClassCourses()
+    classCourses.loadClassSchedule( classRows, dailySchedule )
+    store = ScheduleStore()
+    for record in classCourses.records:
+        store.addItem( *record )
+    return dailySchedule.validate() + courseSchedule.validate() + store.validate() + classCourses.missingPeriods
+
+
+def validateDatabase( db: QSqlDatabase ) -> list[ScheduleIssue]:
+    """检查数据库中的作息表、课程表和多班级课程表，不修改DataSource中已加载的数据"""
+    return validateSchedules(
+        tableRows( db, "DailySchedule" ),
+        tableRows( db, "CourseSchedule" ),
+        tableRows( db, "ClassSchedule" ),
+    )
@@ -0,0 +1,89 @@
+"""节假日和调休日历"""
+
+from collections.abc import Iterable, Iterator
+
+from Model.Norm import Holiday, parseDate, validateRows, Weekday
+from Model.recurrence import WeekDays
+from Utils import logger
+
+DayOff = -1  # 快照中放假日的星期序号
+
+
+def julianDay( dateString: str ) -> int | None:
+    """将 yyyy-MM-dd 格式的日期转换为儒略日，格式错误时返回None"""
+    return parseDate( dateString or "" )
+
+
+class HolidayCalendar:
+    """
+    节假日日历，日期均为儒略日(整数)
+    放假日保存在集合中，补班日保存在 日期 -> 按哪一天的星期上课 的字典中，每次查询 O(1)
+    """
+
+    __slots__ = ("offDays", "workDays")
+
+    def __init__( self ):
+        self.offDays: set[int] = set()  # 放假日
+        self.workDays: dict[int, int] = dict()  # 补班日 -> 星期序号(0为星期一)
+
+    def __len__( self ):
+        return len( self.offDays ) + len( self.workDays )
+
+    def isHoliday( self, day: int ) -> bool:
+        """检查指定日期是否放假"""
+        return day in self.offDays
+
+    def weekdayOf( self, day: int ) -> int | None:
+        """获取指定日期按星期几上课，放假时返回None"""
+        if day in self.offDays:
+            return None
+        return self.workDays.get( day, day % WeekDays )
+
+    def scheduleDays( self, firstDay: int, count: int, step: int = 1 ) -> Iterator[tuple[int, int]]:
+        """
+        按时间顺序逐个生成上课日期，跳过放假日
+        :param firstDay: 开始日期
+        :param count: 查找的天数
+        :param step: 1为向后，-1为向前
+        :return: (日期, 星期序号)
+        """
+        for day in range( firstDay, firstDay + count * step, step ):
+            weekday = self.weekdayOf( day )
+            if weekday is not None:
+                yield day, weekday
+
+    def snapshot( self ) -> tuple:
+        """获取日历快照: ((日期, 星期序号), ...)，放假日的星期序号为DayOff"""
+        return tuple(
+            sorted( [(day, DayOff) for day in self.offDays] + list( self.workDays.items() ) ),
+        )
+
+    def loadCompiled( self, records: Iterable[tuple[int, int]] ):
+        """从快照加载日历"""
+        self.offDays = set()
+        self.workDays = dict()
+        for day, weekday in records:
+            if weekday == DayOff:
+                self.offDays.add( day )
+            else:
+                self.workDays[day] = weekday
+
+    def loadHolidays( self, rows: Iterable[tuple] ):
+        """
+        从数据库加载节假日
+        :param rows: 数据行(date, kind, weekday)，kind为放假或补班，
+                     补班时weekday为按星期几上课，不能为空，校验失败的行不加载
+        """
+        self.offDays = set()
+        self.workDays = dict()
+        for row, values, errors in validateRows( "Holidays", rows ):
+            if values is None:
+                logger.warning( f"节假日加载失败, {'; '.join( str( error ) for error in errors )}" )
+                continue
+            dateString, kind, weekday = values
+            day = julianDay( dateString )
+            if kind == Holiday.CDAYOFF:
+                self.offDays.add( day )
+            else:
+                self.workDays[day] = Weekday.CWEEKDAYS.index( weekday )
+        logger.info( f"节假日加载完成, 放假{len( self.offDays )}天, 补班{len( self.workDays )}天" )
@@ -0,0 +1,255 @@
+"""iCalendar(RFC 5545)文件导出"""
+
+import hashlib
+import os
+import re
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from Model.holidays import HolidayCalendar
+from Model.recurrence import CourseRule, JulianOffset
+from Utils import logger
+
+LineOctets = 75  # 每行最多75个字节，超出时折行
+ProductId = "-//Timer//Timetable Export//ZH"
+InvalidFileChars = re.compile( r'[\\/:*?"<>|\s]+' )  # 文件名中不能使用的字符
+
+
+def escapeText( text: str ) -> str:
+    """转义TEXT类型的值"""
+    return (
+        text.replace( "\\", "\\\\" )
+        .replace( ";", "\\;" )
+        .replace( ",", "\\," )
+        .replace( "\r\n", "\\n" )
+        .replace( "\n", "\\n" )
+    )
+
+
+def foldLine( line: str ) -> str:
+    """按字节数折行，不拆分多字节字符，续行以一个空格开头"""
+    data = line.encode( "utf-8" )
+    if len( data ) <= LineOctets:
+        return line + "\r\n"
+    parts = list()
+    limit = LineOctets
+    part = ""
+    size = 0
+    for char in line:
+        length = len( char.encode( "utf-8" ) )
+        if size + length > limit:
+            parts.append( part )
+            part, size, limit = "", 0, LineOctets - 1  # 续行开头的空格占一个字节
+        part += char
+        size += length
+    parts.append( part )
+    return "\r\n ".join( parts ) + "\r\n"
+
+
+def formatDateTime( secs: int ) -> str:
+    """将时间戳转换为本地时间(不带时区)"""
+    return datetime.fromtimestamp( secs ).strftime( "%Y%m%dT%H%M%S" )
+
+
+def formatDate( day: int ) -> str:
+    """将儒略日转换为日期"""
+    return date.fromordinal( day - JulianOffset ).strftime( "%Y%m%d" )
+
+
+def safeFileName( name: str ) -> str:
+    """将班级名称转换为可以使用的文件名"""
+    return InvalidFileChars.sub( "_", name ).strip( "_" ) or "_"
+
+
+def exportFileNames( classNames: Iterable[str], outputDir: str, reserved: Iterable[str] = () ) -> dict[str, str]:
+    """
+    为每个班级分配导出文件名，转换后相同的名称依次加后缀 _2, _3, ...，
+    Windows的文件名不区分大小写，按小写比较
+    :param classNames: 班级名称
+    :param outputDir: 输出目录
+    :param reserved: 已被其他导出使用的文件名，例如本机的Timer.ics
+    :return: 班级名称 -> 文件路径
+    """
+    used = {name.lower() for name in reserved}
+    fileNames = dict()
+    for className in classNames:
+        stem = safeFileName( className )
+        fileName, suffix = f"{stem}.ics", 1
+        while fileName.lower() in used:
+            suffix += 1
+            fileName = f"{stem}_{suffix}.ics"
+        used.add( fileName.lower() )
+        fileNames[className] = os.path.join( outputDir, fileName )
+    return fileNames
+
+
+class IcsWriter:
+    """
+    逐个事件写入.ics文件，不在内存中保存事件列表
+    先写入临时文件，关闭时再替换目标文件
+    """
+
+    def __init__( self, fileName: str, name: str ):
+        """
+        :param fileName: 输出文件
+        :param name: 日历名称
+        """
+        self.fileName: str = fileName
+        self.name: str = name
+        self.count: int = 0  # 已写入的事件数
+        self.__file = None
+        self.__stamp: str = datetime.now( timezone.utc ).strftime( "%Y%m%dT%H%M%SZ" )
+
+    def __enter__( self ):
+        self.__file = open( self.fileName + ".tmp", "w", encoding = "utf-8", newline = "" )
+        for line in (
+                "BEGIN:VCALENDAR",
+                "VERSION:2.0",
+                f"PRODID:{ProductId}",
+                "CALSCALE:GREGORIAN",
+                f"X-WR-CALNAME:{escapeText( self.name )}",
+        ):
+            self.__file.write( foldLine( line ) )
+        return self
+
+    def __exit__( self, excType, excValue, traceback ):
+        self.__file.write( "END:VCALENDAR\r\n" )
+        self.__file.close()
+        if excType is None:
+            os.replace( self.fileName + ".tmp", self.fileName )
+        else:
+            os.remove( self.fileName + ".tmp" )
+        return False
+
+    def writeEvent( self, summary: str, start: str, end: str, description: str = "", allDay: bool = False ):
+        """
+        写入一个事件
+        :param summary: 标题
+        :param start: 开始时间，allDay为True时为日期
+        :param end: 结束时间，allDay为True时为结束日期的后一天
+        :param description: 说明
+        :param allDay: 是否为全天事件
+        """
+        uid = hashlib.sha1( f"{self.name}|{summary}|{start}".encode( "utf-8" ) ).hexdigest()
+        valueType = ";VALUE=DATE" if allDay else ""
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@timer",
+            f"DTSTAMP:{self.__stamp}",
+            f"DTSTART{valueType}:{start}",
+            f"DTEND{valueType}:{end}",
+            f"SUMMARY:{escapeText( summary )}",
+        ]
+        if len( description ) > 0:
+            lines.append( f"DESCRIPTION:{escapeText( description )}" )
+        lines.append( "END:VEVENT" )
+        self.__file.write( "".join( foldLine( line ) for line in lines ) )
+        self.count += 1
+
+
+def writeItems( writer: IcsWriter, items: Iterable ):
+    """
+    将作息项、课程项和倒数日项逐个写入日历
+    :param writer: 已打开的IcsWriter
+    :param items: DataSource.occurrences()生成的项
+    """
+    for item in items:
+        if hasattr( item, "subject" ):  # 课程
+            summary, description = item.subject, f"{item.weekday} {item.period}"
+        elif hasattr( item, "period" ):  # 作息
+            summary, description = item.period, ""
+        else:  # 倒数日
+            writer.writeEvent( item.text, formatDate( item.day ), formatDate( item.day + 1 ), allDay = True )
+            continue
+        writer.writeEvent( summary, formatDateTime( item.startSecs ), formatDateTime( item.endSecs ), description )
+
+
+def exportClass(
+        fileName: str,
+        className: str,
+        rows: list[tuple[int, int, int, str, str, tuple | None]],
+        holidays: tuple,
+        firstDay: int,
+        lastDay: int,
+) -> int:
+    """
+    导出一个班级的课程表，只使用可以在进程间传递的数据，可以在进程池中执行
+    :param fileName: 输出文件
+    :param className: 班级名称
+    :param rows: 课程 [(星期, 开始分钟, 结束分钟, 节次, 科目, 重复规则), ...]，时间为当天零点起的分钟数，
+                 按星期和开始时间排序；重复规则为CourseRule.key()的返回值，每周上课时为None
+    :param holidays: HolidayCalendar.snapshot()
+    :param firstDay: 开始日期(儒略日)
+    :param lastDay: 结束日期(儒略日，含)
+    :return: 写入的事件数
+    """
+    calendar = HolidayCalendar()
+    calendar.loadCompiled( holidays )
+    days = [list() for _ in range( 7 )]
+    for weekday, start, end, period, subject, rule in rows:
+        rule = CourseRule( weekday, *rule ) if rule is not None else None
+        days[weekday].append( (start, end, period, subject, rule) )
+
+    with IcsWriter( fileName, className ) as writer:
+        for day, weekday in calendar.scheduleDays( firstDay, lastDay - firstDay + 1 ):
+            midnight = datetime.combine( date.fromordinal( day - JulianOffset ), datetime.min.time() )
+            for start, end, period, subject, rule in days[weekday]:
+                if rule is not None and not rule.activeOn( day ):
+                    continue
+                writer.writeEvent(
+                    subject,
+                    (midnight + timedelta( minutes = start )).strftime( "%Y%m%dT%H%M%S" ),
+                    (midnight + timedelta( minutes = end )).strftime( "%Y%m%dT%H%M%S" ),
+                    f"{className} {period}",
+                )
+    return writer.count
+
+
+def exportClasses(
+        classes: dict[str, list[tuple[int, int, int, str, str, tuple | None]]],
+        holidays: tuple,
+        firstDay: int,
+        lastDay: int,
+        outputDir: str,
+        processes: int = None,
+        reserved: Iterable[str] = (),
+) -> list[str]:
+    """
+    每个班级导出一个文件，班级较多时使用进程池并行导出，导出失败的班级记录日志并跳过
+    :param classes: 班级名称 -> 课程，格式同exportClass的rows
+    :param holidays: HolidayCalendar.snapshot()
+    :param firstDay: 开始日期(儒略日)
+    :param lastDay: 结束日期(儒略日，含)
+    :param outputDir: 输出目录
+    :param processes: 进程数，默认为CPU核心数
+    :param reserved: 输出目录中已被其他导出使用的文件名，班级的文件不覆盖这些文件
+    :return: 导出的文件列表
+    """
+    fileNames = exportFileNames( classes, outputDir, reserved )
+    exported = list()
+    if len( classes ) <= 1:
+        for className, rows in classes.items():
+            try:
+                count = exportClass( fileNames[className], className, rows, holidays, firstDay, lastDay )
+                exported.append( fileNames[className] )
+                logger.info( f"导出{className}课程表: {count}节课" )
+            except (OSError, ValueError) as e:
+                logger.error( f"导出{className}课程表失败: {e}" )
+        return exported
+
+    with ProcessPoolExecutor( max_workers = processes ) as executor:
+        futures = {
+            className: executor.submit(
+                exportClass, fileNames[className], className, rows, holidays, firstDay, lastDay,
+            )
+            for className, rows in classes.items()
+        }
+        for className, future in futures.items():
+            try:
+                count = future.result()
+                exported.append( fileNames[className] )
+                logger.info( f"导出{className}课程表: {count}节课" )
+            except (OSError, ValueError) as e:
+                logger.error( f"导出{className}课程表失败: {e}" )
+    return exported
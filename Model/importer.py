@@ -0,0 +1,283 @@
+"""从CSV和iCalendar(.ics)文件批量导入作息表和课程表，多班级课程表和节假日只能从CSV文件导入"""
+
+import csv
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+
+from PySide6.QtSql import QSqlDatabase, QSqlQuery
+
+from Model.dataModel import importHolidays
+from Model.Norm import validateRow, Weekday
+from Model.repository import Repository
+from Utils import logger, Paths
+
+BatchSize = 500  # 每次批量插入的行数
+
+# 可以导入的表及其列，CSV文件没有表头时按此顺序读取
+ImportColumns = {
+    "DailySchedule": ["start_time", "end_time", "period", "weekday"],
+    "CourseSchedule": ["weekday", "period", "course", "weeks", "start_date", "end_date", "except_dates"],
+    "ClassSchedule": [
+        "class_name", "weekday", "period", "course", "weeks", "start_date", "end_date", "except_dates",
+    ],
+    "Holidays": ["date", "kind", "weekday", "description"],
+}
+IcsTables = ("DailySchedule", "CourseSchedule")  # 可以从.ics文件导入的表
+
+
+class ImportReport:
+    """导入结果，记录每一行的错误"""
+
+    def __init__( self, tableName: str, fileName: str ):
+        self.tableName: str = tableName
+        self.fileName: str = fileName
+        self.imported: int = 0  # 导入的行数
+        self.errors: list[tuple[int, str, str]] = list()  # (行号, 错误信息, 原始内容)
+        self.failed: str = ""  # 整体失败(例如事务失败)的原因
+
+    def addError( self, line: int, message: str, content: str = "" ):
+        """记录一行错误"""
+        self.errors.append( (line, message, content) )
+
+    @property
+    def ok( self ) -> bool:
+        """是否导入成功(可能有部分行被跳过)"""
+        return len( self.failed ) == 0
+
+    def summary( self ) -> str:
+        """获取结果摘要"""
+        if not self.ok:
+            return f"导入失败: {self.failed}"
+        return f"导入{self.imported}行, 跳过{len( self.errors )}行"
+
+    def save( self, outputDir: str = None ) -> str | None:
+        """
+        将错误报告保存为CSV文件
+        :param outputDir: 输出目录，默认为Paths.OutputDir
+        :return: 报告文件，没有错误时返回None
+        """
+        if len( self.errors ) == 0:
+            return None
+        outputDir = outputDir if outputDir is not None else Paths.OutputDir
+        reportFile = os.path.join( outputDir, f"导入错误_{self.tableName}.csv" )
+        try:
+            with open( reportFile, "w", encoding = "utf-8-sig", newline = "" ) as file:
+                writer = csv.writer( file )
+                writer.writerow( ["行号", "错误", "内容"] )
+                writer.writerows( self.errors )
+        except OSError as e:
+            logger.error( f"保存导入错误报告失败: {e}" )
+            return None
+        return reportFile
+
+
+def csvRows( fileName: str, columns: list[str] ) -> Iterator[tuple[int, dict[str, str], str]]:
+    """
+    逐行读取CSV文件，第一行的所有单元格都是列名时作为表头，否则按columns的顺序读取
+    :return: (行号, 列名 -> 值, 原始内容)
+    """
+    with open( fileName, encoding = "utf-8-sig", newline = "" ) as file:
+        names = columns
+        for line, cells in enumerate( csv.reader( file ), 1 ):
+            cells = [cell.strip() for cell in cells]
+            if line == 1 and len( cells ) > 0 and all( cell in columns for cell in cells ):
+                names = cells
+                continue
+            if not any( cells ):  # 空行
+                continue
+            yield line, dict( zip( names, cells ) ), ",".join( cells )
+
+
+def unescapeText( text: str ) -> str:
+    """还原TEXT类型值中的转义字符"""
+    return (
+        text.replace( "\\n", "\n" )
+        .replace( "\\N", "\n" )
+        .replace( "\\;", ";" )
+        .replace( "\\,", "," )
+        .replace( "\\\\", "\\" )
+    )
+
+
+def parseIcsDateTime( value: str ) -> datetime | None:
+    """解析DATE-TIME值，UTC时间转换为本地时间，DATE值(全天事件)返回None"""
+    if "T" not in value:
+        return None
+    if value.endswith( "Z" ):
+        return datetime.strptime( value, "%Y%m%dT%H%M%SZ" ).replace( tzinfo = timezone.utc ).astimezone().replace(
+            tzinfo = None,
+        )
+    return datetime.strptime( value, "%Y%m%dT%H%M%S" )
+
+
+def icsEvents( fileName: str ) -> Iterator[tuple[int, dict[str, str]]]:
+    """
+    逐个读取.ics文件中的VEVENT，处理折行，忽略属性参数
+    :return: (VEVENT开始的行号, 属性名 -> 值)
+    """
+    with open( fileName, encoding = "utf-8-sig", newline = "" ) as file:
+        event: dict[str, str] | None = None
+        eventLine = 0
+        logical = ""
+        logicalLine = 0
+        for line, raw in enumerate( file, 1 ):
+            raw = raw.rstrip( "\r\n" )
+            if raw.startswith( (" ", "\t") ):  # 续行
+                logical += raw[1:]
+                continue
+            if len( logical ) > 0:
+                name, _, value = logical.partition( ":" )
+                name = name.split( ";" )[0].upper()
+                if name == "BEGIN" and value == "VEVENT":
+                    event, eventLine = dict(), logicalLine
+                elif name == "END" and value == "VEVENT" and event is not None:
+                    yield eventLine, event
+                    event = None
+                elif event is not None:
+                    event[name] = value
+            logical, logicalLine = raw, line
+        if logical.upper() == "END:VEVENT" and event is not None:
+            yield eventLine, event
+
+
+def icsRows( fileName: str, tableName: str, report: ImportReport ) -> Iterator[tuple[int, dict[str, str], str]]:
+    """
+    将.ics文件中的事件转换为表的数据行，每周重复的事件只保留一行
+    作息表: SUMMARY为时间段；课程表: SUMMARY为课程名称，DESCRIPTION的最后一项为时间段
+    """
+    seen = set()
+    for line, event in icsEvents( fileName ):
+        summary = unescapeText( event.get( "SUMMARY", "" ) ).strip()
+        content = f"{event.get( 'DTSTART', '' )} {summary}"
+        try:
+            start = parseIcsDateTime( event.get( "DTSTART", "" ) )
+            end = parseIcsDateTime( event.get( "DTEND", "" ) )
+        except ValueError:
+            report.addError( line, "时间格式错误", content )
+            continue
+        if start is None or end is None:
+            report.addError( line, "全天事件不能导入", content )
+            continue
+        if tableName == "DailySchedule":
+            values = {
+                "start_time": start.strftime( "%H:%M" ),
+                "end_time": end.strftime( "%H:%M" ),
+                "period": summary,
+            }
+        else:
+            description = unescapeText( event.get( "DESCRIPTION", "" ) ).split()
+            values = {
+                "weekday": Weekday.CWEEKDAYS[start.weekday()],
+                "period": description[-1] if len( description ) > 0 else "",
+                "course": summary,
+            }
+        key = tuple( values.values() )
+        if key not in seen:
+            seen.add( key )
+            yield line, values, content
+
+
+def importFile( db: QSqlDatabase, tableName: str, fileName: str, replace: bool = False ) -> ImportReport:
+    """
+    从CSV或.ics文件批量导入数据，逐行读取和校验，在一个事务中分批插入
+    格式错误的行不导入，记录在返回的报告中；与已有课程的星期、时间段和上课周相同时替换已有课程
+    :param db: 数据库连接对象
+    :param tableName: 表名，ImportColumns中的表
+    :param fileName: CSV或.ics文件
+    :param replace: 是否先清空表中原有数据，节假日为删除文件中各年份的原有记录
+    """
+    report = ImportReport( tableName, fileName )
+    if db is None or tableName not in ImportColumns:
+        report.failed = f"不支持导入的表: {tableName}"
+        return report
+    if fileName.lower().endswith( ".ics" ) and tableName not in IcsTables:
+        report.failed = f"{tableName}只能从CSV文件导入"
+        return report
+    if tableName == "Holidays":
+        return importHolidayFile( db, fileName, replace, report )
+    columns = ImportColumns[tableName]
+    if fileName.lower().endswith( ".ics" ):
+        rows = icsRows( fileName, tableName, report )
+    else:
+        rows = csvRows( fileName, columns )
+
+    if not db.transaction():
+        report.failed = f"开始事务失败: {db.lastError().text()}"
+        return report
+    query = QSqlQuery( db )
+    try:
+        if replace and not query.exec( f"DELETE FROM {tableName}" ):
+            raise RuntimeError( query.lastError().text() )
+        if not query.prepare(
+                f"INSERT OR REPLACE INTO {tableName} ({', '.join( columns )}) VALUES ({', '.join( '?' * len( columns ) )})",
+        ):
+            raise RuntimeError( query.lastError().text() )
+
+        batch: list[tuple] = list()
+        for line, values, content in rows:
+            values, errors = validateRow( tableName, values, line )
+            if values is None:
+                report.addError( line, "; ".join( f"{error.column}: {error.message}" for error in errors ), content )
+                continue
+            batch.append( values )
+            if len( batch ) >= BatchSize:
+                insertBatch( query, batch )
+                report.imported += len( batch )
+                batch.clear()
+        if len( batch ) > 0:
+            insertBatch( query, batch )
+            report.imported += len( batch )
+
+        if not db.commit():
+            raise RuntimeError( db.lastError().text() )
+        Repository.invalidate( tableName )
+    except (OSError, UnicodeDecodeError, csv.Error, RuntimeError) as e:
+        db.rollback()
+        report.failed = str( e )
+        report.imported = 0
+        logger.error( f"导入{fileName}失败: {e}" )
+        return report
+
+    logger.info( f"导入{fileName}到{tableName}: {report.summary()}" )
+    return report
+
+
+def importHolidayFile( db: QSqlDatabase, fileName: str, replace: bool, report: ImportReport ) -> ImportReport:
+    """
+    从CSV文件导入节假日，一年的安排只有几十行，先读取和校验全部行，再由importHolidays()在一个事务中写入
+    :param db: 数据库连接对象
+    :param fileName: CSV文件
+    :param replace: 是否先删除文件中各年份的原有记录，例如用新公布的安排替换一整年的节假日
+    :param report: 导入结果
+    """
+    columns = ImportColumns["Holidays"]
+    rows = list()
+    try:
+        for line, values, content in csvRows( fileName, columns ):
+            checked, errors = validateRow( "Holidays", values, line )
+            if checked is None:
+                report.addError( line, "; ".join( f"{error.column}: {error.message}" for error in errors ), content )
+                continue
+            rows.append( checked + (values.get( "description" ) or "",) )
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        report.failed = str( e )
+        logger.error( f"导入{fileName}失败: {e}" )
+        return report
+
+    years = sorted( {int( row[0][:4] ) for row in rows} ) if replace else ()
+    count = importHolidays( db, rows, years )
+    if count < 0:
+        report.failed = "写入数据库失败"
+        return report
+    report.imported = count
+    logger.info( f"导入{fileName}到Holidays: {report.summary()}" )
+    return report
+
+
+def insertBatch( query: QSqlQuery, batch: list[tuple] ):
+    """使用预处理语句批量插入数据行"""
+    for column in zip( *batch ):
+        query.addBindValue( list( column ) )
+    if not query.execBatch():
+        raise RuntimeError( query.lastError().text() )
@@ -0,0 +1,352 @@
+"""数据库结构迁移: 按PRAGMA user_version记录的版本依次升级，程序启动时执行一次"""
+
+from collections.abc import Callable
+
+from PySide6.QtSql import QSqlDatabase, QSqlQuery
+
+from Model.connection import Connections
+from Model.Norm.Validate import dateCell, optionalDateCell, timeCell
+from Utils import logger
+
+# 版本1: 以前由配置窗口创建的表，包括后来添加的列
+BaseTables = {
+    "DailySchedule": ["start_time TEXT", "end_time TEXT", "period TEXT", "weekday TEXT"],
+    "CourseSchedule": [
+        "weekday TEXT",
+        "period TEXT",
+        "course TEXT",
+        "weeks TEXT",
+        "start_date TEXT",
+        "end_date TEXT",
+        "except_dates TEXT",
+    ],
+    "params": ["key TEXT", "value TEXT"],
+    "Countdown": ["dateAndtime TEXT", "description TEXT"],
+    "Holidays": ["date TEXT", "kind TEXT", "weekday TEXT", "description TEXT"],
+}
+
+# 版本2: 规范化为 hh:mm / yyyy-MM-dd 的列，格式错误的值保持不变
+NormalizedColumns = {
+    "DailySchedule": [("start_time", timeCell), ("end_time", timeCell)],
+    "CourseSchedule": [("start_date", optionalDateCell), ("end_date", optionalDateCell)],
+    "Countdown": [("dateAndtime", dateCell)],
+    "Holidays": [("date", dateCell)],
+}
+
+# 唯一约束中的上课周，空和"每周"都表示每周上课，视为同一个值
+LessonWeeks = "CASE WHEN trim(ifnull(weeks, '')) IN ('', '每周') THEN '' ELSE weeks END"
+LessonCondition = "ifnull(weekday, '') <> '' AND ifnull(period, '') <> ''"
+
+
+def minuteExpression( column: str ) -> str:
+    """将 h:mm 格式的列转换为当天零点起分钟数的SQL表达式，格式错误时为NULL"""
+    text = f"trim({column})"
+    colon = f"instr({text}, ':')"
+    return (
+        f"CASE WHEN {colon} > 1 THEN "
+        f"CAST(substr({text}, 1, {colon} - 1) AS INTEGER) * 60 + CAST(substr({text}, {colon} + 1) AS INTEGER) "
+        f"END"
+    )
+
+
+def execute( query: QSqlQuery, sql: str ):
+    """执行一条语句，失败时抛出RuntimeError"""
+    if not query.exec( sql ):
+        raise RuntimeError( f"{sql}: {query.lastError().text()}" )
+
+
+def scalar( query: QSqlQuery, sql: str ) -> int:
+    """执行查询并返回第一行第一列的整数"""
+    execute( query, sql )
+    value = int( query.value( 0 ) ) if query.next() else 0
+    query.finish()
+    return value
+
+
+def tableColumns( db: QSqlDatabase, tableName: str ) -> list[str]:
+    """获取表的列名，表不存在时为空"""
+    record = db.record( tableName )
+    return [record.fieldName( i ) for i in range( record.count() )]
+
+
+def createBaseTables( db: QSqlDatabase, query: QSqlQuery ):
+    """版本1: 创建缺少的表，为旧数据库添加缺少的列"""
+    for tableName, columns in BaseTables.items():
+        execute( query, f"CREATE TABLE IF NOT EXISTS {tableName} ({', '.join( columns )})" )
+        existing = tableColumns( db, tableName )
+        for column in columns:
+            if column.split()[0] not in existing:
+                logger.info( f"添加列: {tableName}.{column}" )
+                execute( query, f"ALTER TABLE {tableName} ADD COLUMN {column}" )
+
+
+def normalizeColumn( query: QSqlQuery, tableName: str, column: str, check: Callable[[str], str] ):
+    """将一列中格式正确但不规范的值(例如 8:00)改为规范格式"""
+    execute( query, f"SELECT rowid, {column} FROM {tableName}" )
+    rowids, values = list(), list()
+    while query.next():
+        value = "" if query.isNull( 1 ) else str( query.value( 1 ) )
+        try:
+            normalized = check( value )
+        except ValueError:
+            continue
+        if normalized != value:
+            rowids.append( query.value( 0 ) )
+            values.append( normalized )
+    query.finish()
+    if len( rowids ) == 0:
+        return
+    if not query.prepare( f"UPDATE {tableName} SET {column} = ? WHERE rowid = ?" ):
+        raise RuntimeError( query.lastError().text() )
+    query.addBindValue( values )
+    query.addBindValue( rowids )
+    if not query.execBatch():
+        raise RuntimeError( query.lastError().text() )
+    logger.info( f"规范化{tableName}.{column}: {len( rowids )}行" )
+
+
+def rebuildTable(
+        query: QSqlQuery,
+        tableName: str,
+        definition: list[str],
+        columns: list[str],
+        keys: list[str] = None,
+        required: list[str] = None,
+):
+    """
+    按新的定义重建表并复制数据(SQLite不能为已有的表添加主键)，NULL复制为空字符串
+    :param query: 查询对象
+    :param tableName: 表名
+    :param definition: 新表的列定义
+    :param columns: 从旧表复制的列
+    :param keys: 唯一约束的列，重复的行只保留最早插入的一行
+    :param required: 唯一约束只对这些列都不为空的行有效，默认为keys
+    """
+    newTable = f"{tableName}_new"
+    execute( query, f"DROP TABLE IF EXISTS {newTable}" )
+    execute( query, f"CREATE TABLE {newTable} ({', '.join( definition )})" )
+    where = ""
+    if keys is not None:
+        keyed = " AND ".join( f"ifnull({key}, '') <> ''" for key in (required if required is not None else keys) )
+        groups = ", ".join( f"ifnull({key}, '')" for key in keys )
+        where = (
+            f" WHERE NOT ({keyed})"
+            f" OR rowid IN (SELECT min(rowid) FROM {tableName} WHERE {keyed} GROUP BY {groups})"
+        )
+    values = ", ".join( f"ifnull({column}, '')" for column in columns )
+    execute(
+        query,
+        f"INSERT INTO {newTable} ({', '.join( columns )}) SELECT {values} FROM {tableName}{where} ORDER BY rowid",
+    )
+    dropped = scalar( query, f"SELECT count(*) FROM {tableName}" ) - scalar( query, f"SELECT count(*) FROM {newTable}" )
+    if dropped > 0:
+        logger.warning( f"{tableName}表中有{dropped}行重复数据，只保留最早添加的一行" )
+    execute( query, f"DROP TABLE {tableName}" )
+    execute( query, f"ALTER TABLE {newTable} RENAME TO {tableName}" )
+
+
+def addKeysAndIndexes( db: QSqlDatabase, query: QSqlQuery ):
+    """
+    版本2: 添加主键、唯一约束、查询用的索引和整数分钟列
+    原有列的顺序不变(表格窗口按序号访问列)，主键id放在最后；
+    同一节课可以有单双周两门课程，唯一约束为 (weekday, period, LessonWeeks)，
+    空和"每周"统一保存为空，同一节课同时有空和"每周"两行时只保留最早添加的一行；
+    新添加的空行(星期或时间段为空)不受唯一约束限制
+    """
+    for tableName, checks in NormalizedColumns.items():
+        for column, check in checks:
+            normalizeColumn( query, tableName, column, check )
+
+    rebuildTable(
+        query,
+        "DailySchedule",
+        [
+            "start_time TEXT DEFAULT ''",
+            "end_time TEXT DEFAULT ''",
+            "period TEXT DEFAULT ''",
+            "weekday TEXT DEFAULT ''",
+            "id INTEGER PRIMARY KEY",
+            "start_minute INTEGER",  # 由触发器根据start_time计算
+            "end_minute INTEGER",
+        ],
+        ["start_time", "end_time", "period", "weekday"],
+    )
+    minutes = f"start_minute = {minuteExpression( 'NEW.start_time' )}, end_minute = {minuteExpression( 'NEW.end_time' )}"
+    execute(
+        query,
+        "CREATE TRIGGER IF NOT EXISTS trg_DailySchedule_insert AFTER INSERT ON DailySchedule "
+        f"BEGIN UPDATE DailySchedule SET {minutes} WHERE id = NEW.id; END",
+    )
+    execute(
+        query,
+        "CREATE TRIGGER IF NOT EXISTS trg_DailySchedule_update AFTER UPDATE OF start_time, end_time ON DailySchedule "
+        f"BEGIN UPDATE DailySchedule SET {minutes} WHERE id = NEW.id; END",
+    )
+    execute(
+        query,
+        f"UPDATE DailySchedule SET start_minute = {minuteExpression( 'start_time' )}, "
+        f"end_minute = {minuteExpression( 'end_time' )}",
+    )
+    execute( query, "CREATE INDEX IF NOT EXISTS idx_DailySchedule_weekday ON DailySchedule (weekday, start_minute)" )
+
+    rebuildTable(
+        query,
+        "CourseSchedule",
+        [
+            "weekday TEXT DEFAULT ''",
+            "period TEXT DEFAULT ''",
+            "course TEXT DEFAULT ''",
+            "weeks TEXT DEFAULT ''",
+            "start_date TEXT DEFAULT ''",
+            "end_date TEXT DEFAULT ''",
+            "except_dates TEXT DEFAULT ''",
+            "id INTEGER PRIMARY KEY",
+        ],
+        ["weekday", "period", "course", "weeks", "start_date", "end_date", "except_dates"],
+    )
+    execute(
+        query,
+        f"DELETE FROM CourseSchedule WHERE {LessonCondition} AND rowid NOT IN "
+        f"(SELECT min(rowid) FROM CourseSchedule WHERE {LessonCondition} GROUP BY weekday, period, {LessonWeeks})",
+    )
+    if query.numRowsAffected() > 0:
+        logger.warning( f"CourseSchedule表中有{query.numRowsAffected()}行重复数据，只保留最早添加的一行" )
+    execute( query, "UPDATE CourseSchedule SET weeks = '' WHERE weeks <> '' AND trim(weeks) IN ('', '每周')" )
+    execute(
+        query,
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_CourseSchedule_lesson ON CourseSchedule (weekday, period, {LessonWeeks}) "
+        f"WHERE {LessonCondition}",
+    )
+    # 部分索引只能用于包含相同条件的查询，按星期和时间段查找使用普通索引
+    execute( query, "CREATE INDEX IF NOT EXISTS idx_CourseSchedule_weekday ON CourseSchedule (weekday, period)" )
+
+    rebuildTable(
+        query,
+        "params",
+        ["key TEXT DEFAULT ''", "value TEXT DEFAULT ''", "id INTEGER PRIMARY KEY"],
+        ["key", "value"],
+        ["key"],
+    )
+    execute( query, "CREATE UNIQUE INDEX IF NOT EXISTS idx_params_key ON params (key) WHERE ifnull(key, '') <> ''" )
+
+    rebuildTable(
+        query,
+        "Countdown",
+        ["dateAndtime TEXT DEFAULT ''", "description TEXT DEFAULT ''", "id INTEGER PRIMARY KEY"],
+        ["dateAndtime", "description"],
+    )
+    execute( query, "CREATE INDEX IF NOT EXISTS idx_Countdown_dateAndtime ON Countdown (dateAndtime)" )
+
+    rebuildTable(
+        query,
+        "Holidays",
+        [
+            "date TEXT DEFAULT ''",
+            "kind TEXT DEFAULT ''",
+            "weekday TEXT DEFAULT ''",
+            "description TEXT DEFAULT ''",
+            "id INTEGER PRIMARY KEY",
+        ],
+        ["date", "kind", "weekday", "description"],
+        ["date"],
+    )
+    execute( query, "CREATE UNIQUE INDEX IF NOT EXISTS idx_Holidays_date ON Holidays (date) WHERE ifnull(date, '') <> ''" )
+
+
+def addClassSchedule( db: QSqlDatabase, query: QSqlQuery ):
+    """
+    版本3: 多班级(或教师)课程表，列与CourseSchedule相同，前面加班级名称；
+    节次的时间来自本机作息表，同一班级同一节课的唯一约束与CourseSchedule相同
+    """
+    execute(
+        query,
+        "CREATE TABLE IF NOT EXISTS ClassSchedule ("
+        "class_name TEXT DEFAULT '', "
+        "weekday TEXT DEFAULT '', "
+        "period TEXT DEFAULT '', "
+        "course TEXT DEFAULT '', "
+        "weeks TEXT DEFAULT '', "
+        "start_date TEXT DEFAULT '', "
+        "end_date TEXT DEFAULT '', "
+        "except_dates TEXT DEFAULT '', "
+        "id INTEGER PRIMARY KEY)",
+    )
+    execute(
+        query,
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_ClassSchedule_lesson "
+        f"ON ClassSchedule (class_name, weekday, period, {LessonWeeks}) "
+        f"WHERE ifnull(class_name, '') <> '' AND {LessonCondition}",
+    )
+
+
+# 按版本顺序排列的迁移，第i项将数据库从版本i升级到版本i+1；只能在末尾添加，不能修改已发布的迁移
+Migrations: list[tuple[str, Callable[[QSqlDatabase, QSqlQuery], None]]] = [
+    ("创建基础表", createBaseTables),
+    ("添加主键、唯一约束和索引", addKeysAndIndexes),
+    ("添加多班级课程表", addClassSchedule),
+]
+SchemaVersion = len( Migrations )  # 当前程序使用的数据库版本
+
+
+def schemaVersion( db: QSqlDatabase ) -> int:
+    """获取数据库的版本(PRAGMA user_version)，新数据库为0"""
+    return scalar( QSqlQuery( db ), "PRAGMA user_version" )
+
+
+def migrateDatabase( db: QSqlDatabase ) -> bool:
+    """
+    将数据库升级到SchemaVersion，每个版本在一个事务中执行并更新user_version，
+    某个版本失败时回滚该版本并停止，数据库保持在上一个版本
+    :param db: 数据库连接对象
+    :return: 数据库是否为当前版本(或更新的版本)
+    """
+    if db is None:
+        return False
+    try:
+        version = schemaVersion( db )
+    except RuntimeError as e:
+        logger.error( f"读取数据库版本失败: {e}" )
+        return False
+    if version > SchemaVersion:
+        logger.warning( f"数据库版本{version}高于程序支持的版本{SchemaVersion}，不做修改" )
+        return True
+    for target in range( version + 1, SchemaVersion + 1 ):
+        description, migration = Migrations[target - 1]
+        if not db.transaction():
+            logger.error( f"开始事务失败: {db.lastError().text()}" )
+            return False
+        query = QSqlQuery( db )
+        try:
+            migration( db, query )
+            execute( query, f"PRAGMA user_version = {target}" )
+            query.finish()
+            if not db.commit():
+                raise RuntimeError( db.lastError().text() )
+        except RuntimeError as e:
+            query.finish()
+            db.rollback()
+            logger.error( f"数据库升级到版本{target}({description})失败: {e}" )
+            return False
+        logger.info( f"数据库升级到版本{target}: {description}" )
+    return True
+
+
+def upgradeDatabase( databaseFile: str = None ) -> bool:
+    """
+    打开数据库并升级到当前版本，在程序启动时、其他窗口和后台线程使用数据库之前调用一次
+    :param databaseFile: 数据库文件，默认为Paths.DatabaseFile
+    :return: 数据库是否为当前版本
+    """
+    db = Connections.acquire( databaseFile )
+    try:
+        if Connections.readOnly:  # 只读模式下不能修改，只检查版本
+            version = schemaVersion( db ) if db is not None else 0
+            if version < SchemaVersion:
+                logger.warning( f"只读模式: 数据库版本{version}低于{SchemaVersion}，需要由可写的实例升级" )
+            return version >= SchemaVersion
+        return migrateDatabase( db )
+    except RuntimeError as e:
+        logger.error( f"读取数据库版本失败: {e}" )
+        return False
+    finally:
+        Connections.release( db )
@@ -0,0 +1,147 @@
+"""课程重复规则"""
+
+from collections.abc import Iterator
+from datetime import date
+
+JulianOffset = 1721425  # 儒略日与datetime.date.toordinal()之差
+WeekDays = 7
+
+
+def weekStartDay( day: int ) -> int:
+    """获取儒略日所在周的周一(儒略日对7取余, 0为周一)"""
+    return day - day % WeekDays
+
+
+def isoWeekNumber( day: int ) -> int:
+    """获取儒略日对应的ISO周数"""
+    return date.fromordinal( day - JulianOffset ).isocalendar()[1]
+
+
+class CourseRule:
+    """
+    课程重复规则，日期均为儒略日(整数)
+    支持每周或隔周(单双周)重复、起止日期和单次停课日期
+    下一次上课日期通过整数运算得到，不需要逐周展开
+    """
+
+    __slots__ = ("weekday", "interval", "anchor", "phase", "startDay", "endDay", "exceptions")
+
+    def __init__(
+            self,
+            weekday: int,
+            interval: int = 1,
+            anchor: int = None,
+            phase: int = 1,
+            startDay: int = None,
+            endDay: int = None,
+            exceptions: frozenset[int] = frozenset(),
+    ):
+        """
+        :param weekday: 星期序号，0为星期一
+        :param interval: 重复间隔(周)，1为每周，2为隔周
+        :param anchor: 隔周重复时上课的某一周中任意一天；为None时按ISO周数计算
+        :param phase: anchor为None时，ISO周数除以interval的余数为phase的周上课(1为单周，0为双周)
+        :param startDay: 开始日期(含)，None表示不限
+        :param endDay: 结束日期(含)，None表示不限
+        :param exceptions: 停课日期
+        """
+        self.weekday: int = weekday
+        self.interval: int = max( interval, 1 )
+        self.anchor: int | None = weekStartDay( anchor ) if anchor is not None else None
+        self.phase: int = phase % self.interval
+        self.startDay: int | None = startDay
+        self.endDay: int | None = endDay
+        self.exceptions: frozenset[int] = frozenset( exceptions )
+
+    def __weekMatches( self, day: int ) -> bool:
+        """检查日期所在周是否为上课周"""
+        if self.interval == 1:
+            return True
+        if self.anchor is None:
+            return isoWeekNumber( day ) % self.interval == self.phase
+        return (weekStartDay( day ) - self.anchor) // WeekDays % self.interval == 0
+
+    def occursOn( self, day: int ) -> bool:
+        """检查指定日期是否上课"""
+        return day % WeekDays == self.weekday and self.activeOn( day )
+
+    def activeOn( self, day: int ) -> bool:
+        """检查规则在指定日期是否有效(不检查星期)，用于补班日按其他星期上课"""
+        if self.startDay is not None and day < self.startDay:
+            return False
+        if self.endDay is not None and day > self.endDay:
+            return False
+        if day in self.exceptions:
+            return False
+        return self.__weekMatches( day )
+
+    def __candidate( self, day: int ) -> int:
+        """获取不早于指定日期、星期和单双周都符合的第一天(不考虑停课和结束日期)"""
+        if self.startDay is not None and day < self.startDay:
+            day = self.startDay
+        day += (self.weekday - day % WeekDays) % WeekDays
+        if not self.__weekMatches( day ):
+            day += WeekDays  # interval为2时，下一周一定是上课周
+            if not self.__weekMatches( day ):  # ISO周数跨年时可能连续两个单周或双周
+                day += WeekDays
+        return day
+
+    def nextOnOrAfter( self, day: int ) -> int | None:
+        """获取不早于指定日期的下一次上课日期，没有时返回None"""
+        day = self.__candidate( day )
+        while day in self.exceptions:
+            day = self.__candidate( day + 1 )
+        if self.endDay is not None and day > self.endDay:
+            return None
+        return day
+
+    def occurrences( self, startDay: int, endDay: int = None ) -> Iterator[int]:
+        """
+        按时间顺序逐个生成上课日期
+        :param startDay: 开始日期(含)
+        :param endDay: 结束日期(含)，None表示直到规则结束
+        """
+        day = self.nextOnOrAfter( startDay )
+        while day is not None and (endDay is None or day <= endDay):
+            yield day
+            day = self.nextOnOrAfter( day + 1 )
+
+    def key( self ) -> tuple:
+        """规则内容，用于比较和保存"""
+        return (
+            self.interval,
+            self.anchor,
+            self.phase,
+            self.startDay,
+            self.endDay,
+            tuple( sorted( self.exceptions ) ),
+        )
+
+    def __eq__( self, other ):
+        """星期和规则内容相同时相等"""
+        if not isinstance( other, CourseRule ):
+            return NotImplemented
+        return self.weekday == other.weekday and self.key() == other.key()
+
+    def __hash__( self ):
+        return hash( (self.weekday, self.interval, self.anchor, self.phase, self.startDay, self.endDay, self.exceptions) )
+
+
+def rulesMayCoincide( first: CourseRule | None, second: CourseRule | None ) -> bool:
+    """
+    两个规则是否可能在同一天上课(不考虑星期和停课日期)，None表示每周上课、不限日期
+    起止日期不相交，或者隔周重复但上课周不同(单周和双周)时不会在同一天上课；不能确定时返回True
+    """
+    if first is None or second is None:
+        return True
+    starts = [day for day in (first.startDay, second.startDay) if day is not None]
+    ends = [day for day in (first.endDay, second.endDay) if day is not None]
+    if len( starts ) > 0 and len( ends ) > 0 and max( starts ) > min( ends ):
+        return False
+    if first.interval != second.interval or first.interval == 1:
+        return True
+    if first.anchor is None and second.anchor is None:
+        return first.phase == second.phase
+    if first.anchor is not None and second.anchor is not None:
+        return (first.anchor - second.anchor) // WeekDays % first.interval == 0
+    return True
@@ -0,0 +1,96 @@
+"""数据表仓库: 缓存各表的数据行，显示窗口、课程表窗口和配置窗口共用，写入时使缓存失效"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+CacheSize = 16  # 缓存的表快照数
+
+
+class TableRepository:
+    """
+    以表为单位缓存数据行(只读元组)，按最近使用淘汰
+    写入数据库的函数(导入、保存课程、保存配置)提交后调用invalidate()，只使写入的表失效；
+    其他进程的修改由DataSource检查PRAGMA data_version发现后调用invalidateAll()，
+    窗口打开时也通过observe()检查自己的连接，不使用DataSource发现修改之前的旧数据
+    读取数据库时不持有锁，读取期间表被写入时不缓存读取到的旧数据
+    """
+
+    def __init__( self, capacity: int = CacheSize ):
+        """
+        :param capacity: 缓存的表快照数
+        """
+        self.capacity: int = capacity
+        self.hits: int = 0  # 命中次数
+        self.misses: int = 0  # 未命中次数
+        self.__lock = threading.Lock()
+        self.__entries: OrderedDict[tuple[str, str], tuple[tuple, ...]] = OrderedDict()  # (数据库文件, 表名) -> 数据行
+        self.__versions: dict[str, int] = dict()  # 表名 -> 失效次数
+        self.__generation: int = 0  # invalidateAll()的次数
+        self.__observed: dict[tuple, int] = dict()  # 连接 -> 上次检查时的PRAGMA data_version
+
+    def __version( self, tableName: str ) -> tuple[int, int]:
+        """表的当前版本，需要持有锁"""
+        return self.__generation, self.__versions.get( tableName, 0 )
+
+    def rows( self, databaseName: str, tableName: str, load: Callable[[], Iterable[tuple]] ) -> tuple[tuple, ...]:
+        """
+        获取表的全部数据行，未缓存时调用load读取并缓存
+        :param databaseName: 数据库文件
+        :param tableName: 表名
+        :param load: 从数据库读取数据行的函数
+        :return: 数据行，不要修改
+        """
+        key = (databaseName, tableName)
+        with self.__lock:
+            rows = self.__entries.get( key )
+            if rows is not None:
+                self.__entries.move_to_end( key )
+                self.hits += 1
+                return rows
+            self.misses += 1
+            version = self.__version( tableName )
+        rows = tuple( load() )
+        with self.__lock:
+            if self.__version( tableName ) == version:
+                self.__entries[key] = rows
+                self.__entries.move_to_end( key )
+                if len( self.__entries ) > self.capacity:
+                    self.__entries.popitem( last = False )
+        return rows
+
+    def invalidate( self, *tableNames: str ):
+        """写入表后使其缓存失效(所有数据库文件)"""
+        with self.__lock:
+            for tableName in tableNames:
+                self.__versions[tableName] = self.__versions.get( tableName, 0 ) + 1
+            for key in [key for key in self.__entries if key[1] in tableNames]:
+                del self.__entries[key]
+
+    def invalidateAll( self ):
+        """数据库被其他连接或进程修改时清空缓存"""
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+
+    def observe( self, connection: tuple, dataVersion: int ) -> bool:
+        """
+        记录连接的PRAGMA data_version，与上次不同时(数据库被其他连接修改)清空缓存
+        连接第一次检查时不知道之前是否被修改过，也清空缓存
+        :param connection: 连接的标识，例如(连接名, 打开序号)
+        :param dataVersion: 连接上读取的PRAGMA data_version
+        :return: 是否清空了缓存
+        """
+        with self.__lock:
+            if self.__observed.get( connection ) == dataVersion:
+                return False
+            self.__observed[connection] = dataVersion
+            self.__generation += 1
+            self.__entries.clear()
+            return True
+
+    def __len__( self ) -> int:
+        return len( self.__entries )
+
+
+Repository = TableRepository()  # 全局数据表仓库
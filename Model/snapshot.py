@@ -0,0 +1,175 @@
+"""编译后作息表、课程表、倒数日表的快照文件"""
+
+import mmap
+import os
+import struct
+
+from Utils import logger
+
+Magic = b"TMRS"  # 快照文件标识
+Version = 4  # 快照文件格式版本
+
+# 文件头: 标识, 版本, 源数据摘要(20字节), 字符串数, 作息项数, 课程项数, 倒数日项数, 节假日项数
+HeaderFormat = struct.Struct( "<4sH20sIIIII" )
+StringLength = struct.Struct( "<H" )
+DailyRecord = struct.Struct( "<HHI" )  # 开始分钟, 结束分钟(周一零点起), 节次字符串编号
+CourseRecord = struct.Struct( "<BHHII" )  # 星期, 开始分钟, 结束分钟, 节次字符串编号, 科目字符串编号
+# 课程重复规则: 间隔周数(0表示没有规则), ISO周余数, 锚定周, 开始日期, 结束日期(儒略日, 0表示不限), 停课日期字符串编号
+RuleRecord = struct.Struct( "<BBiiiI" )
+CountdayRecord = struct.Struct( "<iI" )  # 儒略日, 文本字符串编号
+HolidayRecord = struct.Struct( "<ib" )  # 儒略日, 按星期几上课(放假为-1)
+
+
+def snapshotFile( databaseFile: str ) -> str:
+    """获取数据库文件对应的快照文件"""
+    return os.path.splitext( databaseFile )[0] + ".snapshot"
+
+
+def packRule( rule: tuple | None, intern ) -> bytes:
+    """打包课程重复规则，rule为CourseRule.key()的返回值"""
+    if rule is None:
+        return RuleRecord.pack( 0, 0, 0, 0, 0, intern( "" ) )
+    interval, anchor, phase, startDay, endDay, exceptions = rule
+    return RuleRecord.pack(
+        interval,
+        phase,
+        anchor or 0,
+        startDay or 0,
+        endDay or 0,
+        intern( ",".join( str( day ) for day in exceptions ) ),
+    )
+
+
+def unpackRule( record: tuple, strings: list[str] ) -> tuple | None:
+    """解包课程重复规则，返回值与CourseRule.key()相同"""
+    interval, phase, anchor, startDay, endDay, exceptions = record
+    if interval == 0:
+        return None
+    return (
+        interval,
+        anchor or None,
+        phase,
+        startDay or None,
+        endDay or None,
+        tuple( int( day ) for day in strings[exceptions].split( "," ) if day ),
+    )
+
+
+def writeSnapshot(
+        fileName: str,
+        digest: bytes,
+        daily: list[tuple[int, int, str]],
+        course: list[tuple[int, int, int, str, str, tuple | None]],
+        countday: list[tuple[int, str]],
+        holidays: list[tuple[int, int]],
+) -> bool:
+    """
+    写入快照文件，先写入临时文件再替换，避免留下写到一半的文件
+    :param fileName: 快照文件
+    :param digest: 源数据摘要(20字节)
+    :param daily: 作息项 [(开始分钟, 结束分钟, 节次), ...]，时间为周一零点起的分钟数
+    :param course: 课程项 [(星期, 开始分钟, 结束分钟, 节次, 科目, 重复规则), ...]，星期0为周一，
+                   重复规则为CourseRule.key()的返回值或None
+    :param countday: 倒数日项 [(儒略日, 文本), ...]
+    :param holidays: 节假日项 [(儒略日, 星期), ...]
+    """
+    strings: list[str] = list()
+    ids: dict[str, int] = dict()
+
+    def intern( text: str ) -> int:
+        if text not in ids:
+            ids[text] = len( strings )
+            strings.append( text )
+        return ids[text]
+
+    body = bytearray()
+    for start, end, period in daily:
+        body += DailyRecord.pack( start, end, intern( period ) )
+    for weekday, start, end, period, subject, rule in course:
+        body += CourseRecord.pack( weekday, start, end, intern( period ), intern( subject ) )
+        body += packRule( rule, intern )
+    for day, text in countday:
+        body += CountdayRecord.pack( day, intern( text ) )
+    for day, weekday in holidays:
+        body += HolidayRecord.pack( day, weekday )
+
+    tempFile = fileName + ".tmp"
+    try:
+        with open( tempFile, "wb" ) as file:
+            file.write(
+                HeaderFormat.pack(
+                    Magic,
+                    Version,
+                    digest,
+                    len( strings ),
+                    len( daily ),
+                    len( course ),
+                    len( countday ),
+                    len( holidays ),
+                ),
+            )
+            for text in strings:
+                data = text.encode( "utf-8" )
+                file.write( StringLength.pack( len( data ) ) )
+                file.write( data )
+            file.write( body )
+        os.replace( tempFile, fileName )
+        return True
+    except (OSError, struct.error) as e:
+        logger.warning( f"写入快照文件失败: {e}" )
+        return False
+
+
+def readSnapshot( fileName: str, digest: bytes ):
+    """
+    读取快照文件
+    :param fileName: 快照文件
+    :param digest: 当前源数据摘要，与快照中的摘要不一致时视为过期
+    :return: (作息项, 课程项, 倒数日项, 节假日项)，格式与writeSnapshot的参数相同；
+             文件不存在、过期或损坏时返回None
+    """
+    if not os.path.exists( fileName ):
+        return None
+    try:
+        with open( fileName, "rb" ) as file, mmap.mmap( file.fileno(), 0, access = mmap.ACCESS_READ ) as data:
+            magic, version, fileDigest, stringCount, dailyCount, courseCount, countdayCount, holidayCount = (
+                HeaderFormat.unpack_from( data, 0 )
+            )
+            if magic != Magic or version != Version or fileDigest != digest:
+                logger.info( "快照文件已过期" )
+                return None
+            offset = HeaderFormat.size
+            strings = list()
+            for _ in range( stringCount ):
+                (length,) = StringLength.unpack_from( data, offset )
+                offset += StringLength.size
+                strings.append( data[offset:offset + length].decode( "utf-8" ) )
+                offset += length
+
+            daily = list()
+            for _ in range( dailyCount ):
+                start, end, period = DailyRecord.unpack_from( data, offset )
+                daily.append( (start, end, strings[period]) )
+                offset += DailyRecord.size
+            course = list()
+            for _ in range( courseCount ):
+                weekday, start, end, period, subject = CourseRecord.unpack_from( data, offset )
+                offset += CourseRecord.size
+                rule = unpackRule( RuleRecord.unpack_from( data, offset ), strings )
+                offset += RuleRecord.size
+                course.append( (weekday, start, end, strings[period], strings[subject], rule) )
+            countday = list()
+            for _ in range( countdayCount ):
+                day, text = CountdayRecord.unpack_from( data, offset )
+                countday.append( (day, strings[text]) )
+                offset += CountdayRecord.size
+            holidays = list()
+            for _ in range( holidayCount ):
+                holidays.append( HolidayRecord.unpack_from( data, offset ) )
+                offset += HolidayRecord.size
+            if offset != len( data ):
+                raise ValueError( "文件长度不一致" )
+            return daily, course, countday, holidays
+    except (OSError, ValueError, IndexError, struct.error) as e:  # UnicodeDecodeError是ValueError的子类
+        logger.warning( f"快照文件损坏, 重新加载数据库: {e}" )
+        return None
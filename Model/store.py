@@ -0,0 +1,284 @@
+"""多班级课程表列式存储"""
+
+import bisect
+from array import array
+
+from Model.holidays import HolidayCalendar
+from Model.Norm import Weekday
+from Model.Norm.Overlap import findIntervalIssues, findOverlaps, OVERLAP, ScheduleIssue
+from Model.recurrence import CourseRule, rulesMayCoincide, WeekDays
+from Model.timeline import DayMinutes, WeekMinutes
+
+try:
+    import numpy as np
+except ImportError:  # 没有安装numpy时使用array模块
+    np = None
+
+MaxSearchDays = 366  # 查找课程的最大天数
+
+
+class ScheduleStore:
+    """
+    多班级(或教师)课程表的列式存储
+    每一列是一个整数数组：开始时间, 结束时间(周一零点起的分钟数), 班级, 星期, 节次, 科目
+    班级、节次、科目名称保存在字符串表中，列中只保存其编号；重复规则保存在列表中，每周上课为None
+    compile()后按(班级, 开始时间)排序，可以一次查询所有班级在周模板中的当前项和下一项；
+    search()和currentAndNextAt()再按节假日日历和重复规则跳过不上课的日期，与CourseSchedule的查找结果相同
+    """
+
+    def __init__( self ):
+        self.classNames: list[str] = list()  # 班级名称表
+        self.periodNames: list[str] = list()  # 节次名称表
+        self.subjectNames: list[str] = list()  # 科目名称表
+        self.__classIds: dict[str, int] = dict()
+        self.__periodIds: dict[str, int] = dict()
+        self.__subjectIds: dict[str, int] = dict()
+
+        self.starts = array( "i" )
+        self.ends = array( "i" )
+        self.classes = array( "i" )
+        self.weekdays = array( "b" )
+        self.periods = array( "i" )
+        self.subjects = array( "i" )
+        self.rules: list[CourseRule | None] = list()
+        self.calendar: HolidayCalendar = HolidayCalendar()  # 放假日不上课，补班日按指定星期上课
+
+        self.__keys = array( "q" )  # 排序键: 班级 * WeekMinutes + 开始时间
+        self.__offsets = array( "i", [0] )  # 每个班级在各列中的起始行
+        self.__compiled: bool = True
+
+    @staticmethod
+    def __intern( name: str, names: list[str], ids: dict[str, int] ) -> int:
+        """获取名称的编号，不存在时添加"""
+        index = ids.get( name )
+        if index is None:
+            index = len( names )
+            names.append( name )
+            ids[name] = index
+        return index
+
+    def addClass( self, className: str ) -> int:
+        """添加班级，返回班级编号"""
+        return self.__intern( className, self.classNames, self.__classIds )
+
+    def classId( self, className: str ) -> int:
+        """获取班级编号，不存在时返回-1"""
+        return self.__classIds.get( className, -1 )
+
+    def addItem(
+            self,
+            className: str,
+            weekday: int,
+            start: int,
+            end: int,
+            period: str,
+            subject: str,
+            rule: CourseRule = None,
+    ):
+        """
+        添加课程
+        :param className: 班级名称
+        :param weekday: 星期，0为周一
+        :param start: 开始时间，当天零点起的分钟数
+        :param end: 结束时间，当天零点起的分钟数
+        :param period: 节次
+        :param subject: 科目
+        :param rule: 重复规则，为None时每周都上课
+        """
+        offset = weekday * DayMinutes
+        self.starts.append( offset + start )
+        self.ends.append( offset + end )
+        self.classes.append( self.addClass( className ) )
+        self.weekdays.append( weekday )
+        self.periods.append( self.__intern( period, self.periodNames, self.__periodIds ) )
+        self.subjects.append( self.__intern( subject, self.subjectNames, self.__subjectIds ) )
+        self.rules.append( rule )
+        self.__compiled = False
+
+    def __len__( self ):
+        return len( self.starts )
+
+    def compile( self ):
+        """按(班级, 开始时间)排序各列，并建立班级索引"""
+        order = sorted( range( len( self.starts ) ), key = lambda i: (self.classes[i], self.starts[i]) )
+        for name in ("starts", "ends", "classes", "weekdays", "periods", "subjects"):
+            column = getattr( self, name )
+            setattr( self, name, array( column.typecode, (column[i] for i in order) ) )
+        self.rules = [self.rules[i] for i in order]
+
+        self.__keys = array( "q", (c * WeekMinutes + s for c, s in zip( self.classes, self.starts )) )
+        counts = [0] * len( self.classNames )
+        for c in self.classes:
+            counts[c] += 1
+        self.__offsets = array( "i", [0] )
+        for count in counts:
+            self.__offsets.append( self.__offsets[-1] + count )
+        self.__compiled = True
+
+    def currentAndNext( self, minute: int ):
+        """
+        一次查询所有班级在周模板中指定时间的当前项和下一项，不考虑节假日和重复规则
+        :param minute: 周一零点起的分钟数
+        :return: (current, next)，按班级编号排列的行号序列，不存在时为-1；
+                 下一项跨越周边界时返回该班级本周的第一项
+        """
+        if not self.__compiled:
+            self.compile()
+        if len( self.starts ) == 0:
+            empty = array( "i", [-1] * len( self.classNames ) )
+            return empty, array( "i", empty )
+        if np is not None:
+            return self.__currentAndNextVectorised( minute )
+
+        current = array( "i" )
+        following = array( "i" )
+        for c in range( len( self.classNames ) ):
+            first, last = self.__offsets[c], self.__offsets[c + 1]
+            index = bisect.bisect_right( self.__keys, c * WeekMinutes + minute, first, last ) - 1
+            current.append( index if index >= first and self.ends[index] > minute else -1 )
+            if index + 1 < last:
+                following.append( index + 1 )
+            else:
+                following.append( first if last > first else -1 )
+        return current, following
+
+    def __currentAndNextVectorised( self, minute: int ):
+        """使用numpy一次完成所有班级的查询"""
+        keys = np.frombuffer( self.__keys, dtype = np.int64 )
+        ends = np.frombuffer( self.ends, dtype = np.int32 )
+        offsets = np.frombuffer( self.__offsets, dtype = np.int32 )
+        first, last = offsets[:-1], offsets[1:]
+
+        queries = np.arange( len( self.classNames ), dtype = np.int64 ) * WeekMinutes + minute
+        index = np.searchsorted( keys, queries, side = "right" ) - 1
+        started = index >= first
+        running = ends[np.where( started, index, 0 )] > minute
+        current = np.where( started & running, index, -1 )
+        following = np.where( index + 1 < last, index + 1, np.where( last > first, first, -1 ) )
+        return current, following
+
+    def occursOn( self, index: int, day: int ) -> bool:
+        """检查第index行的课程在指定日期(儒略日)是否上课，不检查放假日"""
+        rule = self.rules[index]
+        return rule is None or rule.activeOn( day )
+
+    def __searchClass( self, c: int, day: int, minute: int, started: bool ) -> tuple[int, int] | None:
+        """
+        从指定时间开始按天查找班级第一节上课的课程，跳过放假日和重复规则不上课的日期
+        :param c: 班级编号
+        :param day: 开始日期(儒略日)
+        :param minute: 开始日期当天零点起的分钟数
+        :param started: 当天已开始但未结束的课程是否算作结果
+        :return: (行号, 上课日期)，MaxSearchDays天内没有课时返回None
+        """
+        first, last = self.__offsets[c], self.__offsets[c + 1]
+        if first == last:
+            return None
+        for current, weekday in self.calendar.scheduleDays( day, MaxSearchDays ):
+            dayStart = c * WeekMinutes + weekday * DayMinutes
+            begin = bisect.bisect_left( self.__keys, dayStart, first, last )
+            end = bisect.bisect_left( self.__keys, dayStart + DayMinutes, begin, last )
+            offset = weekday * DayMinutes + minute
+            for index in range( begin, end ):
+                if current == day and (self.ends[index] if started else self.starts[index]) <= offset:
+                    continue
+                if self.occursOn( index, current ):
+                    return index, current
+        return None
+
+    def search( self, className: str, day: int, minute: int, started: bool = True ) -> tuple[int, int] | None:
+        """
+        获取指定班级在指定时间的当前项，不存在时返回之后的第一项，按节假日日历和重复规则跳过不上课的日期
+        :param className: 班级名称
+        :param day: 日期(儒略日)
+        :param minute: 当天零点起的分钟数
+        :param started: 已开始但未结束的课程是否算作结果，为False时只查找之后开始的课程
+        :return: (行号, 上课日期)，班级不存在或MaxSearchDays天内没有课时返回None
+        """
+        c = self.classId( className )
+        if c < 0:
+            return None
+        if not self.__compiled:
+            self.compile()
+        return self.__searchClass( c, day, minute, started )
+
+    def currentAndNextAt( self, day: int, minute: int ):
+        """
+        按节假日日历和重复规则查询所有班级在指定时间的当前项和下一项
+        先用currentAndNext()一次查询周模板，当天不是普通上课日，或者模板结果有重复规则、
+        下一项不在当天的班级，再用search()逐个查找
+        :param day: 日期(儒略日)
+        :param minute: 当天零点起的分钟数
+        :return: (current, next)，按班级编号排列的行号，不存在时为-1；下一项可能在之后的日期
+        """
+        if not self.__compiled:
+            self.compile()
+        count = len( self.classNames )
+        current = array( "i", [-1] * count )
+        following = array( "i", [-1] * count )
+        weekday = self.calendar.weekdayOf( day )
+        regular = weekday == day % WeekDays  # 不是放假日或补班日
+        if regular:
+            offset = weekday * DayMinutes + minute
+            templateCurrent, templateNext = self.currentAndNext( offset )
+        for c in range( count ):
+            if regular:
+                index, nextIndex = int( templateCurrent[c] ), int( templateNext[c] )
+                if (
+                        (index < 0 or self.rules[index] is None)
+                        and nextIndex >= 0 and self.rules[nextIndex] is None
+                        and self.weekdays[nextIndex] == weekday and self.starts[nextIndex] > offset
+                ):
+                    current[c], following[c] = index, nextIndex
+                    continue
+            found = self.__searchClass( c, day, minute, True )
+            if found is None:
+                continue
+            index, foundDay = found
+            if foundDay == day and self.starts[index] - self.weekdays[index] * DayMinutes <= minute:
+                current[c] = index
+                found = self.__searchClass( c, day, minute, False )
+            following[c] = found[0] if found is not None else -1
+        return current, following
+
+    def validate( self ) -> list[ScheduleIssue]:
+        """
+        一次检查所有班级的课程是否重叠，各列已按(班级, 开始时间)排序，只需扫描一遍
+        重复规则不会在同一天上课的课程(单周和双周课程，起止日期不相交的课程)不算重叠
+        """
+        if not self.__compiled:
+            self.compile()
+        intervals = [
+            (
+                f"{self.classNames[c]} {Weekday.CWEEKDAYS[weekday]}",
+                start - weekday * DayMinutes,
+                end - weekday * DayMinutes,
+                f"{self.periodNames[period]} {self.subjectNames[subject]}",
+            )
+            for c, weekday, start, end, period, subject in zip(
+                self.classes, self.weekdays, self.starts, self.ends, self.periods, self.subjects,
+            )
+        ]
+        issues = [
+            issue for issue in findIntervalIssues( intervals, reportGaps = False, presorted = True )
+            if issue.kind != OVERLAP
+        ]
+        issues.extend(
+            findOverlaps(
+                (interval + (rule,) for interval, rule in zip( intervals, self.rules )),
+                rulesMayCoincide,
+                True,
+            ),
+        )
+        return issues
+
+    def row( self, index: int ) -> tuple[str, int, int, int, str, str]:
+        """获取指定行的数据: (班级, 星期, 开始时间, 结束时间, 节次, 科目)，时间为周一零点起的分钟数"""
+        return (
+            self.classNames[self.classes[index]],
+            self.weekdays[index],
+            self.starts[index],
+            self.ends[index],
+            self.periodNames[self.periods[index]],
+            self.subjectNames[self.subjects[index]],
+        )
@@ -0,0 +1,102 @@
+"""编译后的只读时间线，用于快速查找当前项和下一项"""
+
+import bisect
+from itertools import accumulate
+
+DayMinutes = 24 * 60  # 一天的分钟数
+
+
+class DayTimeline:
+    """
+    一天的时间线
+    时间用当天零点起的分钟数表示，创建后不再修改，查找为二分查找 O(log n)
+    """
+
+    __slots__ = ("starts", "ends", "items", "maxEnds")
+
+    def __init__( self, intervals: list[tuple[int, int, object]] = None ):
+        """
+        :param intervals: [(开始分钟, 结束分钟, 项), ...]，无需排序
+        """
+        ordered = sorted( intervals or [], key = lambda x: (x[0], x[1]) )
+        self.starts: tuple[int, ...] = tuple( x[0] for x in ordered )
+        self.ends: tuple[int, ...] = tuple( x[1] for x in ordered )
+        self.items: tuple = tuple( x[2] for x in ordered )
+        # 前缀最大结束时间，用于判断是否存在重叠项覆盖指定时间
+        self.maxEnds: tuple[int, ...] = tuple( accumulate( self.ends, max ) )
+
+    def __len__( self ):
+        return len( self.starts )
+
+    def currentIndex( self, minute: int ) -> int:
+        """获取包含指定时间的项的索引，不存在时返回-1"""
+        index = bisect.bisect_right( self.starts, minute ) - 1
+        if index < 0 or self.maxEnds[index] <= minute:
+            return -1
+        if self.ends[index] > minute:
+            return index
+        # 存在重叠的时间段，向前查找第一个覆盖该时间的项
+        for i in range( index - 1, -1, -1 ):
+            if self.ends[i] > minute:
+                return i
+        return -1
+
+    def nextIndex( self, minute: int ) -> int:
+        """获取指定时间之后(开始时间大于该时间)的第一项的索引，不存在时返回-1"""
+        index = bisect.bisect_right( self.starts, minute )
+        return index if index < len( self.starts ) else -1
+
+    def current( self, minute: int ):
+        """获取包含指定时间的项，不存在时返回None"""
+        index = self.currentIndex( minute )
+        return self.items[index] if index >= 0 else None
+
+    def next( self, minute: int ):
+        """获取指定时间之后的第一项，不存在时返回None"""
+        index = self.nextIndex( minute )
+        return self.items[index] if index >= 0 else None
+
+
+WeekMinutes = 7 * DayMinutes  # 一周的分钟数
+
+
+class WeekTimeline( DayTimeline ):
+    """
+    一周的时间线
+    时间用周一零点起的分钟数表示，查找下一项和上一项时跨越周边界循环
+    """
+
+    __slots__ = ()
+
+    def nextIndex( self, minute: int ) -> int:
+        """获取指定时间之后的第一项的索引，本周没有则返回下周第一项，时间线为空时返回-1"""
+        if len( self.starts ) == 0:
+            return -1
+        index = bisect.bisect_right( self.starts, minute )
+        return index if index < len( self.starts ) else 0
+
+    def previousIndex( self, minute: int ) -> int:
+        """获取指定时间之前已开始的上一项(不含当前项)的索引，本周没有则返回上周最后一项"""
+        if len( self.starts ) == 0:
+            return -1
+        index = bisect.bisect_right( self.starts, minute ) - 1
+        if index >= 0 and index == self.currentIndex( minute ):
+            index -= 1
+        return index if index >= 0 else len( self.starts ) - 1
+
+    def currentOrNextIndex( self, minute: int ) -> int:
+        """获取包含指定时间的项的索引，不存在时返回下一项的索引"""
+        index = self.currentIndex( minute )
+        return index if index >= 0 else self.nextIndex( minute )
+
+    def dayRange( self, weekday: int ) -> range:
+        """获取指定星期(0为星期一)的项的索引范围，按开始时间排列"""
+        return range(
+            bisect.bisect_left( self.starts, weekday * DayMinutes ),
+            bisect.bisect_left( self.starts, (weekday + 1) * DayMinutes ),
+        )
+
+    def previous( self, minute: int ):
+        """获取指定时间之前的上一项，时间线为空时返回None"""
+        index = self.previousIndex( minute )
+        return self.items[index] if index >= 0 else None
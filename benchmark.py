@@ -0,0 +1,414 @@
+"""性能测试"""
+
+import argparse
+import bisect
+import gc
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from PySide6.QtCore import QCoreApplication, QDate, QDateTime, QTime
+
+from Gui.Scheduler import DeadlineQueue, MaxInterval
+from Model import (
+    checkDateString,
+    checkTimeString,
+    ClassPeriod,
+    CourseShdItem,
+    DataSource,
+    formatDateString,
+    formatTimeString,
+    parseDayType,
+    validateTable,
+    upgradeDatabase,
+    Weekday,
+)
+from Model.Norm import parseDate, parseTime
+
+try:
+    import psutil
+except ImportError:  # 没有安装psutil时只统计Python堆
+    psutil = None
+
+HourMSecs = 3600 * 1000
+DayMSecs = 24 * HourMSecs
+
+
+def syntheticDay( periods: int = 11, first: int = 8 * 60, length: int = 40, rest: int = 10 ):
+    """
+    生成一天的作息时间点(分钟)
+    :param periods: 节数
+    :param first: 第一节开始时间
+    :param length: 每节时长
+    :param rest: 课间时长
+    :return: [(start, end), ...]
+    """
+    items = list()
+    start = first
+    for _ in range( periods ):
+        items.append( (start, start + length) )
+        start += length + rest
+    return items
+
+
+def benchWakeups( hours: int = 24 ):
+    """对比200ms轮询与截止时间调度器在模拟时间内的唤醒次数"""
+    items = syntheticDay()
+    boundaries = sorted( {m * 60 * 1000 for item in items for m in item} )
+
+    def nextBoundary( now: int ) -> int:
+        """当天下一个作息/课程变化时间点，没有则为次日第一个"""
+        day, offset = divmod( now, DayMSecs )
+        index = bisect.bisect_right( boundaries, offset )
+        if index < len( boundaries ):
+            return day * DayMSecs + boundaries[index]
+        return (day + 1) * DayMSecs + boundaries[0]
+
+    queue = DeadlineQueue()
+    now = 0
+
+    def onDaily():
+        queue.push( "daily", nextBoundary( now ), onDaily )
+
+    def onCourse():
+        queue.push( "course", nextBoundary( now ), onCourse )
+
+    def onDate():
+        queue.push( "date", (now // DayMSecs + 1) * DayMSecs, onDate )
+
+    onDaily()
+    onCourse()
+    onDate()
+
+    end = hours * HourMSecs
+    wakeups = 0
+    while True:
+        deadline = queue.peek()
+        now = min( deadline, now + MaxInterval )
+        if now > end:
+            break
+        wakeups += 1
+        for callback in queue.popDue( now ):
+            callback()
+
+    polling = end // 200
+    print( f"模拟时长: {hours}小时" )
+    print( f"200ms轮询: 每小时唤醒 {polling / hours:.0f} 次" )
+    print( f"截止时间调度: 每小时唤醒 {wakeups / hours:.1f} 次 (时间窗口另有每秒1次刷新)" )
+
+
+class LegacyItem:
+    """旧的课程表项表示方式：普通属性字典 + QDateTime"""
+
+    def __init__( self, start: QDateTime, end: QDateTime, weekday: str, period: str, subject: str ):
+        self.start = start
+        self.end = end
+        self.weekday = weekday
+        self.period = period
+        self.subject = subject
+
+    def isExpired( self, dateTime: QDateTime ):
+        return self.end <= dateTime
+
+
+def residentBytes() -> int | None:
+    """当前进程的常驻内存(RSS)，包括QDateTime等C++对象，没有安装psutil时返回None"""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def formatKiB( size: int | None ) -> str:
+    """将字节数格式化为KiB，无法统计时显示为-"""
+    return f"{size / 1024:.0f} KiB" if size is not None else "-"
+
+
+def benchItems( count: int = 50000 ):
+    """
+    对比QDateTime表项与__slots__时间戳表项的内存占用和比较速度
+    tracemalloc只统计Python堆，不包括QDateTime的C++对象，因此同时给出常驻内存(RSS)的增量
+    """
+    base = QDateTime.currentDateTime()
+    baseSecs = base.toSecsSinceEpoch()
+
+    def buildLegacy():
+        return [
+            LegacyItem( base.addSecs( i * 60 ), base.addSecs( i * 60 + 2400 ), "星期一", "上午第一节", "物理" )
+            for i in range( count )
+        ]
+
+    def buildCompact():
+        return [
+            CourseShdItem( baseSecs + i * 60, baseSecs + i * 60 + 2400, "星期一", "上午第一节", "物理" )
+            for i in range( count )
+        ]
+
+    def measureResident( build ):
+        """构建表项并统计RSS的增量，表项保留到测试结束，后一次构建不会复用前一次释放的内存"""
+        gc.collect()
+        before = residentBytes()
+        items = build()
+        return items, residentBytes() - before if before is not None else None
+
+    def measureHeap( build ) -> int:
+        """再构建一次，统计Python堆的峰值，tracemalloc自身的开销不计入RSS的增量"""
+        tracemalloc.start()
+        build()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    legacy, legacyResident = measureResident( buildLegacy )
+    compact, compactResident = measureResident( buildCompact )
+    legacyPeak = measureHeap( buildLegacy )
+    compactPeak = measureHeap( buildCompact )
+
+    now = base.addSecs( count * 30 )
+    startTime = time.perf_counter()
+    legacyExpired = sum( 1 for item in legacy if item.isExpired( now ) )
+    legacyTime = time.perf_counter() - startTime
+
+    nowSecs = now.toSecsSinceEpoch()
+    startTime = time.perf_counter()
+    compactExpired = sum( 1 for item in compact if item.isExpired( nowSecs ) )
+    compactTime = time.perf_counter() - startTime
+
+    assert legacyExpired == compactExpired
+    print( f"表项数量: {count}" )
+    if psutil is None:
+        print( "没有安装psutil，不统计RSS；Python堆不包括QDateTime的C++对象" )
+    print(
+        f"QDateTime表项: RSS增量 {formatKiB( legacyResident )}, Python堆 {formatKiB( legacyPeak )}, "
+        f"比较 {legacyTime * 1000:.1f} ms",
+    )
+    print(
+        f"时间戳表项:    RSS增量 {formatKiB( compactResident )}, Python堆 {formatKiB( compactPeak )}, "
+        f"比较 {compactTime * 1000:.1f} ms",
+    )
+
+
+def syntheticDatabase( fileName: str, rows: int ):
+    """
+    生成测试数据库，作息表、多班级课程表和倒数日表每个表rows行，本机课程表每节课一行
+    先由upgradeDatabase()创建当前版本的表结构，与程序启动时相同
+    """
+    periods = ClassPeriod.CLASS_PERIODS
+    lessons = len( Weekday.CWEEKDAYS ) * len( periods )  # 每个班级一周的课程数
+    upgradeDatabase( fileName )
+    with sqlite3.connect( fileName ) as conn:
+        conn.executemany(
+            "INSERT INTO DailySchedule (start_time, end_time, period) VALUES (?, ?, ?)",
+            (
+                (f"{8 + i % 11}:{i % 6 * 10}", f"{8 + i % 11}:{i % 6 * 10 + 5}", periods[i % len( periods )])
+                for i in range( rows )
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO CourseSchedule (weekday, period, course) VALUES (?, ?, ?)",
+            (
+                (Weekday.CWEEKDAYS[i % 7], periods[i // 7], f"高一{i % 20}班物理")
+                for i in range( min( rows, lessons ) )
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO ClassSchedule (class_name, weekday, period, course) VALUES (?, ?, ?, ?)",
+            (
+                (f"班{i // lessons}", Weekday.CWEEKDAYS[i % 7], periods[i % lessons // 7], f"物理{i % 20}")
+                for i in range( rows )
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO Countdown (dateAndtime, description) VALUES (?, ?)",
+            ((f"2099-{i % 12 + 1:02d}-{i % 28 + 1:02d}", f"倒数日{i}") for i in range( rows )),
+        )
+    conn.close()
+
+
+def benchLoad( sizes: tuple[int, ...] = (1000, 10000, 100000) ):
+    """测试不同数据量下DataSource从数据库加载数据的耗时"""
+    app = QCoreApplication.instance() or QCoreApplication( [] )
+    with tempfile.TemporaryDirectory() as tempDir:
+        for rows in sizes:
+            fileName = os.path.join( tempDir, f"bench_{rows}.sqlite3" )
+            syntheticDatabase( fileName, rows )
+            dataSource = DataSource()
+            startTime = time.perf_counter()
+            dataSource.loadDataFromDatabase( fileName )
+            elapsed = time.perf_counter() - startTime
+            print( f"{rows:>7}行/表: 加载 {elapsed * 1000:8.1f} ms, 每行 {elapsed / rows / 3 * 1e6:.2f} us" )
+            startTime = time.perf_counter()
+            dataSource.loadDataFromDatabase( fileName )  # 各表数据行已在Repository中缓存
+            cached = time.perf_counter() - startTime
+            print( f"{rows:>7}行/表: 缓存后重新加载 {cached * 1000:8.1f} ms" )
+    del app
+
+
+def benchOccurrences( days: tuple[int, ...] = (7, 140, 365) ):
+    """测试occurrences()在不同时间范围内的耗时和内存峰值，内存峰值应与范围长度无关"""
+    app = QCoreApplication.instance() or QCoreApplication( [] )
+    with tempfile.TemporaryDirectory() as tempDir:
+        fileName = os.path.join( tempDir, "bench_occurrences.sqlite3" )
+        syntheticDatabase( fileName, 200 )
+        dataSource = DataSource()
+        dataSource.loadDataFromDatabase( fileName )
+        start = QDateTime( QDate.currentDate(), QTime( 0, 0 ) )
+        for count in days:
+            tracemalloc.start()
+            startTime = time.perf_counter()
+            total = sum( 1 for _ in dataSource.occurrences( start, start.addDays( count ) ) )
+            elapsed = time.perf_counter() - startTime
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print( f"{count:>4}天: {total:>7}项, 耗时 {elapsed * 1000:8.1f} ms, 内存峰值 {peak / 1024:.0f} KiB" )
+    del app
+
+
+def legacyValidDaily( row: tuple ) -> bool:
+    """原来的逐单元格正则校验(每次调用re.match查找正则缓存)"""
+    start, end, period, dayType = row
+    start, end = formatTimeString( start ), formatTimeString( end )
+    return (
+            re.match( r"^\d{1,2}:\d{1,2}$", start ) is not None
+            and re.match( r"^\d{1,2}:\d{1,2}$", end ) is not None
+            and re.match( r"^(上午|下午|晚上)第[一二三四五六七八九十]+节$|^(课间休息|下班|午休|晚饭时间|休息时间|体育锻炼)$", period )
+            is not None
+            and parseDayType( dayType ) != []
+            and start < end
+    )
+
+
+def legacyValidCourse( row: tuple ) -> bool:
+    """原来的逐单元格正则校验"""
+    weekday, period, course, weeks, startDate, endDate, exceptDates = row
+    dates = [formatDateString( startDate ), formatDateString( endDate )]
+    dates += [formatDateString( part ) for part in exceptDates.split( "," ) if part]
+    return (
+            re.match( r"^(星期一|星期二|星期三|星期四|星期五|星期六|星期日)$", weekday ) is not None
+            and re.match( r"^(上午|下午|晚上)第[一二三四五六七八九十]+节$|^(课间休息|下班|午休|晚饭时间|休息时间|体育锻炼)$", period )
+            is not None
+            and len( course ) > 0
+            and weeks in Weekday.CWEEKRULES
+            and all( len( date ) == 0 or re.match( r"^\d{4}-\d{1,2}-\d{1,2}$", date ) is not None for date in dates )
+    )
+
+
+def benchValidate( rows: int = 100000 ):
+    """对比原来的逐单元格正则校验与批量校验引擎在rows行数据上的耗时，约1%的行有错误"""
+    periods = ClassPeriod.CLASS_PERIODS
+    daily = [
+        (
+            f"{8 + i % 11}:{i % 6 * 10}",
+            f"{8 + i % 11}:{i % 6 * 10 + 5}" if i % 100 else "25:00",
+            periods[i % len( periods )],
+            ("", "工作日", "星期六")[i % 3],
+        )
+        for i in range( rows )
+    ]
+    course = [
+        (
+            Weekday.CWEEKDAYS[i % 7],
+            periods[i % len( periods )],
+            f"高一{i % 20}班物理",
+            ("", "单周", "双周")[i % 3],
+            "2025-9-1" if i % 2 else "",
+            "2026-1-20" if i % 100 else "2026-2-30",
+            "2025-10-1,2025-10-2" if i % 5 == 0 else "",
+        )
+        for i in range( rows )
+    ]
+    for tableName, data, legacy in (
+            ("DailySchedule", daily, legacyValidDaily),
+            ("CourseSchedule", course, legacyValidCourse),
+    ):
+        startTime = time.perf_counter()
+        legacyValid = sum( 1 for row in data if legacy( row ) )
+        legacyTime = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        report = validateTable( tableName, data )
+        engineTime = time.perf_counter() - startTime
+        print( f"{tableName}: {rows}行" )
+        print( f"  逐单元格正则: 有效 {legacyValid:>7}行, 耗时 {legacyTime * 1000:8.1f} ms" )
+        print( f"  批量校验引擎: 有效 {len( report.rows ):>7}行, 耗时 {engineTime * 1000:8.1f} ms, 错误{len( report.errors )}处" )
+
+
+def benchParse( rows: int = 100000 ):
+    """对比原来的字符串往返(格式化、正则、拼接、QDateTime.fromString)与整数解析的每行耗时"""
+    times = [(f"{8 + i % 11}:{i % 6 * 10}", f"{8 + i % 11}:{i % 6 * 10 + 5}") for i in range( rows )]
+    dates = [f"2025-{i % 12 + 1}-{i % 28 + 1}" for i in range( rows )]
+    today = QDate.currentDate()
+    dateString = today.toString( "yyyy-MM-dd" )
+    dayStart = QDateTime( today, QTime( 0, 0 ) ).toSecsSinceEpoch()
+
+    def legacyTimes():
+        result = 0
+        for startTime, endTime in times:
+            start, end = formatTimeString( startTime ), formatTimeString( endTime )
+            if checkTimeString( start ) and checkTimeString( end ):
+                startDateTime = QDateTime.fromString( f"{dateString} {start}", "yyyy-MM-dd hh:mm" )
+                endDateTime = QDateTime.fromString( f"{dateString} {end}", "yyyy-MM-dd hh:mm" )
+                result += endDateTime.toSecsSinceEpoch() - startDateTime.toSecsSinceEpoch()
+        return result
+
+    def integerTimes():
+        result = 0
+        for startTime, endTime in times:
+            start, end = parseTime( startTime ), parseTime( endTime )
+            if start is not None and end is not None:
+                result += (dayStart + end * 60) - (dayStart + start * 60)
+        return result
+
+    def legacyDates():
+        result = 0
+        for text in dates:
+            text = formatDateString( text )
+            if checkDateString( text ):
+                result += QDate.fromString( text, "yyyy-MM-dd" ).toJulianDay()
+        return result
+
+    def integerDates():
+        result = 0
+        for text in dates:
+            day = parseDate( text )
+            if day is not None:
+                result += day
+        return result
+
+    for name, legacy, integer in (("时间", legacyTimes, integerTimes), ("日期", legacyDates, integerDates)):
+        startTime = time.perf_counter()
+        legacyResult = legacy()
+        legacyTime = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        integerResult = integer()
+        integerTime = time.perf_counter() - startTime
+        assert legacyResult == integerResult
+        print(
+            f"{name}: {rows}行, 字符串往返 {legacyTime / rows * 1e6:.2f} us/行, "
+            f"整数解析 {integerTime / rows * 1e6:.2f} us/行, 节省 {(legacyTime - integerTime) / rows * 1e6:.2f} us/行",
+        )
+
+
+Benchmarks = {
+    "wakeups": benchWakeups,
+    "items": benchItems,
+    "load": benchLoad,
+    "occurrences": benchOccurrences,
+    "parse": benchParse,
+    "validate": benchValidate,
+}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser( description = "Timer性能测试" )
+    parser.add_argument( "name", choices = sorted( Benchmarks ), help = "测试项目" )
+    args = parser.parse_args()
+    startTime = time.perf_counter()
+    Benchmarks[args.name]()
+    print( f"耗时: {time.perf_counter() - startTime:.3f}s" )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""配置窗口保存修改的回归测试"""
+
+import pytest
+
+pytest.importorskip( "PySide6" )
+pytest.importorskip( "winreg" )  # Utils只能在Windows上导入
+
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtSql import QSqlQuery, QSqlTableModel
+
+from Gui.configwnd import modelChanges, selectAll
+from Model import closeDb, connectToDb, saveTableChanges, upgradeDatabase
+
+Rows = 1000  # 超过QSQLITE一次读取的256行
+
+
+@pytest.fixture
+def db( tmp_path ):
+    app = QCoreApplication.instance() or QCoreApplication( [] )
+    fileName = str( tmp_path / "timer.sqlite3" )
+    assert upgradeDatabase( fileName )
+    db = connectToDb( fileName )
+    query = QSqlQuery( db )
+    assert query.prepare( "INSERT INTO ClassSchedule (class_name, weekday, period, course) VALUES (?, ?, ?, ?)" )
+    query.addBindValue( [f"高一{i}班" for i in range( Rows )] )
+    query.addBindValue( ["星期一"] * Rows )
+    query.addBindValue( ["上午第一节"] * Rows )
+    query.addBindValue( ["数学"] * Rows )
+    assert query.execBatch()
+    query.finish()
+    yield db
+    closeDb( db )
+    del app
+
+
+def classModel( db ) -> QSqlTableModel:
+    model = QSqlTableModel( None, db )
+    model.setTable( "ClassSchedule" )
+    model.setEditStrategy( QSqlTableModel.EditStrategy.OnManualSubmit )
+    return model
+
+
+def tableRows( db ) -> dict[int, str]:
+    query = QSqlQuery( db )
+    assert query.exec( "SELECT id, course FROM ClassSchedule" )
+    rows = dict()
+    while query.next():
+        rows[int( query.value( 0 ) )] = query.value( 1 )
+    return rows
+
+
+def test_save_keeps_rows_that_were_not_fetched( db ):
+    model = classModel( db )
+    assert model.select()  # 只读取了前256行
+    assert model.canFetchMore()
+    model.setData( model.index( 0, model.fieldIndex( "course" ) ), "物理" )
+    assert saveTableChanges( db, {"ClassSchedule": modelChanges( model )} ) is None
+    rows = tableRows( db )
+    assert len( rows ) == Rows
+    assert list( rows.values() ).count( "物理" ) == 1
+
+
+def test_save_writes_only_changed_rows( db ):
+    model = classModel( db )
+    assert selectAll( model )
+    assert model.rowCount() == Rows
+    model.setData( model.index( 0, model.fieldIndex( "course" ) ), "物理" )
+    deletedId = int( model.data( model.index( 1, model.fieldIndex( "id" ) ) ) )
+    model.removeRow( 1 )
+    row = model.rowCount()
+    model.insertRow( row )
+    for column, value in (("class_name", "高二1班"), ("weekday", "星期二"), ("period", "上午第二节"), ("course", "化学")):
+        model.setData( model.index( row, model.fieldIndex( column ) ), value )
+
+    # 打开配置窗口之后被其他程序修改的行
+    otherId = int( model.data( model.index( Rows - 1, model.fieldIndex( "id" ) ) ) )
+    query = QSqlQuery( db )
+    assert query.exec( f"UPDATE ClassSchedule SET course = '英语' WHERE id = {otherId}" )
+
+    changes = modelChanges( model )
+    assert (len( changes.updated ), len( changes.inserted ), changes.deleted) == (1, 1, [deletedId])
+    assert saveTableChanges( db, {"ClassSchedule": changes} ) is None
+    rows = tableRows( db )
+    assert len( rows ) == Rows
+    assert deletedId not in rows
+    assert rows[otherId] == "英语"
+    assert sorted( rows.values() ).count( "化学" ) == 1
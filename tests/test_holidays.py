@@ -0,0 +1,23 @@
+"""节假日日历的回归测试"""
+
+import pytest
+
+pytest.importorskip( "winreg" )  # Utils只能在Windows上导入
+
+from Model.holidays import HolidayCalendar, julianDay
+from Model.Norm import validateTable
+
+
+def test_workday_without_weekday_is_rejected():
+    report = validateTable( "Holidays", [("2025-09-28", "补班", ""), ("2025-10-01", "放假", "")] )
+    assert report.rows == [("2025-10-01", "放假", "")]
+    assert [error.column for error in report.errors] == ["weekday"]
+
+
+def test_workday_without_weekday_is_not_loaded():
+    calendar = HolidayCalendar()
+    calendar.loadHolidays( [("2025-09-28", "补班", ""), ("2025-10-11", "补班", "星期三")] )
+    sunday, saturday = julianDay( "2025-09-28" ), julianDay( "2025-10-11" )
+    assert sunday not in calendar.workDays
+    assert calendar.weekdayOf( sunday ) == 6  # 没有加载的补班日按当天的星期
+    assert calendar.weekdayOf( saturday ) == 2
@@ -0,0 +1,34 @@
+"""多班级课程表导出的回归测试"""
+
+import os
+
+import pytest
+
+pytest.importorskip( "winreg" )  # Utils只能在Windows上导入
+
+from Model.holidays import HolidayCalendar
+from Model.ics import exportClasses, exportFileNames
+
+FirstDay = 2460920  # 2025-09-01，星期一
+Rows = [(0, 480, 525, "上午第一节", "数学", None)]
+
+
+def test_sanitized_names_do_not_overwrite_each_other( tmp_path ):
+    fileNames = exportFileNames( ["a/b", "a:b", "timer", "班级"], str( tmp_path ), ("Timer.ics",) )
+    names = [os.path.basename( fileName ) for fileName in fileNames.values()]
+    assert names == ["a_b.ics", "a_b_2.ics", "timer_2.ics", "班级.ics"]
+
+
+def test_single_class_failure_is_reported( tmp_path ):
+    outputDir = str( tmp_path / "missing" )  # 目录不存在，写入失败
+    holidays = HolidayCalendar().snapshot()
+    assert exportClasses( {"高一1班": Rows}, holidays, FirstDay, FirstDay + 6, outputDir ) == list()
+
+
+def test_single_class_is_exported( tmp_path ):
+    holidays = HolidayCalendar().snapshot()
+    exported = exportClasses(
+        {"Timer": Rows}, holidays, FirstDay, FirstDay + 6, str( tmp_path ), reserved = ("Timer.ics",),
+    )
+    assert [os.path.basename( fileName ) for fileName in exported] == ["Timer_2.ics"]
+    assert "SUMMARY:" in (tmp_path / "Timer_2.ics").read_text( encoding = "utf-8" )
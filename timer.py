@@ -1,18 +1,59 @@
 """模块测试"""
 
+import argparse
+import multiprocessing
 import sys
 
-from PySide6.QtCore import QRect
+from PySide6.QtCore import QCoreApplication, QDate, QDateTime, QRect, QTime
 from PySide6.QtWidgets import QApplication
 
 from Gui import MainModule
+from Model import Connections, DataSource, upgradeDatabase
 from Utils import Config, logger, Paths, Screens
 
+ExportDays = 140  # 导出日历的默认天数，约一个学期
+
+
+def exportCalendar( days: int ) -> int:
+    """
+    不显示窗口，将今天起days天内的作息、课程和倒数日导出到Paths.OutputDir，
+    多班级课程表中的其他班级每班一个文件
+    :return: 进程的退出码
+    """
+    app = QCoreApplication( sys.argv )
+    if not upgradeDatabase():
+        logger.error( f"数据库 {Paths.DatabaseFile} 升级失败" )
+    dataSource = DataSource()
+    dataSource.loadDataFromDatabase()
+    fileNames = list()
+    if dataSource.loaded:
+        start = QDateTime( QDate.currentDate(), QTime( 0, 0 ) )
+        fileNames = dataSource.exportCalendar( start, start.addDays( days ) )
+    Connections.closeThread()
+    for fileName in fileNames:
+        print( fileName )
+    del app
+    return 0 if len( fileNames ) > 0 else 1
+
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser( description = "桌面计时器" )
+    parser.add_argument(
+        "--export",
+        type = int,
+        nargs = "?",
+        const = ExportDays,
+        metavar = "DAYS",
+        help = f"不显示窗口，导出今天起DAYS天(默认{ExportDays}天)的日历(.ics)后退出",
+    )
+    args, _ = parser.parse_known_args()  # 其余参数由Qt处理
+    if args.export is not None:
+        sys.exit( exportCalendar( args.export ) )
+    
     app = QApplication( sys.argv )
     app.setQuitOnLastWindowClosed( True )  # 最后一个窗口关闭时退出应用程序
+    app.aboutToQuit.connect( Connections.closeThread )  # 退出前关闭GUI线程的数据库连接
     Screens.getScreenInfo( app )
     
     logger.info( f"程序启动, 位置：{Paths.AppDir}" )
@@ -24,6 +65,9 @@ def main():
     else:
         logger.info( f"配置文件 {Config.configFile} 加载成功" )
     
+    if not upgradeDatabase():  # 在窗口和后台加载线程使用数据库之前升级数据库结构
+        logger.error( f"数据库 {Paths.DatabaseFile} 升级失败" )
+    
     screenRect: QRect = Screens.primeryScreen.geometry()  # 获取屏幕大小
     core = MainModule( screenRect )
     core.showAllWnd()
@@ -32,4 +76,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后导出日历时使用进程池
     main()